@@ -1,9 +1,26 @@
+import argparse
 import apache_beam as beam
+from apache_beam.coders import IterableCoder, TupleCoder, VarIntCoder
+from apache_beam.metrics import Metrics
 from apache_beam.options.pipeline_options import PipelineOptions, StandardOptions, SetupOptions
+from apache_beam.transforms.timeutil import TimeDomain
+from apache_beam.transforms.userstate import ReadModifyWriteStateSpec, TimerSpec, on_timer
+from apache_beam.utils.timestamp import Duration, Timestamp
+from apache_beam.io import fileio
+import collections
 import datetime
+import gzip
 import json
-import csv
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
 import pytz
+# Beam-free row transforms shared with 9-train-board (on Dataflow, shipped by use_setup_file)
+from gtfs_records import enrich_with_stops, flatten_gtfs, parse_stops
 
 # ============================================
 # Configuration
@@ -11,21 +28,23 @@ import pytz
 PROJECT_ID = "<your-project-id>"
 BIGQUERY_DATASET = "mta_updates"
 BIGQUERY_TABLE = "<your-project-id>.mta_updates.realtime_updates"
+# Day partitions on vehicle_timestamp + clustering, applied when WriteToBigQuery creates the table,
+# so date-bounded queries read only their partitions and stop/trip filters skip blocks
+BIGQUERY_TABLE_PARAMETERS = {
+    'timePartitioning': {'type': 'DAY', 'field': 'vehicle_timestamp'},
+    'clustering': {'fields': ['route_id', 'stop_id', 'trip_id']},
+}
 PUBSUB_SUBSCRIPTION = "mta-gtfs-ace-sub"  # Subscription that receives MTA GTFS-RT updates
-GCS_STOPS_CSV_PATH = "gs://<your-project-id>-enrichment/stops.csv"  # Static stop metadata for enrichment
+GCS_STOPS_PATH = "gs://<your-project-id>-enrichment/stops.snapshot"  # Static stop metadata for enrichment (stops_snapshot.py)
 FEED_TZ = pytz.timezone('America/New_York')  # MTA operates in NYC timezone
 REGION = "us-east1"  # GCP region for Dataflow workers
+TEMP_LOCATION = "gs://<your-project-id>-dataflow-temp"
+STAGING_LOCATION = "gs://<your-project-id>-dataflow-staging"
+SETUP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'setup.py')  # packages gtfs_records.py for Dataflow workers
 
 # ============================================
 # Schema Definitions
 # ============================================
-# Fields required in the final output to BigQuery
-REQUIRED_FIELDS = [
-    'unique_event_id', 'feed_header_timestamp', 'entity_id', 'trip_id', 'start_time', 'start_date',
-    'route_id', 'stop_id', 'vehicle_timestamp', 'current_status', 'current_stop_sequence',
-    'stop_name', 'stop_lat', 'stop_lon', 'direction'
-]
-
 # BigQuery table schema definition
 BIGQUERY_SCHEMA = {
     'fields': [
@@ -48,165 +67,146 @@ BIGQUERY_SCHEMA = {
 }
 
 # ============================================
-# Enrichment Function
+# Sampling Profiler (opt-in: --profile_sample_rate)
 # ============================================
-def enrich_with_stops(rec: dict, stops_map):
+class StackSampler:
     """
-    Enriches a transit record with stop metadata (name, lat/lon, direction).
-    
-    Args:
-        rec: Dictionary containing transit event data with 'stop_id'
-        stops_map: Dictionary mapping stop_id -> {stop_name, stop_lat, stop_lon}
-    
-    Returns:
-        Enriched dictionary with stop metadata and direction
-    
-    Logic:
-        1. Extract stop_id from record
-        2. Try exact match, then uppercase match
-        3. If no match and stop_id ends with letter (e.g., 'A01N'), try without suffix
-        4. Add stop name, coordinates, and derive direction from stop_id suffix
+    Samples the Python stacks of a set of threads every interval seconds from a
+    daemon thread and counts them as collapsed stacks ('outer;...;inner' -> samples),
+    the input format of flamegraph.pl / speedscope.
+    (2-event-processor/profiling.py carries the same sampler.)
     """
-    sid = rec.get('stop_id')
-    if not sid:
-        # No stop_id provided - return with null values
-        rec.update({'stop_name': None, 'stop_lat': None, 'stop_lon': None, 'direction': None})
-        return {k: rec.get(k) for k in REQUIRED_FIELDS}
-    
-    sid_processed = str(sid).strip()
-    
-    # Try exact match, then uppercase match
-    info = stops_map.get(sid_processed) or stops_map.get(sid_processed.upper())
-    
-    # If no match and stop_id ends with letter (direction indicator like 'N' or 'S'), try without it
-    if not info and sid_processed and sid_processed[-1].isalpha():
-        info = stops_map.get(sid_processed[:-1]) or stops_map.get(sid_processed[:-1].upper())
-    
-    # Populate stop metadata
-    rec['stop_name'] = info.get('stop_name') if info else None
-    try:
-        rec['stop_lat'] = float(info.get('stop_lat')) if info and info.get('stop_lat') else None
-    except ValueError:
-        rec['stop_lat'] = None
-    try:
-        rec['stop_lon'] = float(info.get('stop_lon')) if info and info.get('stop_lon') else None
-    except ValueError:
-        rec['stop_lon'] = None
-    
-    # Derive direction from stop_id (e.g., 'A01S' = Southbound, 'A01N' = Northbound)
-    rec['direction'] = 'Southbound' if sid_processed and 'S' in sid_processed else 'Northbound'
-    
-    return {k: rec.get(k) for k in REQUIRED_FIELDS}
+    def __init__(self, interval_seconds):
+        self.interval_seconds = interval_seconds
+        self.counts = collections.Counter()
+        self.thread_ids = {threading.get_ident()}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
 
-# ============================================
-# GTFS-Realtime Flattening Function
-# ============================================
-def flatten_gtfs(obj):
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.counts[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+
+class BundleProfiler:
     """
-    Flattens nested GTFS-Realtime protobuf JSON into row-level records.
-    
-    GTFS-RT structure:
-        - header: Feed metadata (timestamp)
-        - entity[]: Array of transit updates
-            - trip_update: Scheduled stop predictions
-            - vehicle: Real-time vehicle positions
-    
-    This function:
-        1. Extracts feed header timestamp
-        2. Iterates through entities
-        3. For trip_updates: Creates one row per stop_time_update
-        4. For vehicle updates: Creates one row per vehicle position
-        5. Returns flattened records suitable for BigQuery
+    Profiles a sampled fraction of a DoFn's bundles and periodically writes the
+    aggregated collapsed stacks to <output>/<name>/<host>-<pid>-<time>.collapsed
+    (a local directory or gs:// prefix). Each file holds the samples since the
+    previous one, so a whole run is just the concatenation of its files.
     """
-    header = obj.get('header', {})
-    entities = obj.get('entity', [])
-    
-    # Parse feed header timestamp (when MTA published this update)
-    feed_header_timestamp = None
-    ts = header.get('timestamp')
-    if ts:
-        try:
-            dt = datetime.datetime.fromtimestamp(int(ts), tz=datetime.timezone.utc)
-            feed_header_timestamp = dt.strftime('%Y-%m-%d %H:%M:%S')
-        except Exception:
-            pass
-    
-    unique_event_id = obj.get('unique_event_id')
-    
-    # Process each entity (trip update or vehicle position)
-    for ent in entities:
-        # Base record with common fields
-        base = {
-            "unique_event_id": unique_event_id,
-            "feed_header_timestamp": feed_header_timestamp,
-            "entity_id": ent.get('id'),
-            "trip_id": None,
-            "start_time": None,
-            "start_date": None,
-            "route_id": None,
-            "stop_id": None,
-            "vehicle_timestamp": None,
-            "current_status": None,
-            "current_stop_sequence": None,
-            "stop_name": None,
-            "stop_lat": None,
-            "stop_lon": None,
-            "direction": None
-        }
-        
-        # Process trip_update entities (scheduled predictions for stops)
-        if 'trip_update' in ent:
-            trip = ent['trip_update'].get('trip', {})
-            base.update({
-                'trip_id': trip.get('trip_id'),
-                'start_time': trip.get('start_time'),
-                'start_date': trip.get('start_date'),
-                'route_id': trip.get('route_id')
-            })
-            # Create one record per stop in the trip
-            for su in ent['trip_update'].get('stop_time_update', []) or []:
-                r = dict(base)
-                r['stop_id'] = su.get('stop_id')
-                yield {k: r.get(k) for k in REQUIRED_FIELDS}
-        
-        # Process vehicle entities (real-time positions)
-        elif 'vehicle' in ent:
-            v = ent['vehicle']
-            trip = v.get('trip', {})
-            r = dict(base)
-            r.update({
-                'trip_id': trip.get('trip_id'),
-                'start_time': trip.get('start_time'),
-                'start_date': trip.get('start_date'),
-                'route_id': trip.get('route_id'),
-                'stop_id': v.get('stop_id'),
-                'current_status': v.get('current_status'),  # STOPPED_AT, IN_TRANSIT_TO, etc.
-                'current_stop_sequence': v.get('current_stop_sequence')
-            })
-            
-            # Parse vehicle timestamp (when vehicle sensor recorded this position)
-            ts = v.get('timestamp')
-            if ts:
-                try:
-                    dt = datetime.datetime.fromtimestamp(int(ts), tz=datetime.timezone.utc)
-                    r['vehicle_timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except Exception:
-                    pass
-            yield {k: r.get(k) for k in REQUIRED_FIELDS}
+    def __init__(self, name, sample_rate, output, interval_ms=5, flush_seconds=60):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.output = output.rstrip('/')
+        self.interval_seconds = interval_ms / 1000.0
+        self.flush_seconds = flush_seconds
+        self._counts = collections.Counter()
+        self._sampler = None
+        self._last_flush = None
+
+    def start_bundle(self):
+        if random.random() < self.sample_rate:
+            self._sampler = StackSampler(self.interval_seconds)
+
+    def finish_bundle(self):
+        if self._sampler is not None:
+            self._counts.update(self._sampler.stop())
+            self._sampler = None
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self._last_flush is None:
+            self._last_flush = now
+        elif (now - self._last_flush).total_seconds() >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = datetime.datetime.now(datetime.timezone.utc)
+        if not self._counts:
+            return
+        from apache_beam.io.filesystems import FileSystems
+        path = (f"{self.output}/{self.name}/{socket.gethostname()}-{os.getpid()}-"
+                f"{self._last_flush:%Y%m%dT%H%M%S%f}.collapsed")
+        lines = ''.join(f"{stack} {count}\n" for stack, count in self._counts.most_common())
+        with FileSystems.create(path) as f:
+            f.write(lines.encode('utf-8'))
+        self._counts.clear()
+
+
+def make_profiler(known_args, name):
+    """BundleProfiler for a step, or None (no hooks at all) when profiling is off."""
+    if known_args.profile_sample_rate <= 0:
+        return None
+    return BundleProfiler(name, known_args.profile_sample_rate, known_args.profile_output,
+                          known_args.profile_interval_ms)
+
+
+class ProfiledDoFn(beam.DoFn):
+    """DoFn base that forwards bundle lifecycle to an optional BundleProfiler."""
+    def __init__(self, profiler=None):
+        super().__init__()
+        self.profiler = profiler
+
+    def start_bundle(self):
+        if self.profiler:
+            self.profiler.start_bundle()
+
+    def finish_bundle(self):
+        if self.profiler:
+            self.profiler.finish_bundle()
+
+    def teardown(self):
+        if self.profiler:
+            self.profiler.flush()
+
+
+class ProfiledMap(ProfiledDoFn):
+    """beam.Map equivalent whose bundles can be profiled (used only when profiling is on)."""
+    def __init__(self, fn, profiler):
+        super().__init__(profiler)
+        self.fn = fn
+
+    def process(self, element, *args, **kwargs):
+        yield self.fn(element, *args, **kwargs)
+
+
+def enrich_step(stops_map_pc, profiler=None):
+    """EnrichWithStops as a plain beam.Map, or a profiled ParDo when profiling is on."""
+    stops_map = beam.pvalue.AsDict(stops_map_pc)  # Side input as dictionary
+    if profiler is None:
+        return beam.Map(enrich_with_stops, stops_map=stops_map)
+    return beam.ParDo(ProfiledMap(enrich_with_stops, profiler), stops_map=stops_map)
 
 # ============================================
 # Beam DoFn for Parsing Pub/Sub Messages
 # ============================================
-class ParseAndFlatten(beam.DoFn):
+class ParseAndFlatten(ProfiledDoFn):
     """
     DoFn that parses Pub/Sub messages and flattens GTFS-RT data.
     
-    Input: Pub/Sub message with JSON payload
+    Input: Pub/Sub message with JSON payload, or the same payload as a
+           line of text (backfill mode reads archived payloads from files)
     Output: Flattened transit records (generator)
     """
     def process(self, element):
         # Decode Pub/Sub message payload
-        data = element.data.decode('utf-8')
+        data = element.data if hasattr(element, 'data') else element
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
         parsed = json.loads(data)
         
         # Add processing timestamp for debugging/monitoring
@@ -215,63 +215,367 @@ class ParseAndFlatten(beam.DoFn):
         # Flatten nested GTFS structure into row-level records
         yield from flatten_gtfs(parsed)
 
+# ============================================
+# Sequence Tracking (gap / reorder detection)
+# ============================================
+def sequence_key(element):
+    """
+    Keys a Pub/Sub message by its publisher-assigned sequence stream.
+
+    The event processor stamps every message with `stream` (feed or feed/route),
+    `sequence` (per-stream counter) and `sequence_epoch` (changes when an
+    instance starts). Messages without these attributes are skipped.
+    """
+    attrs = element.attributes or {}
+    if attrs.get('stream') and attrs.get('sequence') and attrs.get('sequence_epoch'):
+        yield (f"{attrs['stream']}@{attrs['sequence_epoch']}", int(attrs['sequence']))
+
+
+class TrackSequence(beam.DoFn):
+    """
+    Stateful DoFn that counts sequence gaps, reorders and duplicates per stream.
+
+    Counters (Dataflow job metrics, namespace 'sequence'):
+        gap_messages: sequence numbers skipped when a newer message arrived
+        reordered: late arrivals that filled a recorded gap
+        duplicates: redelivered sequence numbers (already seen, or older than the tracked gaps)
+    Messages still missing = gap_messages - reordered.
+
+    Gaps are kept in state as [first, last] ranges of missing sequence numbers
+    (at most MAX_TRACKED_GAPS, oldest dropped). Each stream@epoch key is cleared
+    once it has been idle for STATE_TTL_SECONDS, so the keys of earlier instance
+    epochs do not accumulate.
+    """
+    MAX_TRACKED_GAPS = 1000
+    STATE_TTL_SECONDS = 6 * 3600
+    MAX_SEQUENCE = ReadModifyWriteStateSpec('max_sequence', VarIntCoder())
+    MISSING = ReadModifyWriteStateSpec('missing', IterableCoder(TupleCoder([VarIntCoder(), VarIntCoder()])))
+    EXPIRY = TimerSpec('expiry', TimeDomain.REAL_TIME)
+
+    def __init__(self):
+        self.gap_messages = Metrics.counter('sequence', 'gap_messages')
+        self.reordered = Metrics.counter('sequence', 'reordered')
+        self.duplicates = Metrics.counter('sequence', 'duplicates')
+
+    def process(self, element,
+                max_sequence=beam.DoFn.StateParam(MAX_SEQUENCE),
+                missing_state=beam.DoFn.StateParam(MISSING),
+                expiry=beam.DoFn.TimerParam(EXPIRY)):
+        _, sequence = element
+        expiry.set(Timestamp.now() + Duration(seconds=self.STATE_TTL_SECONDS))
+        newest = max_sequence.read()
+        missing = list(missing_state.read() or [])
+        if newest is None or sequence > newest:
+            if newest is not None and sequence > newest + 1:
+                self.gap_messages.inc(sequence - newest - 1)
+                missing = (missing + [(newest + 1, sequence - 1)])[-self.MAX_TRACKED_GAPS:]
+                missing_state.write(missing)
+            max_sequence.write(sequence)
+            return
+        for index, (first, last) in enumerate(missing):
+            if first <= sequence <= last:
+                self.reordered.inc()
+                remaining = [(lo, hi) for lo, hi in ((first, sequence - 1), (sequence + 1, last)) if lo <= hi]
+                missing_state.write(missing[:index] + remaining + missing[index + 1:])
+                return
+        self.duplicates.inc()
+
+    @on_timer(EXPIRY)
+    def expire(self,
+               max_sequence=beam.DoFn.StateParam(MAX_SEQUENCE),
+               missing_state=beam.DoFn.StateParam(MISSING)):
+        max_sequence.clear()
+        missing_state.clear()
+
+# ============================================
+# Raw Archive Sink
+# ============================================
+class GzipJsonlSink(fileio.FileSink):
+    """
+    Writes raw Pub/Sub payloads as gzip-compressed JSON lines.
+
+    Payloads are already single-line JSON, so they are written byte for byte
+    without decoding. Backfill (--mode=backfill) and replay_feeds.py read
+    these files directly.
+    """
+    def open(self, fh):
+        self._gz = gzip.GzipFile(fileobj=fh, mode='wb', compresslevel=6)
+
+    def write(self, record):
+        _, payload = record
+        self._gz.write(payload)
+        self._gz.write(b'\n')
+
+    def flush(self):
+        # writes the gzip trailer; Beam closes the underlying file
+        self._gz.close()
+
+
+class AppendJsonlRecords(beam.DoFn):
+    """
+    Local streaming sink (--output in streaming mode): appends each record as a
+    JSON line, stamped with the wall-clock sink_time, to one file per worker
+    process under a local directory. WriteToText only handles bounded input,
+    and 8-benchmarks/e2e_harness.py tails these files to time the last hop.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def setup(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"records-{socket.gethostname()}-{os.getpid()}-{id(self):x}.jsonl")
+        self._file = open(path, 'a')
+
+    def process(self, record):
+        self._file.write(json.dumps(dict(record, sink_time=time.time())) + '\n')
+
+    def finish_bundle(self):
+        self._file.flush()
+
+    def teardown(self):
+        self._file.close()
+
+
+def archive_file_naming(window, pane, shard_index, total_shards, compression, destination):
+    """
+    dt=YYYY-MM-DD/feed=<feed>/HHMM-<pane>-<shard>-of-<total>.jsonl.gz (UTC window start)
+    """
+    start = window.start.to_utc_datetime()
+    return (f"dt={start:%Y-%m-%d}/feed={destination}/"
+            f"{start:%H%M}-{pane.index}-{shard_index:05d}-of-{total_shards:05d}.jsonl.gz")
+
+
+# ============================================
+# Shared Transforms
+# ============================================
+def load_stops_file(path):
+    """Reads a stops snapshot or CSV from GCS or a local path."""
+    from apache_beam.io.filesystems import FileSystems
+    with FileSystems.open(path) as f:
+        return parse_stops(f.read())
+
+
+def read_stops_map(p, stops_path=GCS_STOPS_PATH):
+    """
+    Side Input: Load Stop Metadata from GCS
+    The snapshot is read and decoded once (milliseconds) into (stop_id, metadata)
+    pairs for an O(1) lookup dictionary during enrichment
+    """
+    return (
+        p
+        | 'Stops path' >> beam.Create([stops_path])
+        | 'Load stops' >> beam.FlatMap(lambda path: load_stops_file(path).items())
+    )
+
+
+def partition_table(row):
+    """
+    Routes a row to its daily partition (UTC, like BigQuery) via a table decorator,
+    e.g. project.mta_updates.realtime_updates$20251031. Rows without a vehicle_timestamp
+    (the partition column) go to $__NULL__: BigQuery rejects a load whose rows do not
+    match the decorator's partition.
+    """
+    ts = row.get('vehicle_timestamp')
+    suffix = ts[:10].replace('-', '') if ts else '__NULL__'
+    return f"{BIGQUERY_TABLE}${suffix}"
+
+
+def in_partitions(row, days):
+    ts = row.get('vehicle_timestamp')
+    return bool(ts) and ts[:10] in days
+
+
+# archive_file_naming layout: dt=YYYY-MM-DD/feed=<feed>/HHMM-...
+ARCHIVE_FILE_PATTERN = re.compile(r'dt=(\d{4}-\d{2}-\d{2})/feed=([^/]+)/(\d{2})(\d{2})-')
+
+
+def uncovered_partitions(patterns, days, window_minutes):
+    """
+    Checks that the archive files matched by `patterns` hold every row of each day.
+
+    Every feed archived under a day's dt= directory must have a file for each of
+    the day's archive windows. Archive directories are keyed by publish time and
+    vehicle timestamps lag it, so each of those feeds also needs the first window
+    of the next day. A window without a file cannot be told apart from a missing
+    one, so it counts as uncovered.
+
+    Returns:
+        List of reasons, one per day the input does not fully cover
+    """
+    from apache_beam.io.filesystems import FileSystems
+    windows = collections.defaultdict(lambda: collections.defaultdict(set))  # dt -> feed -> window start minutes
+    for result in FileSystems.match(patterns):
+        for metadata in result.metadata_list:
+            match = ARCHIVE_FILE_PATTERN.search(metadata.path)
+            if match:
+                day, feed, hour, minute = match.groups()
+                windows[day][feed].add(int(hour) * 60 + int(minute))
+    expected = set(range(0, 24 * 60, window_minutes))
+    reasons = []
+    for day in sorted(days):
+        next_day = (datetime.date.fromisoformat(day) + datetime.timedelta(days=1)).isoformat()
+        if not windows[day]:
+            reasons.append(f"{day}: the input has no dt={day} archive files")
+            continue
+        for feed, present in sorted(windows[day].items()):
+            missing = sorted(expected - present)
+            if missing:
+                reasons.append(f"{day}: feed={feed} lacks {len(missing)} of {len(expected)} archive windows "
+                               f"(first {missing[0] // 60:02d}{missing[0] % 60:02d})")
+            elif 0 not in windows[next_day][feed]:
+                reasons.append(f"{day}: feed={feed} lacks the first window of dt={next_day}, "
+                               f"where the day's last rows are archived")
+    return reasons
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='MTA GTFS-RT pipeline')
+    parser.add_argument('--mode', choices=['streaming', 'backfill'], default='streaming',
+                        help='streaming reads Pub/Sub; backfill reprocesses archived payloads from files')
+    parser.add_argument('--input',
+                        help='backfill: comma-separated file patterns of archived raw payloads, one JSON message '
+                             'per line (.gz ok), e.g. gs://<your-project-id>-raw-archive/dt=2025-10-31/*/*.jsonl.gz')
+    parser.add_argument('--output',
+                        help='write JSONL records under this prefix instead of BigQuery (for local runs with '
+                             '--runner=DirectRunner; in streaming mode a local directory, records carry a sink_time)')
+    parser.add_argument('--subscription', default=f"projects/{PROJECT_ID}/subscriptions/{PUBSUB_SUBSCRIPTION}",
+                        help='streaming: Pub/Sub subscription to read (the emulator honours PUBSUB_EMULATOR_HOST)')
+    parser.add_argument('--replace_partitions',
+                        help='backfill: comma-separated UTC days (YYYY-MM-DD) to replace instead of appending to; '
+                             'only rows of these days are written, and the input must cover each day completely')
+    parser.add_argument('--archive_path',
+                        help='streaming: also write raw payloads to windowed gzip JSONL files under this prefix, '
+                             'e.g. gs://<your-project-id>-raw-archive')
+    parser.add_argument('--archive_window_minutes', type=int, default=10,
+                        help='minutes of messages per archive file, per feed (streaming: how the archive is '
+                             'written; backfill: what --replace_partitions expects to find)')
+    parser.add_argument('--stops', '--stops_csv', dest='stops', default=GCS_STOPS_PATH,
+                        help='stops snapshot from stops_snapshot.py, or stops.csv (a local path works with DirectRunner)')
+    parser.add_argument('--profile_sample_rate', type=float, default=0.0,
+                        help='fraction of ParseAndFlatten / EnrichWithStops bundles to sample-profile (0 = off, no hooks)')
+    parser.add_argument('--profile_output', default=f"{TEMP_LOCATION}/profiles",
+                        help='directory or gs:// prefix for collapsed stack files (flamegraph.pl / speedscope)')
+    parser.add_argument('--profile_interval_ms', type=float, default=5,
+                        help='stack sampling interval while a bundle is profiled')
+    known_args, pipeline_args = parser.parse_known_args(argv)
+    if known_args.mode == 'backfill' and not known_args.input:
+        parser.error('--input is required in backfill mode')
+    if known_args.mode == 'streaming' and known_args.output:
+        # AppendJsonlRecords writes with open(): on Dataflow workers that is their local disk
+        runner = 'DataflowRunner'  # run()'s default
+        for index, arg in enumerate(pipeline_args):
+            if arg.startswith('--runner='):
+                runner = arg.split('=', 1)[1]
+            elif arg == '--runner' and index + 1 < len(pipeline_args):
+                runner = pipeline_args[index + 1]
+        if runner != 'DirectRunner':
+            parser.error('--output in streaming mode needs --runner=DirectRunner (records go to local files)')
+        if '://' in known_args.output:
+            parser.error(f'--output in streaming mode must be a local directory, not {known_args.output}')
+    if known_args.replace_partitions:
+        known_args.replace_partitions = sorted({day.strip() for day in known_args.replace_partitions.split(',')
+                                                if day.strip()})
+        for day in known_args.replace_partitions:
+            try:
+                datetime.date.fromisoformat(day)
+            except ValueError:
+                parser.error(f'--replace_partitions: {day!r} is not a YYYY-MM-DD day')
+        if known_args.mode == 'backfill':
+            if known_args.archive_window_minutes < 1 or (24 * 60) % known_args.archive_window_minutes:
+                parser.error('--archive_window_minutes must divide a day evenly to check --replace_partitions coverage')
+            reasons = uncovered_partitions(known_args.input.split(','), known_args.replace_partitions,
+                                           known_args.archive_window_minutes)
+            if reasons:
+                parser.error('refusing to replace partitions the input does not fully cover:\n  '
+                             + '\n  '.join(reasons))
+    if not 0 <= known_args.profile_sample_rate <= 1:
+        parser.error('--profile_sample_rate must be between 0 and 1')
+    return known_args, pipeline_args
+
+
 # ============================================
 # Main Pipeline Function
 # ============================================
-def run():
+def use_setup_file(options):
+    """Ship gtfs_records.py to Dataflow workers; local runners import it from this directory."""
+    setup_options = options.view_as(SetupOptions)
+    if options.view_as(StandardOptions).runner == 'DataflowRunner' and not setup_options.setup_file:
+        setup_options.setup_file = SETUP_FILE
+
+
+def run(argv=None):
     """
     Dataflow streaming pipeline that:
     1. Reads MTA GTFS-RT updates from Pub/Sub
     2. Flattens nested protobuf structure
     3. Enriches with stop metadata from GCS
     4. Writes to BigQuery in real-time
+
+    With --mode=backfill the same transforms run as a bounded batch job over
+    archived payload files (see run_backfill).
     """
+    known_args, pipeline_args = parse_args(argv)
+    if known_args.mode == 'backfill':
+        return run_backfill(known_args, pipeline_args)
+
     # Configure pipeline options
-    options = PipelineOptions(
-        streaming=True,
-        project=PROJECT_ID,
-        region=REGION,
-        runner='DataflowRunner',
-        temp_location="gs://<your-project-id>-dataflow-temp",
-        staging_location="gs://<your-project-id>-dataflow-staging",
-        num_workers=2,
-        max_num_workers=5,
-        worker_machine_type='n2-highmem-16',
-        job_name='<your-project-id>-dataflow-streaming-pipeline'
-    )
+    # defaults first, so any --flag passed on the command line overrides them
+    options = PipelineOptions([
+        '--streaming',
+        f'--project={PROJECT_ID}',
+        f'--region={REGION}',
+        '--runner=DataflowRunner',
+        f'--temp_location={TEMP_LOCATION}',
+        f'--staging_location={STAGING_LOCATION}',
+        '--num_workers=2',
+        '--max_num_workers=5',
+        '--worker_machine_type=n2-highmem-16',
+        '--job_name=<your-project-id>-dataflow-streaming-pipeline',
+    ] + pipeline_args)
     options.view_as(StandardOptions).streaming = True
     options.view_as(SetupOptions).save_main_session = True
+    use_setup_file(options)
 
     with beam.Pipeline(options=options) as p:
-        # ============================================
-        # Side Input: Load Stop Metadata from GCS
-        # ============================================
-        # This creates a dictionary for O(1) lookup during enrichment
-        stops_map_pc = (
-            p
-            # Read CSV file from GCS (one line per stop)
-            | 'Read stops CSV' >> beam.io.ReadFromText(GCS_STOPS_CSV_PATH)
-            # Parse each CSV line using Python's csv.reader (handles quoted fields)
-            | 'Parse stops CSV' >> beam.Map(lambda line: next(csv.reader([line])) if line and line.strip() else None)
-            # Filter out invalid rows (None, short rows, header row)
-            | 'Filter valid stops' >> beam.Filter(lambda row: row and len(row) >= 4 and row[0].lower() != 'stop_id')
-            # Convert to (stop_id, metadata) tuples for dictionary conversion
-            # CSV format: stop_id, stop_name, stop_lat, stop_lon
-            | 'To stops map' >> beam.Map(lambda row: (row[0].strip(), {'stop_name': row[1].strip(), 'stop_lat': row[2].strip(), 'stop_lon': row[3].strip()}))
-        )
+        stops_map_pc = read_stops_map(p, known_args.stops)
 
         # ============================================
         # Main Pipeline: Process MTA Updates
         # ============================================
+        # Read from Pub/Sub subscription (MTA updates arrive here every ~15 seconds)
+        messages = p | 'ReadFromPubSub' >> beam.io.ReadFromPubSub(
+            subscription=known_args.subscription,
+            with_attributes=True
+        )
+
+        # Count gaps/reorders from the publisher's sequence attributes, so the
+        # subscription can run unordered while loss stays visible
         (
-            p
-            # Read from Pub/Sub subscription (MTA updates arrive here every ~15 seconds)
-            | 'ReadFromPubSub' >> beam.io.ReadFromPubSub(
-                subscription=f"projects/{PROJECT_ID}/subscriptions/{PUBSUB_SUBSCRIPTION}",
-                with_attributes=True
+            messages
+            | 'KeyBySequenceStream' >> beam.FlatMap(sequence_key)
+            | 'TrackSequence' >> beam.ParDo(TrackSequence())
+        )
+
+        # Optional raw archive: keeps every payload (including trip_updates the
+        # main path filters out). Bytes pass through untouched - no JSON decode
+        if known_args.archive_path:
+            (
+                messages
+                | 'KeyByFeed' >> beam.Map(lambda m: ((m.attributes or {}).get('feed', 'unknown'), m.data))
+                | 'ArchiveWindows' >> beam.WindowInto(beam.window.FixedWindows(known_args.archive_window_minutes * 60))
+                | 'WriteRawArchive' >> fileio.WriteToFiles(
+                    path=known_args.archive_path,
+                    destination=lambda record: record[0],
+                    sink=lambda destination: GzipJsonlSink(),
+                    file_naming=archive_file_naming,
+                    shards=1
+                )
             )
+
+        records = (
+            messages
             # Parse JSON and flatten GTFS-RT structure into individual records
-            | 'ParseAndFlatten' >> beam.ParDo(ParseAndFlatten())
+            | 'ParseAndFlatten' >> beam.ParDo(ParseAndFlatten(make_profiler(known_args, 'ParseAndFlatten')))
             # Apply windowing strategy for batch processing
             | 'WindowIntoFixedWindows' >> beam.WindowInto(
                                             beam.window.FixedWindows(30),  # 30-second windows (captures ~2 MTA updates)
@@ -285,19 +589,83 @@ def run():
             # Filter to only vehicle position updates (ignore trip_updates without current_status)
             | 'FilterCurrentStatus' >> beam.Filter(lambda r: r.get('current_status'))
             # Enrich with stop metadata (name, coordinates, direction)
-            | 'EnrichWithStops' >> beam.Map(
-                enrich_with_stops,
-                stops_map=beam.pvalue.AsDict(stops_map_pc)  # Side input as dictionary
-            )
+            | 'EnrichWithStops' >> enrich_step(stops_map_pc, make_profiler(known_args, 'EnrichWithStops'))
+        )
+
+        if known_args.output:
+            records | 'AppendToLocalFiles' >> beam.ParDo(AppendJsonlRecords(known_args.output))
+        else:
             # Write enriched records to BigQuery
-            | 'WriteToBigQuery' >> beam.io.WriteToBigQuery(
+            records | 'WriteToBigQuery' >> beam.io.WriteToBigQuery(
                 BIGQUERY_TABLE,
                 schema=BIGQUERY_SCHEMA,
                 write_disposition=beam.io.BigQueryDisposition.WRITE_APPEND,
                 create_disposition=beam.io.BigQueryDisposition.CREATE_IF_NEEDED,
-                method=beam.io.WriteToBigQuery.Method.STREAMING_INSERTS
+                method=beam.io.WriteToBigQuery.Method.STREAMING_INSERTS,
+                additional_bq_parameters=BIGQUERY_TABLE_PARAMETERS
             )
+
+
+def run_backfill(known_args, pipeline_args):
+    """
+    Bounded batch pipeline that:
+    1. Reads archived raw feed payloads (one Pub/Sub message body per line)
+    2. Applies the same ParseAndFlatten / filter / enrichment transforms
+    3. Appends with BigQuery file loads to the day partitions it touches, or with
+       --replace_partitions rewrites only the named (fully covered) days;
+       writes local JSONL files instead when --output is set
+    """
+    options = PipelineOptions([
+        f'--project={PROJECT_ID}',
+        f'--region={REGION}',
+        '--runner=DataflowRunner',
+        f'--temp_location={TEMP_LOCATION}',
+        f'--staging_location={STAGING_LOCATION}',
+        '--max_num_workers=20',
+        f"--job_name=<your-project-id>-backfill-{datetime.datetime.utcnow().strftime('%Y%m%d-%H%M%S')}",
+    ] + pipeline_args)
+    options.view_as(StandardOptions).streaming = False
+    options.view_as(SetupOptions).save_main_session = True
+    use_setup_file(options)
+
+    with beam.Pipeline(options=options) as p:
+        stops_map_pc = read_stops_map(p, known_args.stops)
+
+        records = (
+            p
+            | 'InputPatterns' >> beam.Create(known_args.input.split(','))
+            # Each line is one archived message body; .gz files are decompressed automatically
+            | 'ReadArchivedFeeds' >> beam.io.ReadAllFromText()
+            # Spread payloads across workers before the fan-out into rows
+            | 'Reshuffle' >> beam.Reshuffle()
+            | 'ParseAndFlatten' >> beam.ParDo(ParseAndFlatten(make_profiler(known_args, 'ParseAndFlatten')))
+            | 'FilterCurrentStatus' >> beam.Filter(lambda r: r.get('current_status'))
+            | 'EnrichWithStops' >> enrich_step(stops_map_pc, make_profiler(known_args, 'EnrichWithStops'))
         )
 
+        if known_args.output:
+            (
+                records
+                | 'ToJson' >> beam.Map(json.dumps)
+                | 'WriteToFiles' >> beam.io.WriteToText(known_args.output, file_name_suffix='.jsonl')
+            )
+        else:
+            if known_args.replace_partitions:
+                # WRITE_TRUNCATE per decorator: only the named days, whose rows are all in the input
+                records = records | 'KeepReplacedPartitions' >> beam.Filter(
+                    in_partitions, set(known_args.replace_partitions))
+                disposition = beam.io.BigQueryDisposition.WRITE_TRUNCATE
+            else:
+                disposition = beam.io.BigQueryDisposition.WRITE_APPEND
+            records | 'WriteToBigQuery' >> beam.io.WriteToBigQuery(
+                partition_table,
+                schema=BIGQUERY_SCHEMA,
+                write_disposition=disposition,
+                create_disposition=beam.io.BigQueryDisposition.CREATE_IF_NEEDED,
+                method=beam.io.WriteToBigQuery.Method.FILE_LOADS,
+                additional_bq_parameters=BIGQUERY_TABLE_PARAMETERS
+            )
+
+
 if __name__ == "__main__":
     run()
@@ -0,0 +1,212 @@
+"""
+GTFS-RT row transforms shared by the pipeline (1-dataflow/dataflow.py) and the
+live train board (9-train-board): flattening a converted feed into rows,
+decoding the stops snapshot and enriching rows with stop metadata.
+
+Plain Python with no Beam imports, so the board can use it without installing
+apache-beam; Dataflow workers get it through setup.py (--setup_file).
+"""
+import csv
+import datetime
+import io
+import json
+import struct
+import zlib
+
+# ============================================
+# Schema Definitions
+# ============================================
+# Fields required in the final output to BigQuery
+REQUIRED_FIELDS = [
+    'unique_event_id', 'feed_header_timestamp', 'entity_id', 'trip_id', 'start_time', 'start_date',
+    'route_id', 'stop_id', 'vehicle_timestamp', 'current_status', 'current_stop_sequence',
+    'stop_name', 'stop_lat', 'stop_lon', 'direction'
+]
+
+# ============================================
+# Enrichment Function
+# ============================================
+def enrich_with_stops(rec: dict, stops_map):
+    """
+    Enriches a transit record with stop metadata (name, lat/lon, direction).
+    
+    Args:
+        rec: Dictionary containing transit event data with 'stop_id'
+        stops_map: Dictionary mapping stop_id -> {stop_name, stop_lat, stop_lon}
+    
+    Returns:
+        Enriched dictionary with stop metadata and direction
+    
+    Logic:
+        1. Extract stop_id from record
+        2. Try exact match, then uppercase match
+        3. If no match and stop_id ends with letter (e.g., 'A01N'), try without suffix
+        4. Add stop name, coordinates, and derive direction from stop_id suffix
+    """
+    sid = rec.get('stop_id')
+    if not sid:
+        # No stop_id provided - return with null values
+        rec.update({'stop_name': None, 'stop_lat': None, 'stop_lon': None, 'direction': None})
+        return {k: rec.get(k) for k in REQUIRED_FIELDS}
+    
+    sid_processed = str(sid).strip()
+    
+    # Try exact match, then uppercase match
+    info = stops_map.get(sid_processed) or stops_map.get(sid_processed.upper())
+    
+    # If no match and stop_id ends with letter (direction indicator like 'N' or 'S'), try without it
+    if not info and sid_processed and sid_processed[-1].isalpha():
+        info = stops_map.get(sid_processed[:-1]) or stops_map.get(sid_processed[:-1].upper())
+    
+    # Populate stop metadata
+    rec['stop_name'] = info.get('stop_name') if info else None
+    try:
+        rec['stop_lat'] = float(info.get('stop_lat')) if info and info.get('stop_lat') else None
+    except ValueError:
+        rec['stop_lat'] = None
+    try:
+        rec['stop_lon'] = float(info.get('stop_lon')) if info and info.get('stop_lon') else None
+    except ValueError:
+        rec['stop_lon'] = None
+    
+    # Platform direction from the stops snapshot (suffix N/S); for other ids fall back to the
+    # stop_id itself (e.g., 'A01S' = Southbound, 'A01N' = Northbound)
+    direction = info.get('direction') if info else None
+    rec['direction'] = direction or ('Southbound' if sid_processed and 'S' in sid_processed else 'Northbound')
+    
+    return {k: rec.get(k) for k in REQUIRED_FIELDS}
+
+# ============================================
+# GTFS-Realtime Flattening Function
+# ============================================
+def flatten_gtfs(obj):
+    """
+    Flattens nested GTFS-Realtime protobuf JSON into row-level records.
+    
+    GTFS-RT structure:
+        - header: Feed metadata (timestamp)
+        - entity[]: Array of transit updates
+            - trip_update: Scheduled stop predictions
+            - vehicle: Real-time vehicle positions
+    
+    This function:
+        1. Extracts feed header timestamp
+        2. Iterates through entities
+        3. For trip_updates: Creates one row per stop_time_update
+        4. For vehicle updates: Creates one row per vehicle position
+        5. Returns flattened records suitable for BigQuery
+    """
+    header = obj.get('header', {})
+    entities = obj.get('entity', [])
+    
+    # Parse feed header timestamp (when MTA published this update)
+    feed_header_timestamp = None
+    ts = header.get('timestamp')
+    if ts:
+        try:
+            dt = datetime.datetime.fromtimestamp(int(ts), tz=datetime.timezone.utc)
+            feed_header_timestamp = dt.strftime('%Y-%m-%d %H:%M:%S')
+        except Exception:
+            pass
+    
+    unique_event_id = obj.get('unique_event_id')
+    
+    # Process each entity (trip update or vehicle position)
+    for ent in entities:
+        # Base record with common fields
+        base = {
+            "unique_event_id": unique_event_id,
+            "feed_header_timestamp": feed_header_timestamp,
+            "entity_id": ent.get('id'),
+            "trip_id": None,
+            "start_time": None,
+            "start_date": None,
+            "route_id": None,
+            "stop_id": None,
+            "vehicle_timestamp": None,
+            "current_status": None,
+            "current_stop_sequence": None,
+            "stop_name": None,
+            "stop_lat": None,
+            "stop_lon": None,
+            "direction": None
+        }
+        
+        # Process trip_update entities (scheduled predictions for stops)
+        if 'trip_update' in ent:
+            trip = ent['trip_update'].get('trip', {})
+            base.update({
+                'trip_id': trip.get('trip_id'),
+                'start_time': trip.get('start_time'),
+                'start_date': trip.get('start_date'),
+                'route_id': trip.get('route_id')
+            })
+            # Create one record per stop in the trip
+            for su in ent['trip_update'].get('stop_time_update', []) or []:
+                r = dict(base)
+                r['stop_id'] = su.get('stop_id')
+                yield {k: r.get(k) for k in REQUIRED_FIELDS}
+        
+        # Process vehicle entities (real-time positions)
+        elif 'vehicle' in ent:
+            v = ent['vehicle']
+            trip = v.get('trip', {})
+            r = dict(base)
+            r.update({
+                'trip_id': trip.get('trip_id'),
+                'start_time': trip.get('start_time'),
+                'start_date': trip.get('start_date'),
+                'route_id': trip.get('route_id'),
+                'stop_id': v.get('stop_id'),
+                'current_status': v.get('current_status'),  # STOPPED_AT, IN_TRANSIT_TO, etc.
+                'current_stop_sequence': v.get('current_stop_sequence')
+            })
+            
+            # Parse vehicle timestamp (when vehicle sensor recorded this position)
+            ts = v.get('timestamp')
+            if ts:
+                try:
+                    dt = datetime.datetime.fromtimestamp(int(ts), tz=datetime.timezone.utc)
+                    r['vehicle_timestamp'] = dt.strftime('%Y-%m-%d %H:%M:%S')
+                except Exception:
+                    pass
+            yield {k: r.get(k) for k in REQUIRED_FIELDS}
+
+# ============================================
+# Stops Snapshot
+# ============================================
+# Reader for the snapshot written by stops_snapshot.py (bump together with stops_snapshot.FORMAT_VERSION)
+STOPS_SNAPSHOT_MAGIC = b'MTASTOPS'
+STOPS_SNAPSHOT_VERSION = 1
+STOPS_SNAPSHOT_HEADER = '<8sHI32s'  # format string, not struct.Struct: dataflow.py's main session must pickle
+STOPS_DIRECTIONS = {'N': 'Northbound', 'S': 'Southbound'}
+
+
+def parse_stops(data):
+    """
+    Builds the stop_id -> {stop_name, stop_lat, stop_lon, station_id, direction} lookup
+    from a stops snapshot, or from stops.csv with the same rules stops_snapshot.py
+    compiles with (BOM stripped, columns by header, platforms linked to their station).
+    """
+    if data[:len(STOPS_SNAPSHOT_MAGIC)] == STOPS_SNAPSHOT_MAGIC:
+        _, version, length, _ = struct.unpack_from(STOPS_SNAPSHOT_HEADER, data)
+        header_size = struct.calcsize(STOPS_SNAPSHOT_HEADER)
+        if version != STOPS_SNAPSHOT_VERSION:
+            raise ValueError(f"stops snapshot format {version}, expected {STOPS_SNAPSHOT_VERSION}")
+        payload = json.loads(zlib.decompress(data[header_size:header_size + length]))
+        stations = payload['stations']
+        platforms = [(stop_id, stations[index][0], payload['directions'][suffix])
+                     for stop_id, index, suffix in payload['platforms']]
+    else:
+        rows = list(csv.DictReader(io.StringIO(data.decode('utf-8-sig'))))
+        stations = [[r['stop_id'].strip(), r['stop_name'].strip(), float(r['stop_lat']), float(r['stop_lon'])]
+                     for r in rows if (r.get('location_type') or '').strip() == '1']
+        platforms = [(r['stop_id'].strip(), r['parent_station'].strip(), STOPS_DIRECTIONS.get(r['stop_id'].strip()[-1:]))
+                     for r in rows if (r.get('location_type') or '').strip() != '1' and r.get('parent_station')]
+
+    lookup = {stop_id: {'stop_name': name, 'stop_lat': lat, 'stop_lon': lon, 'station_id': stop_id, 'direction': None}
+              for stop_id, name, lat, lon in stations}
+    for stop_id, station_id, direction in platforms:
+        if station_id in lookup:
+            lookup[stop_id] = dict(lookup[station_id], direction=direction)
+    return lookup
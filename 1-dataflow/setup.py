@@ -0,0 +1,11 @@
+"""
+Packages the modules dataflow.py imports so Dataflow workers can load them
+(passed as --setup_file by dataflow.py; no dependencies beyond the SDK image).
+"""
+import setuptools
+
+setuptools.setup(
+    name='mta-dataflow-pipeline',
+    version='1.0.0',
+    py_modules=['gtfs_records'],
+)
@@ -1,13 +1,19 @@
 import os
+import time
+import threading
+import importlib
 import requests
 import json
 from flask import Flask, Response, request
-from google.cloud import pubsub_v1
-from google.protobuf.json_format import MessageToJson
-from google.transit import gtfs_realtime_pb2
 import datetime
 import base64
 import logging
+import random
+import concurrent.futures
+from urllib.parse import unquote
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+import profiling
 
 app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -15,76 +21,308 @@ logging.basicConfig(level=logging.INFO)
 #----Configuration
 PROJECT_ID = os.environ.get('PROJECT_ID')
 NYC_SUBWAY_FEED_URL = os.environ.get('NYC_SUBWAY_FEED_URL')
+# optional comma-separated list of feed urls polled on every trigger; falls back to NYC_SUBWAY_FEED_URL
+NYC_SUBWAY_FEED_URLS = os.environ.get('NYC_SUBWAY_FEED_URLS')
 PUBSUB_TOPIC_ID = os.environ.get('PUBSUB_TOPIC_ID')
+# warm the heavy clients in a background thread as soon as the worker boots,
+# so the first request after scale-from-zero doesn't pay for them
+PREWARM_CLIENTS = os.environ.get('PREWARM_CLIENTS', 'true').lower() == 'true'
+# fraction of requests whose headers/body are logged (1.0 logs every request)
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', '0.01'))
+FEED_WORKERS = int(os.environ.get('FEED_WORKERS', '8'))  # max feeds processed at once
+FEED_TIMEOUT_SECONDS = float(os.environ.get('FEED_TIMEOUT_SECONDS', '15'))  # deadline per trigger for each feed
+# 'none' publishes unordered, 'feed' orders each feed, 'route' splits feeds into one ordered message per route
+ORDERING_KEY_MODE = os.environ.get('ORDERING_KEY_MODE', 'none').lower()
 #----------
 
-publisher = pubsub_v1.PublisherClient()
+def feed_name(url):
+    # e.g. https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-ace -> gtfs-ace
+    return unquote(url).rstrip('/').rsplit('/', 1)[-1]
 
-@app.route('/', methods=['POST'])
-def fetch_and_publish_subway_data():
-    # --- IMMEDIATE LOGGING FOR INCOMING REQUEST ---
-    logging.info(f"Received POST request from Cloud Tasks. Request Headers: {request.headers}")
-    if request.data:
-        logging.info(f"Request Body: {request.data.decode('utf-8')}") # Log body if present
 
-    missing = [name for name, val in (
-        ("GCP_PROJECT_ID", PROJECT_ID),
-        ("PUBSUB_TOPIC_ID", PUBSUB_TOPIC_ID),
-        ("NYC_SUBWAY_FEED_URL", NYC_SUBWAY_FEED_URL),
-    ) if not val]
-    if missing:
-        logging.error("Missing required environment variables: %s", missing)
-        # --- RETURN 400 FOR CONFIGURATION ERRORS ---
-        return (f"Missing required environment variables: {', '.join(missing)}", 400)
+FEED_URLS = [url.strip() for url in (NYC_SUBWAY_FEED_URLS or NYC_SUBWAY_FEED_URL or '').split(',') if url.strip()]
+FEEDS = {feed_name(url): url for url in FEED_URLS}
+
+#----Metrics (scraped from GET /metrics)
+STAGE_SECONDS = Histogram(
+    'feed_stage_seconds', 'Time spent in each stage of fetch_and_publish_subway_data',
+    ['feed', 'stage'], buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+FEED_BYTES = Counter('feed_bytes_total', 'Raw protobuf bytes fetched from the MTA feed', ['feed'])
+FEED_ENTITIES = Counter('feed_entities_total', 'GTFS-RT entities parsed from the MTA feed', ['feed'])
+FEEDS_UNCHANGED = Counter('feeds_unchanged_total', 'Fetched feeds whose header timestamp matched the previous fetch', ['feed'])
+FEED_FAILURES = Counter('feed_failures_total', 'Failed feed fetch/publish attempts', ['feed', 'stage'])
+_last_feed_timestamps = {}  # feed name -> header timestamp of the previous fetch
+#----------
+
+#----Sequence numbers
+# every published message carries a per-stream sequence number so the pipeline can
+# count gaps and reorders; the epoch changes on each instance start, so counters
+# reset by a cold start (or running several instances) never look like a gap
+SEQUENCE_EPOCH = f"{int(time.time() * 1000)}-{os.getpid()}"
+_sequences = {}  # stream (feed name or feed/route) -> last sequence number handed out
+_sequences_lock = threading.Lock()
+
+
+def next_sequence(stream):
+    with _sequences_lock:
+        _sequences[stream] = _sequences.get(stream, 0) + 1
+        return _sequences[stream]
+#----------
+
+#----Lazy client construction
+# pubsub_v1 (grpc) and the gtfs protobuf descriptors dominate import time,
+# so they are loaded on first use instead of at module import
+STARTUP_TIMINGS = {}  # component -> seconds spent loading it
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _timed(name, loader):
+    start = time.perf_counter()
+    value = loader()
+    STARTUP_TIMINGS[name] = time.perf_counter() - start
+    return value
+
+
+def _load_publisher():
+    pubsub_v1 = _timed('import google.cloud.pubsub_v1', lambda: importlib.import_module('google.cloud.pubsub_v1'))
+    publisher_options = pubsub_v1.types.PublisherOptions(enable_message_ordering=ORDERING_KEY_MODE != 'none')
+    return _timed('construct PublisherClient', lambda: pubsub_v1.PublisherClient(publisher_options=publisher_options))
+
+
+def _load_gtfs():
+    gtfs_realtime_pb2 = _timed('import gtfs_realtime_pb2', lambda: importlib.import_module('google.transit.gtfs_realtime_pb2'))
+    json_format = _timed('import protobuf json_format', lambda: importlib.import_module('google.protobuf.json_format'))
+    return gtfs_realtime_pb2, json_format.MessageToJson
+
+
+def _get_client(name, loader):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = loader()
+    return client
+
+
+def get_publisher():
+    return _get_client('publisher', _load_publisher)
+
+
+def get_gtfs():
+    """Returns (gtfs_realtime_pb2, MessageToJson)."""
+    return _get_client('gtfs', _load_gtfs)
+
+
+def prewarm():
+    start = time.perf_counter()
+    try:
+        get_gtfs()
+        get_publisher()
+    except Exception:
+        logging.exception("Client prewarm failed, clients will be constructed on first request")
+        return
+    total = time.perf_counter() - start
+    report = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in STARTUP_TIMINGS.items())
+    logging.info(f"Startup timing report: total={total * 1000:.0f}ms ({report})")
+
 
+if PREWARM_CLIENTS:
+    threading.Thread(target=prewarm, name='prewarm-clients', daemon=True).start()
+#----------
+
+def _entity_route(entity):
+    update = entity.get('trip_update') or entity.get('vehicle') or {}
+    return update.get('trip', {}).get('route_id') or 'unknown'
+
+
+def split_for_ordering(name, message):
+    """
+    Apply ORDERING_KEY_MODE to a converted feed.
+
+    Returns:
+        List of (ordering_key, sequence stream, message) tuples; route messages
+        keep the feed header so ParseAndFlatten reads them like a whole feed
+    """
+    if ORDERING_KEY_MODE != 'route':
+        return [(name if ORDERING_KEY_MODE == 'feed' else '', name, message)]
+    by_route = {}
+    for entity in message.get('entity', []):
+        by_route.setdefault(_entity_route(entity), []).append(entity)
+    messages = []
+    for route_id, entities in sorted(by_route.items()):
+        stream = f"{name}/{route_id}"
+        route_message = dict(message, entity=entities,
+                             unique_event_id=f"{message['unique_event_id']}-{route_id}")
+        messages.append((stream, stream, route_message))
+    return messages
+
+
+#----Feed worker pool
+# module level so feeds that blow their deadline keep running in the background
+# instead of holding up the response; shared by all request threads, so feeds
+# still queued at the deadline are cancelled rather than reported as running
+_feed_executor = concurrent.futures.ThreadPoolExecutor(max_workers=FEED_WORKERS, thread_name_prefix='feed')
+
+
+def process_feed(name, url, sampler=None):
+    """
+    Fetch, parse, convert and publish a single GTFS-RT feed.
+
+    Feeds run on separate workers, so one feed can be publishing while
+    another is still being fetched or parsed.
+
+    Returns:
+        Dict with the feed's status, used in the handler's response
+    """
+    stage = 'fetch'
+    if sampler:
+        # profiled request (PROFILE_SAMPLE_RATE): sample this worker while it serves it
+        sampler.add_current_thread()
     try:
         #1 fetch data from NYC subway api
-        response = requests.get(NYC_SUBWAY_FEED_URL, timeout=10)
-        response.raise_for_status() # raise an exception for http errors
+        with STAGE_SECONDS.labels(name, 'fetch').time():
+            response = requests.get(url, timeout=min(10, FEED_TIMEOUT_SECONDS))
+            response.raise_for_status() # raise an exception for http errors
+        FEED_BYTES.labels(name).inc(len(response.content))
 
         #2 parse grfs realitme protocol buffer
-        feed = gtfs_realtime_pb2.FeedMessage()
-        feed.ParseFromString(response.content)
+        stage = 'parse'
+        gtfs_realtime_pb2, MessageToJson = get_gtfs()
+        with STAGE_SECONDS.labels(name, 'parse').time():
+            feed = gtfs_realtime_pb2.FeedMessage()
+            feed.ParseFromString(response.content)
+        FEED_ENTITIES.labels(name).inc(len(feed.entity))
 
         #3 convert to human-readable json
-        human_readable_data_json = MessageToJson(
-            feed, preserving_proto_field_name=True, indent=2)
-        data_bytes = human_readable_data_json.encode('utf-8')
+        stage = 'convert'
+        with STAGE_SECONDS.labels(name, 'convert').time():
+            human_readable_data_json = MessageToJson(
+                feed, preserving_proto_field_name=True, indent=2)
 
-        # 4 determine ordering key and unique event id
-        feed_timestamp = (feed.header.timestamp
-        if feed.header.HasField('timestamp')
-        else int(datetime.datetime.now(datetime.timezone.utc).timestamp()))
+            # 4 determine ordering key and unique event id
+            feed_timestamp = (feed.header.timestamp
+            if feed.header.HasField('timestamp')
+            else int(datetime.datetime.now(datetime.timezone.utc).timestamp()))
 
-        parsed_json_dict = json.loads(human_readable_data_json)
-        parsed_json_dict['unique_event_id'] = f"{feed_timestamp}-{hash(human_readable_data_json)}"
-        parsed_json_dict["event_timestamp_unix"] = feed_timestamp
+            parsed_json_dict = json.loads(human_readable_data_json)
+            parsed_json_dict['unique_event_id'] = f"{feed_timestamp}-{hash(human_readable_data_json)}"
+            parsed_json_dict["event_timestamp_unix"] = feed_timestamp
 
-        # re-encode the json with the added unique event id
-        data_bytes_with_id = json.dumps(parsed_json_dict).encode('utf-8')
+            # (ordering key, message) pairs - one per route in 'route' mode, otherwise the whole feed
+            messages = split_for_ordering(name, parsed_json_dict)
+
+        if _last_feed_timestamps.get(name) == feed_timestamp:
+            FEEDS_UNCHANGED.labels(name).inc()
+        _last_feed_timestamps[name] = feed_timestamp
 
         #5 publish to pub/sub with ordering_key
         # PUBSUB_TOPIC_ID is already the full path: projects/PROJECT_ID/topics/TOPIC_NAME
-        topic_path = PUBSUB_TOPIC_ID
-        future = publisher.publish(
-            topic_path,
-            data=data_bytes_with_id
-            #ordering_key=ordering_key # set ordering key here
-        )
-        message_id = future.result()
-
-        logging.info(f"Successfully fetched, parsed, and published data to {topic_path}. Message ID: {message_id}")
-        # --- EXPLICIT SUCCESS RESPONSE ---
-        return f"Successfully fetched, parsed and published data to {topic_path}. Message ID: {message_id}", 200
+        stage = 'publish'
+        publisher = get_publisher()
+        with STAGE_SECONDS.labels(name, 'publish').time():
+            futures = []
+            for ordering_key, stream, message in messages:
+                # re-encode the json with the added unique event id
+                futures.append((ordering_key, publisher.publish(
+                    PUBSUB_TOPIC_ID,
+                    data=json.dumps(message).encode('utf-8'),
+                    ordering_key=ordering_key,
+                    feed=name,
+                    stream=stream,
+                    sequence=str(next_sequence(stream)),
+                    sequence_epoch=SEQUENCE_EPOCH,
+                )))
+            message_ids = []
+            for ordering_key, future in futures:
+                try:
+                    message_ids.append(future.result())
+                except Exception:
+                    if ordering_key:
+                        # a failed publish pauses its ordering key until resumed
+                        publisher.resume_publish(PUBSUB_TOPIC_ID, ordering_key)
+                    raise
+
+        return {"feed": name, "status": "PUBLISHED", "message_ids": message_ids, "entities": len(feed.entity)}
 
     except requests.exceptions.RequestException as e:
-        logging.exception("HTTP request to NYC subway API failed")
-        # --- RETURN 500 FOR EXTERNAL API FAILURES TO TRIGGER RETRY ---
-        return f"Failed to fetch subway data: {e}", 500
+        FEED_FAILURES.labels(name, stage).inc()
+        logging.exception(f"HTTP request to NYC subway API failed for feed {name}")
+        return {"feed": name, "status": "FETCH_ERROR", "error": str(e)}
     except Exception as e:
-        logging.exception("An unexpected error occurred during data processing or publishing")
-        # --- RETURN 500 FOR UNEXPECTED INTERNAL ERRORS ---
-        return f"An unexpected error occurred: {e}", 500
+        FEED_FAILURES.labels(name, stage).inc()
+        logging.exception(f"An unexpected error occurred during {stage} of feed {name}")
+        return {"feed": name, "status": "ERROR", "stage": stage, "error": str(e)}
+    finally:
+        if sampler:
+            sampler.remove_current_thread()
+#----------
+
+@app.route('/', methods=['POST'])
+@profiling.profiled
+def fetch_and_publish_subway_data():
+    # --- SAMPLED LOGGING FOR INCOMING REQUEST ---
+    if random.random() < REQUEST_LOG_SAMPLE_RATE:
+        logging.info(f"Received POST request from Cloud Tasks. Request Headers: {request.headers}")
+        if request.data:
+            logging.info(f"Request Body: {request.data.decode('utf-8')}") # Log body if present
+
+    missing = [name for name, val in (
+        ("GCP_PROJECT_ID", PROJECT_ID),
+        ("PUBSUB_TOPIC_ID", PUBSUB_TOPIC_ID),
+        ("NYC_SUBWAY_FEED_URL", FEED_URLS),
+    ) if not val]
+    if missing:
+        logging.error("Missing required environment variables: %s", missing)
+        # --- RETURN 400 FOR CONFIGURATION ERRORS ---
+        return (f"Missing required environment variables: {', '.join(missing)}", 400)
+
+    # the trigger body may narrow the poll to a subset of the configured feeds: {"feeds": ["gtfs-ace"]}
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict):
+        return ("Trigger body must be a JSON object, e.g. {\"feeds\": [\"gtfs-ace\"]}", 400)
+    requested = body.get('feeds') or list(FEEDS)
+    if isinstance(requested, str):
+        requested = [requested]
+    if not isinstance(requested, list) or not all(isinstance(name, str) for name in requested):
+        return ("\"feeds\" must be a feed name or a list of feed names", 400)
+    requested = list(dict.fromkeys(requested))  # drop duplicates, keep order
+    unknown = [name for name in requested if name not in FEEDS]
+    if unknown:
+        return (f"Unknown feeds: {', '.join(unknown)}. Configured feeds: {', '.join(FEEDS)}", 400)
+
+    sampler = profiling.current_sampler()
+    futures = {_feed_executor.submit(process_feed, name, FEEDS[name], sampler): name for name in requested}
+    done, not_done = concurrent.futures.wait(futures, timeout=FEED_TIMEOUT_SECONDS)
+
+    results = [future.result() for future in done]
+    for future in not_done:
+        if future.cancel():
+            # still queued behind other requests' feeds: never started, nothing was published
+            FEED_FAILURES.labels(futures[future], 'not_started').inc()
+            results.append({"feed": futures[future], "status": "NOT_STARTED",
+                            "error": f"no feed worker free within {FEED_TIMEOUT_SECONDS}s"})
+        else:
+            # already running: it keeps going in the background and may still publish
+            FEED_FAILURES.labels(futures[future], 'timeout').inc()
+            results.append({"feed": futures[future], "status": "TIMEOUT",
+                            "error": f"not published within {FEED_TIMEOUT_SECONDS}s, may still publish"})
+    results.sort(key=lambda result: requested.index(result["feed"]))
+
+    published = sum(result["status"] == "PUBLISHED" for result in results)
+    in_flight = sum(result["status"] == "TIMEOUT" for result in results)
+    logging.info(f"Published {published}/{len(results)} feeds to {PUBSUB_TOPIC_ID}: "
+                 + ", ".join(f"{r['feed']}={r['status']}" for r in results))
+    # --- 200 WHEN EVERY FEED PUBLISHED, 207 FOR PARTIAL SUCCESS OR FEEDS STILL IN FLIGHT (NOT RETRIED:
+    # A RETRY WOULD PUBLISH THEM TWICE), 500 TO TRIGGER RETRY WHEN NOTHING WAS OR CAN STILL BE PUBLISHED ---
+    if published == len(results):
+        status_code = 200
+    elif published or in_flight:
+        status_code = 207
+    else:
+        status_code = 500
+    return {"feeds": results}, status_code
 
 @app.route('/', methods=['GET'])
 def health_check():
@@ -93,6 +331,19 @@ def health_check():
     return "MTA Request Endpoint is running!", 200
 
 
+@app.route('/startupz', methods=['GET'])
+def startup_report():
+    # --- PER-COMPONENT LOAD TIMES, IN SECONDS ---
+    return dict(STARTUP_TIMINGS), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # --- PROMETHEUS TEXT EXPOSITION ---
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
+    # local development only - containers serve through gunicorn (see Dockerfile)
+    app.run(debug=os.environ.get('FLASK_DEBUG', 'false').lower() == 'true', host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
 
@@ -0,0 +1,140 @@
+"""
+Opt-in sampling profiler for fetch_and_publish_subway_data.
+
+A sampled fraction of requests (PROFILE_SAMPLE_RATE) have the Python stacks of
+the request thread and of the feed workers serving it sampled every
+PROFILE_INTERVAL_MS. Samples are aggregated as collapsed stacks
+('outer;...;inner count', the input of flamegraph.pl / speedscope) and written
+every PROFILE_FLUSH_SECONDS to PROFILE_OUTPUT (a local directory or a gs://
+prefix) as <output>/event-processor/<host>-<pid>-<time>.collapsed.
+With PROFILE_SAMPLE_RATE=0 (the default) nothing is started or imported.
+"""
+import collections
+import datetime
+import functools
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+#----Configuration
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_OUTPUT = os.environ.get('PROFILE_OUTPUT', '/tmp/profiles')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+PROFILE_FLUSH_SECONDS = float(os.environ.get('PROFILE_FLUSH_SECONDS', '60'))
+#----------
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of a set of threads from a daemon thread.
+    (1-dataflow/dataflow.py carries the same sampler for the pipeline DoFns.)
+    """
+    def __init__(self, interval_seconds):
+        self.interval_seconds = interval_seconds
+        self.counts = collections.Counter()
+        self.thread_ids = {threading.get_ident()}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.counts[';'.join(reversed(stack))] += 1
+
+    def add_current_thread(self):
+        # feed workers join the request's sampler while they serve it
+        self.thread_ids.add(threading.get_ident())
+
+    def remove_current_thread(self):
+        self.thread_ids.discard(threading.get_ident())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+
+_counts = collections.Counter()
+_counts_lock = threading.Lock()
+_last_flush = time.monotonic()
+_local = threading.local()
+
+
+def profiled(handler):
+    """
+    Route decorator: sample-profile PROFILE_SAMPLE_RATE of the handler's requests.
+    Returns the handler itself when profiling is off, so there is no per-request cost.
+    """
+    if PROFILE_SAMPLE_RATE <= 0:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        sampler = start_request()
+        _local.sampler = sampler
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            _local.sampler = None
+            if sampler:
+                finish_request(sampler)
+    return wrapper
+
+
+def current_sampler():
+    """The sampler of the request being handled on this thread, if it is profiled."""
+    return getattr(_local, 'sampler', None)
+
+
+def start_request():
+    """A StackSampler for this request if it is sampled, else None."""
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return StackSampler(PROFILE_INTERVAL_MS / 1000.0)
+    return None
+
+
+def finish_request(sampler):
+    """Fold a request's samples into the aggregate; flush in the background when due."""
+    global _last_flush
+    counts = sampler.stop()
+    with _counts_lock:
+        _counts.update(counts)
+        due = time.monotonic() - _last_flush >= PROFILE_FLUSH_SECONDS
+        if due:
+            _last_flush = time.monotonic()
+    if due:
+        threading.Thread(target=flush, name='profile-flush', daemon=True).start()
+
+
+def flush():
+    """Write (and reset) the aggregated stacks; each file holds the samples since the previous one."""
+    with _counts_lock:
+        if not _counts:
+            return None
+        lines = ''.join(f"{stack} {count}\n" for stack, count in _counts.most_common())
+        _counts.clear()
+    name = (f"event-processor/{socket.gethostname()}-{os.getpid()}-"
+            f"{datetime.datetime.now(datetime.timezone.utc):%Y%m%dT%H%M%S%f}.collapsed")
+    if PROFILE_OUTPUT.startswith('gs://'):
+        from google.cloud import storage
+        bucket, _, prefix = PROFILE_OUTPUT[len('gs://'):].partition('/')
+        path = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        storage.Client().bucket(bucket).blob(path).upload_from_string(lines, content_type='text/plain')
+        return f"gs://{bucket}/{path}"
+    path = os.path.join(PROFILE_OUTPUT, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(lines)
+    return path
@@ -1,71 +1,113 @@
 # main.py for event-task-enqueuer
 import os
 import json
+import time
+import threading
+import importlib
+import urllib.request
 from datetime import datetime, timedelta
 
 from flask import Flask, request
-from google.cloud import tasks_v2
 
 app = Flask(__name__)
-client = tasks_v2.CloudTasksClient()
 
 PROJECT_ID = os.environ.get('PROJECT_ID')
 REGION = os.environ.get('REGION')
 TASK_QUEUE_NAME = os.environ.get('TASK_QUEUE_NAME')
 EVENT_FEED_PROCESSOR_SERVICE_URL = os.environ.get('EVENT_FEED_PROCESSOR_SERVICE_URL') 
 TASKS_SA_EMAIL = os.environ.get('TASKS_SA_EMAIL') # Service account for Cloud Tasks to invoke processor
+PREWARM_CLIENTS = os.environ.get('PREWARM_CLIENTS', 'true').lower() == 'true'
+# 'cloud_tasks' enqueues through Cloud Tasks; 'local' POSTs to the processor from this process
+# (stand-in for local runs and 8-benchmarks/e2e_harness.py - no auth, no retries)
+TASK_DISPATCH = os.environ.get('TASK_DISPATCH', 'cloud_tasks').lower()
+TASKS_PER_TRIGGER = int(os.environ.get('TASKS_PER_TRIGGER', '3'))  # processor triggers per scheduler call
+TASK_INTERVAL_SECONDS = float(os.environ.get('TASK_INTERVAL_SECONDS', '20'))  # spacing between them
+
+# tasks_v2 pulls in grpc and the generated protobufs, so it is imported and the
+# client constructed on first use (or by the prewarm thread) instead of at import
+STARTUP_TIMINGS = {}  # component -> seconds spent loading it
+_tasks = None  # (tasks_v2 module, CloudTasksClient)
+_tasks_lock = threading.Lock()
+
+
+def get_tasks():
+    """Returns (tasks_v2, client), loading them once."""
+    global _tasks
+    if _tasks is None:
+        with _tasks_lock:
+            if _tasks is None:
+                start = time.perf_counter()
+                tasks_v2 = importlib.import_module('google.cloud.tasks_v2')
+                STARTUP_TIMINGS['import google.cloud.tasks_v2'] = time.perf_counter() - start
+                start = time.perf_counter()
+                client = tasks_v2.CloudTasksClient()
+                STARTUP_TIMINGS['construct CloudTasksClient'] = time.perf_counter() - start
+                _tasks = (tasks_v2, client)
+    return _tasks
+
+
+def prewarm():
+    try:
+        get_tasks()
+    except Exception as e:
+        print(f"Client prewarm failed, client will be constructed on first request: {e}")
+        return
+    report = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in STARTUP_TIMINGS.items())
+    print(f"Startup timing report: {report}")
+
+
+if PREWARM_CLIENTS and TASK_DISPATCH != 'local':
+    threading.Thread(target=prewarm, name='prewarm-clients', daemon=True).start()
+
+def dispatch_locally(url, body, delay_seconds):
+    """Cloud Tasks stand-in: POST the task body to the processor after delay_seconds."""
+    def send():
+        task_request = urllib.request.Request(
+            url, data=body, headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(task_request, timeout=60) as response:
+                response.read()
+        except Exception as e:
+            print(f"Local dispatch to {url} failed: {e}")
+
+    timer = threading.Timer(delay_seconds, send)
+    timer.daemon = True
+    timer.start()
+
 
 @app.route('/', methods=['POST'])
 def enqueue_tasks():
     try:
         processor_service_url = EVENT_FEED_PROCESSOR_SERVICE_URL 
-        queue_path = client.queue_path(PROJECT_ID, REGION, TASK_QUEUE_NAME)
-        
-        # Define a base task structure to avoid repetition
-        base_task_http_request = {
-            "http_method": tasks_v2.HttpMethod.POST,
-            "url": processor_service_url,
-            "oidc_token": {
-                "service_account_email": TASKS_SA_EMAIL,
-                "audience": processor_service_url,
-            },
-            "headers": {"Content-Type": "application/json"},
-        }
-
-        # Task 1: Trigger immediately (0 seconds delay)
-        schedule_time_1 = datetime.utcnow()
-        task1 = {
-            "http_request": {
-                **base_task_http_request,
-                "body": json.dumps({"trigger_time": schedule_time_1.isoformat()}).encode(),
+        if TASK_DISPATCH != 'local':
+            tasks_v2, client = get_tasks()
+            queue_path = client.queue_path(PROJECT_ID, REGION, TASK_QUEUE_NAME)
+
+            # Define a base task structure to avoid repetition
+            base_task_http_request = {
+                "http_method": tasks_v2.HttpMethod.POST,
+                "url": processor_service_url,
+                "oidc_token": {
+                    "service_account_email": TASKS_SA_EMAIL,
+                    "audience": processor_service_url,
+                },
+                "headers": {"Content-Type": "application/json"},
             }
-        }
-        client.create_task(parent=queue_path, task=task1)
-        print(f"Enqueued immediate task for {processor_service_url} at {schedule_time_1}")
-
-        # Task 2: Trigger after 20 seconds
-        schedule_time_2 = datetime.utcnow() + timedelta(seconds=20)
-        task2 = {
-            "http_request": {
-                **base_task_http_request,
-                "body": json.dumps({"trigger_time": schedule_time_2.isoformat()}).encode(),
-            },
-            "schedule_time": schedule_time_2,
-        }
-        client.create_task(parent=queue_path, task=task2)
-        print(f"Enqueued delayed task for {processor_service_url} at {schedule_time_2}")
-
-        # Task 3: Trigger after 40 seconds
-        schedule_time_3 = datetime.utcnow() + timedelta(seconds=40)
-        task3 = {
-            "http_request": {
-                **base_task_http_request,
-                "body": json.dumps({"trigger_time": schedule_time_3.isoformat()}).encode(),
-            },
-            "schedule_time": schedule_time_3,
-        }
-        client.create_task(parent=queue_path, task=task3)
-        print(f"Enqueued delayed task for {processor_service_url} at {schedule_time_3}")
+
+        # One task now, then one every TASK_INTERVAL_SECONDS (0s / 20s / 40s by default)
+        for index in range(TASKS_PER_TRIGGER):
+            delay_seconds = index * TASK_INTERVAL_SECONDS
+            schedule_time = datetime.utcnow() + timedelta(seconds=delay_seconds)
+            body = json.dumps({"trigger_time": schedule_time.isoformat()}).encode()
+            if TASK_DISPATCH == 'local':
+                dispatch_locally(processor_service_url, body, delay_seconds)
+            else:
+                task = {"http_request": {**base_task_http_request, "body": body}}
+                if delay_seconds:
+                    task["schedule_time"] = schedule_time
+                client.create_task(parent=queue_path, task=task)
+            kind = "delayed" if delay_seconds else "immediate"
+            print(f"Enqueued {kind} task for {processor_service_url} at {schedule_time}")
 
         return "Tasks enqueued successfully", 200
     except Exception as e:
@@ -77,5 +119,11 @@ def health_check():
     return "Task Enqueuer is running!", 200
 
 
+@app.route('/startupz', methods=['GET'])
+def startup_report():
+    return dict(STARTUP_TIMINGS), 200
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
+    # local development only - containers serve through gunicorn (see Dockerfile)
+    app.run(debug=os.environ.get('FLASK_DEBUG', 'false').lower() == 'true', host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
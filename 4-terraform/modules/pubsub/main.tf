@@ -7,4 +7,7 @@ resource "google_pubsub_subscription" "main" {
   name  = var.subscription_name
   topic = google_pubsub_topic.main.id
   project = var.project_id
+  # only needed when the event processor runs with ORDERING_KEY_MODE=feed|route;
+  # unordered delivery is safe either way since the pipeline counts sequence gaps
+  enable_message_ordering = var.enable_message_ordering
 }
@@ -14,3 +14,9 @@ variable "subscription_name" {
   type        = string
   default     = "mta-gtfs-ace-sub"
 }
+
+variable "enable_message_ordering" {
+  description = "Deliver messages with the same ordering key in order"
+  type        = bool
+  default     = false
+}
\ No newline at end of file
@@ -9,6 +9,20 @@ resource "google_bigquery_table" "main" {
   table_id   = var.bq_table_id
   project    = var.project_id
   schema     = file(var.bq_table_schema)
+
+  # Same layout dataflow.py requests: day partitions on vehicle_timestamp, clustered for stop/trip lookups
+  time_partitioning {
+    type  = "DAY"
+    field = "vehicle_timestamp"
+  }
+  clustering = ["route_id", "stop_id", "trip_id"]
+
+  # Changing time_partitioning forces a replacement, which would drop (or, with deletion
+  # protection, fail on) an existing flat table. New deployments get the layout above;
+  # existing ones migrate with 5-sql/partition_realtime_updates.sql instead.
+  lifecycle {
+    ignore_changes = [time_partitioning, clustering]
+  }
 }
 
 resource "google_storage_bucket" "staging" {
@@ -23,6 +37,13 @@ resource "google_storage_bucket" "temp" {
   force_destroy = true
 }
 
+# Raw feed archive (written by dataflow.py --archive_path, read by backfills and replays)
+resource "google_storage_bucket" "raw_archive" {
+  name          = "${var.project_id}-raw-archive"
+  location      = var.region
+  force_destroy = true
+}
+
 # Enrichment bucket
 resource "google_storage_bucket" "enrichment" {
   name          = "${var.project_id}-enrichment"
@@ -36,3 +57,10 @@ resource "google_storage_bucket_object" "stops_csv" {
   bucket = google_storage_bucket.enrichment.name
   source = "${path.module}/stops.csv"
 }
+
+# Compiled stops snapshot (stops_snapshot.py) read by the Dataflow side input
+resource "google_storage_bucket_object" "stops_snapshot" {
+  name   = "stops.snapshot"
+  bucket = google_storage_bucket.enrichment.name
+  source = "${path.module}/stops.snapshot"
+}
@@ -4,6 +4,7 @@
 -- Purpose: Calculate the average time trains spend idle (stopped) at each station
 -- Use Case: Identify stations with longer dwell times, potential bottlenecks
 -- Direction: Southbound trains only
+-- Date range: 2025-10-01 to 2025-10-31 (widen the range for more history; each day adds one partition)
 -- ============================================
 
 WITH
@@ -44,6 +45,9 @@ WITH
     WHERE
       direction = "Southbound" 
       AND stop_name IS NOT NULL  -- Exclude records with missing station names
+      -- Timestamp range on the partition column: only these days' partitions are scanned
+      AND vehicle_timestamp >= TIMESTAMP('2025-10-01', 'America/New_York')
+      AND vehicle_timestamp < TIMESTAMP('2025-11-01', 'America/New_York')
   )
 -- Step 2: Aggregate idle times by station and format as MM:SS
 SELECT
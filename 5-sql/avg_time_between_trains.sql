@@ -21,7 +21,10 @@ WITH
     WHERE
       vehicle_timestamp IS NOT NULL
       AND stop_name IS NOT NULL
-      AND DATE(vehicle_timestamp, 'America/New_York') = '2025-10-31'  -- Filter to specific date
+      -- NYC day as a timestamp range on the partition column, so only the 2025-10-31 and
+      -- 2025-11-01 (UTC) partitions are scanned instead of the whole table
+      AND vehicle_timestamp >= TIMESTAMP('2025-10-31', 'America/New_York')
+      AND vehicle_timestamp < TIMESTAMP('2025-11-01', 'America/New_York')
     GROUP BY stop_name, DATE(vehicle_timestamp, 'America/New_York'), trip_id
   ),
   CalculatedArrivalLags AS (
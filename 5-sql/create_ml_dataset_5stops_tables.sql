@@ -7,7 +7,11 @@
 -- ============================================
 -- Step 1: Filter and prepare E train data
 -- ============================================
-CREATE OR REPLACE TABLE `streaming-systems-245.mta_historical.e_train_prepared` AS
+-- Partitioned by trip_date so build_training_samples.py reads only the days it builds
+CREATE OR REPLACE TABLE `streaming-systems-245.mta_historical.e_train_prepared`
+PARTITION BY trip_date
+CLUSTER BY trip_uid
+AS
 SELECT
   trip_uid,
   start_time_dts,
@@ -57,5 +61,4 @@ WHERE
   AND direction = 'S'  -- Southbound
   AND arrival_time IS NOT NULL
   AND stop_lat IS NOT NULL
-  AND stop_lon IS NOT NULL
-ORDER BY trip_uid, arrival_time;
+  AND stop_lon IS NOT NULL;
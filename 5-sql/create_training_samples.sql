@@ -1,8 +1,13 @@
 -- ============================================
 -- Create training samples with 5-stop context window
+-- Full rebuild; build_training_samples.py adds or rebuilds single days
 -- ============================================
 
-CREATE OR REPLACE TABLE `streaming-systems-245.mta_historical.e_train_training_samples` AS
+CREATE OR REPLACE TABLE `streaming-systems-245.mta_historical.e_train_training_samples`
+PARTITION BY trip_date
+CLUSTER BY target_stop_name, trip_uid
+OPTIONS (labels = [('context_length', '5')])
+AS
 WITH TargetStops AS (
   -- Get all Lexington Av/53 St arrivals
   SELECT
@@ -71,5 +76,4 @@ ContextWindows AS (
 )
 SELECT *
 FROM ContextWindows
-WHERE ARRAY_LENGTH(context_stops) = 5  -- Ensure full 5-stop context
-ORDER BY trip_date, trip_uid;
+WHERE ARRAY_LENGTH(context_stops) = 5;  -- Ensure full 5-stop context
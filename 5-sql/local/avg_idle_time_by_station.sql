@@ -0,0 +1,62 @@
+-- ============================================
+-- Average Idle Time By Station Analysis (DuckDB, local)
+-- ============================================
+-- Local version of 5-sql/avg_idle_time_by_station.sql; same logic and output
+-- Source: realtime_updates view over the Parquet cache (see local_analytics.py)
+-- Dialect mapping:
+--   DATE(ts, tz) / TIME(ts, tz)  -> CAST(timezone(tz, ts) AS DATE / TIME)
+--   TIMESTAMP_DIFF(a, b, SECOND) -> date_sub('second', b, a)  (whole seconds, like BigQuery)
+-- ============================================
+
+WITH
+  time_diffs AS (
+    -- Step 1: Calculate time differences between consecutive updates for the same train at the same station
+    SELECT
+      stop_name,
+      stop_lat,
+      stop_lon,
+      trip_id,
+      CAST(timezone('America/New_York', vehicle_timestamp) AS DATE) AS trip_date,
+      CAST(timezone('America/New_York', vehicle_timestamp) AS TIME) AS trip_time,
+      -- Get the previous timestamp for this train at this station
+      LAG(CAST(timezone('America/New_York', vehicle_timestamp) AS TIME)) OVER station_visit AS prev_trip_time,
+      -- Calculate seconds since last update for this train at this station
+      CASE
+        -- If timestamps are identical (duplicate updates), default to 60 seconds
+        WHEN CAST(timezone('America/New_York', vehicle_timestamp) AS TIME)
+             = LAG(CAST(timezone('America/New_York', vehicle_timestamp) AS TIME)) OVER station_visit THEN 60
+        -- Otherwise, calculate actual time difference in seconds
+        ELSE date_sub('second', LAG(vehicle_timestamp) OVER station_visit, vehicle_timestamp)
+      END AS seconds_since_last
+    FROM
+      realtime_updates
+    WHERE
+      direction = 'Southbound'
+      AND stop_name IS NOT NULL  -- Exclude records with missing station names
+    WINDOW station_visit AS (
+      PARTITION BY stop_name, trip_id, CAST(timezone('America/New_York', vehicle_timestamp) AS DATE)
+      ORDER BY vehicle_timestamp
+    )
+  )
+-- Step 2: Aggregate idle times by station and format as MM:SS
+SELECT
+  stop_name,
+  stop_lat,
+  stop_lon,
+  CONCAT(
+    CAST(CAST(FLOOR(AVG(seconds_since_last) / 60) AS BIGINT) AS VARCHAR),  -- Minutes
+    ':',
+    LPAD(
+      CAST(CAST(ROUND(AVG(seconds_since_last)) AS BIGINT) % 60 AS VARCHAR),  -- Seconds
+      2,
+      '0'
+    )
+  ) AS avg_idle_time_m_s
+FROM
+  time_diffs
+WHERE
+  seconds_since_last IS NOT NULL
+    AND seconds_since_last <= 300  -- Filter out unrealistic gaps (> 5 minutes = not idle, likely movement)
+    AND stop_name != 'Broad Channel'  -- Exclude Broad Channel (outlier station)
+GROUP BY stop_name, stop_lat, stop_lon
+ORDER BY avg_idle_time_m_s DESC  -- Stations with longest idle times first
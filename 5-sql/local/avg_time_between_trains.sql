@@ -0,0 +1,63 @@
+-- ============================================
+-- Average Time Between Trains Analysis (DuckDB, local)
+-- ============================================
+-- Local version of 5-sql/avg_time_between_trains.sql; same logic and output
+-- Date: 2025-10-31 (single day analysis) - run with --start/--end 2025-10-31
+-- so only that day's partition is read
+-- Dialect mapping:
+--   DATE(ts, tz)                 -> CAST(timezone(tz, ts) AS DATE)
+--   TIMESTAMP_DIFF(a, b, MINUTE) -> date_sub('minute', b, a)  (whole minutes, like BigQuery)
+-- ============================================
+
+WITH
+  TripArrivals AS (
+    -- Step 1: Get the first arrival time for each unique trip at each station
+    SELECT
+      stop_name,
+      CAST(timezone('America/New_York', vehicle_timestamp) AS DATE) AS event_date,
+      trip_id,
+      MIN(vehicle_timestamp) AS trip_arrival_time  -- First update = arrival time
+    FROM
+      realtime_updates
+    WHERE
+      vehicle_timestamp IS NOT NULL
+      AND stop_name IS NOT NULL
+      AND CAST(timezone('America/New_York', vehicle_timestamp) AS DATE) = DATE '2025-10-31'  -- Filter to specific date
+    GROUP BY stop_name, CAST(timezone('America/New_York', vehicle_timestamp) AS DATE), trip_id
+  ),
+  CalculatedArrivalLags AS (
+    -- Step 2: Calculate time difference between consecutive train arrivals at each station
+    SELECT
+      stop_name,
+      event_date,
+      trip_arrival_time AS current_trip_arrival_time,
+      LAG(trip_arrival_time) OVER (
+        PARTITION BY stop_name, event_date
+        ORDER BY trip_arrival_time
+      ) AS prev_trip_arrival_time,
+      date_sub(
+        'minute',
+        LAG(trip_arrival_time) OVER (
+          PARTITION BY stop_name, event_date
+          ORDER BY trip_arrival_time
+        ),
+        trip_arrival_time
+      ) AS minute_difference_between_trains
+    FROM
+      TripArrivals
+  )
+-- Step 3: Aggregate wait times by station and count total trips
+SELECT
+  cal.stop_name,
+  ROUND(AVG(cal.minute_difference_between_trains), 2) AS average_min_difference_between_trains,
+  COUNT(DISTINCT ta.trip_id) AS total_unique_trip_ids
+FROM
+  CalculatedArrivalLags AS cal
+  JOIN
+  TripArrivals AS ta
+  ON cal.stop_name = ta.stop_name AND cal.current_trip_arrival_time = ta.trip_arrival_time
+WHERE
+  cal.prev_trip_arrival_time IS NOT NULL  -- Exclude first train of the day (no previous train)
+  AND cal.minute_difference_between_trains <= 20  -- Filter out unrealistic gaps (> 20 min likely service disruption)
+GROUP BY cal.stop_name
+ORDER BY average_min_difference_between_trains DESC  -- Stations with longest wait times first
@@ -0,0 +1,64 @@
+-- ============================================
+-- Create Training Dataset: E Train Southbound (DuckDB, local)
+-- Target: Predict arrival at "Lexington Av/53 St"
+-- Context Window: 5 previous stops
+-- ============================================
+-- Local version of 5-sql/create_ml_dataset_5stops_tables.sql
+-- Source: raw_data view (raw_data_v4 extract); creates e_train_prepared in the local database
+-- Dialect mapping:
+--   DATETIME(ts, tz)       -> timezone(tz, ts)
+--   EXTRACT(DAYOFWEEK ...) -> dayofweek(...) + 1  (BigQuery: 1 = Sunday)
+-- ============================================
+
+CREATE OR REPLACE TABLE e_train_prepared AS
+SELECT
+  trip_uid,
+  start_time_dts,
+  route_id,
+  direction,
+  stop_id,
+  stop_name,
+  stop_lat,
+  stop_lon,
+  arrival_time,
+  departure_time,
+
+  -- Convert UTC to NYC timezone for feature extraction
+  timezone('America/New_York', arrival_time) AS arrival_time_nyc,
+
+  -- Sequence number within each trip
+  ROW_NUMBER() OVER (PARTITION BY trip_uid ORDER BY arrival_time) AS stop_sequence,
+
+  -- Calculate time since previous stop (in minutes)
+  date_sub(
+    'second',
+    LAG(arrival_time) OVER (PARTITION BY trip_uid ORDER BY arrival_time),
+    arrival_time
+  ) / 60.0 AS minutes_since_prev_stop,
+
+  -- Extract temporal features (using NYC local time)
+  hour(timezone('America/New_York', arrival_time)) AS hour_of_day,
+  dayofweek(timezone('America/New_York', arrival_time)) + 1 AS day_of_week,
+  CAST(timezone('America/New_York', arrival_time) AS DATE) AS trip_date,
+
+  -- Rush hour indicator (7-9am, 4-7pm NYC time)
+  CASE
+    WHEN hour(timezone('America/New_York', arrival_time)) BETWEEN 7 AND 9 THEN 1
+    WHEN hour(timezone('America/New_York', arrival_time)) BETWEEN 16 AND 19 THEN 1
+    ELSE 0
+  END AS is_rush_hour,
+
+  -- Weekend indicator
+  CASE
+    WHEN dayofweek(timezone('America/New_York', arrival_time)) + 1 IN (1, 7) THEN 1
+    ELSE 0
+  END AS is_weekend
+
+FROM raw_data
+WHERE
+  route_id = 'E'
+  AND direction = 'S'  -- Southbound
+  AND arrival_time IS NOT NULL
+  AND stop_lat IS NOT NULL
+  AND stop_lon IS NOT NULL
+ORDER BY trip_uid, arrival_time;
@@ -0,0 +1,40 @@
+-- ============================================
+-- Create Train/Validation/Test Splits (DuckDB, local)
+-- Strategy: Temporal split (70% train, 15% val, 15% test)
+-- ============================================
+-- Local version of 5-sql/create_train_val_test_splits.sql; same split_dates
+-- table, with the summary returned as one row per split instead of text lines
+-- ============================================
+
+-- Get date boundaries for splits
+CREATE OR REPLACE TABLE split_dates AS
+WITH DateStats AS (
+  SELECT
+    MIN(trip_date) AS min_date,
+    MAX(trip_date) AS max_date,
+    date_diff('day', MIN(trip_date), MAX(trip_date)) AS total_days
+  FROM e_train_training_samples
+)
+SELECT
+  min_date,
+  max_date,
+  total_days,
+  CAST(min_date + to_days(CAST(total_days * 0.70 AS INTEGER)) AS DATE) AS train_end_date,
+  CAST(min_date + to_days(CAST(total_days * 0.85 AS INTEGER)) AS DATE) AS val_end_date
+FROM DateStats;
+
+-- Display split information
+SELECT
+  split,
+  start_date,
+  end_date,
+  (SELECT COUNT(*) FROM e_train_training_samples samples
+   WHERE samples.trip_date >= splits.start_date AND samples.trip_date <= splits.end_date) AS samples
+FROM (
+  SELECT 'TRAIN' AS split, min_date AS start_date, train_end_date AS end_date, 1 AS ordinal FROM split_dates
+  UNION ALL
+  SELECT 'VALIDATION', CAST(train_end_date + INTERVAL 1 DAY AS DATE), val_end_date, 2 FROM split_dates
+  UNION ALL
+  SELECT 'TEST', CAST(val_end_date + INTERVAL 1 DAY AS DATE), max_date, 3 FROM split_dates
+) splits
+ORDER BY ordinal;
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Local Analytics over Cached Parquet Extracts (DuckDB)
+Extracts BigQuery tables once into a local Parquet cache, hive-partitioned by
+date, and runs the DuckDB versions of the 5-sql queries against it. Only the
+partitions inside --start/--end are read, so single-day exploration takes
+seconds, costs nothing per query and works offline.
+
+Local tables (views over the cache):
+    realtime_updates   mta_updates.realtime_updates, partitioned by event_date (NYC date of vehicle_timestamp)
+    sensor_data        mta_historical.sensor_data,   partitioned by service_date
+    raw_data           mta_historical.raw_data_v4,   partitioned by arrival_date (NYC date of arrival_time)
+
+Usage:
+    # extract (re-extracting a date replaces its partition)
+    python 5-sql/local/local_analytics.py extract realtime_updates --start 2025-10-01 --end 2025-10-31
+
+    # query; tables created by the SQL (e.g. e_train_prepared) persist in the local database
+    python 5-sql/local/local_analytics.py query 5-sql/local/avg_time_between_trains.sql --start 2025-10-31 --end 2025-10-31
+    python 5-sql/local/local_analytics.py query 5-sql/local/create_ml_dataset_5stops_tables.sql
+"""
+
+import argparse
+import glob
+import os
+import time
+from datetime import date
+
+import duckdb
+
+# ============================================
+# Configuration
+# ============================================
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_ID = os.environ.get("PROJECT_ID", "<your-project-id>")
+CACHE_DIR = os.environ.get("LOCAL_ANALYTICS_DIR", os.path.join(REPO_ROOT, "local_cache"))
+DATABASE = os.path.join(CACHE_DIR, "analytics.duckdb")
+SHOW_ROWS = 50  # rows printed per result
+
+TABLES = {
+    # local name -> (BigQuery table, partition column, BigQuery expression for the partition date)
+    "realtime_updates": (f"{PROJECT_ID}.mta_updates.realtime_updates", "event_date",
+                         "DATE(vehicle_timestamp, 'America/New_York')"),
+    "sensor_data": (f"{PROJECT_ID}.mta_historical.sensor_data", "service_date", "service_date"),
+    "raw_data": (f"{PROJECT_ID}.mta_historical.raw_data_v4", "arrival_date",
+                 "DATE(arrival_time, 'America/New_York')"),
+}
+
+
+# ============================================
+# Extract: BigQuery -> Local Parquet
+# ============================================
+def extract(name, start, end):
+    """
+    Export one table's rows for [start, end] into CACHE_DIR/<name>/<column>=YYYY-MM-DD/.
+
+    Returns:
+        Dict with rows, partitions, bytes_processed, seconds
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from google.cloud import bigquery
+
+    bq_table, column, expression = TABLES[name]
+    client = bigquery.Client(project=PROJECT_ID if not PROJECT_ID.startswith("<") else None)
+    extra = "" if expression == column else f", {expression} AS {column}"
+    query = f"SELECT *{extra} FROM `{bq_table}` WHERE {expression} BETWEEN @start AND @end"
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("start", "DATE", start),
+        bigquery.ScalarQueryParameter("end", "DATE", end),
+    ])
+
+    started = time.perf_counter()
+    job = client.query(query, job_config=job_config)
+    table = job.to_arrow(create_bqstorage_client=True)
+    if table.num_rows:
+        ds.write_dataset(
+            table,
+            os.path.join(CACHE_DIR, name),
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([(column, pa.date32())]), flavor="hive"),
+            existing_data_behavior="delete_matching",  # re-extracting a date replaces its partition
+            basename_template="part-{i}.parquet",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+    return {
+        "rows": table.num_rows,
+        "partitions": len(set(table.column(column).to_pylist())) if table.num_rows else 0,
+        "bytes_processed": job.total_bytes_processed or 0,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+# ============================================
+# Query: DuckDB over the Cache
+# ============================================
+def partition_files(name, start=None, end=None):
+    """Parquet files of the partitions inside [start, end] (all partitions when unbounded)."""
+    _, column, _ = TABLES[name]
+    files = []
+    for directory in sorted(glob.glob(os.path.join(CACHE_DIR, name, f"{column}=*"))):
+        partition = date.fromisoformat(os.path.basename(directory).split("=", 1)[1])
+        if (start and partition < start) or (end and partition > end):
+            continue
+        files.extend(sorted(glob.glob(os.path.join(directory, "*.parquet"))))
+    return files
+
+
+def register_views(con, start=None, end=None):
+    """
+    Point one view per cached table at its pruned file list.
+
+    Returns:
+        Dict of table -> number of files
+    """
+    registered = {}
+    for name in TABLES:
+        files = partition_files(name, start, end)
+        if not files:
+            continue
+        file_list = ", ".join("'" + path.replace("'", "''") + "'" for path in files)
+        con.execute(f"CREATE OR REPLACE VIEW {name} AS "
+                    f"SELECT * FROM read_parquet([{file_list}], hive_partitioning = true)")
+        registered[name] = len(files)
+    return registered
+
+
+def run_query(sql_path, start=None, end=None, output=None):
+    """Run every statement of a DuckDB SQL file; print results of queries that return rows."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    con = duckdb.connect(DATABASE)
+    registered = register_views(con, start, end)
+    for name, count in registered.items():
+        print(f"  {name}: {count} partition files")
+    if not registered:
+        print(f"⚠ No cached partitions in {CACHE_DIR} for this range - run extract first")
+
+    with open(sql_path, "r") as f:
+        # DuckDB's own parser splits the file, so comments and literals may contain ';'
+        statements = [statement.query for statement in con.extract_statements(f.read())]
+
+    result = None
+    for statement in statements:
+        started = time.perf_counter()
+        relation = con.sql(statement)
+        if relation is None:
+            first_line = next(line for line in statement.splitlines() if line.strip() and not line.strip().startswith("--"))
+            print(f"✓ {first_line.strip()[:60]} ({time.perf_counter() - started:.2f}s)")
+            continue
+        result = relation
+        relation.show(max_rows=SHOW_ROWS)
+        print(f"✓ {relation.shape[0]:,} rows ({time.perf_counter() - started:.2f}s)")
+
+    if output and result is not None:
+        if output.endswith(".parquet"):
+            result.write_parquet(output)
+        else:
+            result.write_csv(output)
+        print(f"Last result written to {output}")
+    con.close()
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract_parser = commands.add_parser("extract", help="export a BigQuery table to the local Parquet cache")
+    extract_parser.add_argument("table", choices=sorted(TABLES))
+    extract_parser.add_argument("--start", type=date.fromisoformat, required=True)
+    extract_parser.add_argument("--end", type=date.fromisoformat, required=True)
+
+    query_parser = commands.add_parser("query", help="run a DuckDB SQL file against the cache")
+    query_parser.add_argument("sql_file")
+    query_parser.add_argument("--start", type=date.fromisoformat, default=None, help="first partition date to read")
+    query_parser.add_argument("--end", type=date.fromisoformat, default=None, help="last partition date to read")
+    query_parser.add_argument("--output", default=None, help="write the last result to .csv or .parquet")
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Local Analytics: {args.command}")
+    print("=" * 60)
+    print(f"Cache: {CACHE_DIR}")
+
+    if args.command == "extract":
+        print(f"Table: {TABLES[args.table][0]} ({args.start} to {args.end})")
+        print("=" * 60 + "\n")
+        stats = extract(args.table, args.start, args.end)
+        print(f"✓ {stats['rows']:,} rows in {stats['partitions']} partitions "
+              f"({stats['bytes_processed'] / (1024 ** 3):.2f} GB scanned) in {stats['seconds']:.1f}s")
+    else:
+        print(f"SQL: {args.sql_file} (partitions {args.start or 'first'} to {args.end or 'last'})")
+        print("=" * 60 + "\n")
+        run_query(args.sql_file, args.start, args.end, args.output)
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+-- ============================================
+-- One-off Migration: Partition and Cluster realtime_updates
+-- ============================================
+-- Purpose: Tables created before dataflow.py / terraform requested partitioning keep their
+--          flat layout (CREATE_IF_NEEDED never alters an existing table). This copies the
+--          rows into a day-partitioned, clustered table and swaps it in.
+-- Run while the streaming job is drained, then restart it. Terraform ignores partitioning
+-- changes on this table (lifecycle.ignore_changes in 4-terraform/modules/storage/main.tf),
+-- so `terraform apply` never replaces it; on a terraform without that block, run this
+-- migration BEFORE `terraform apply`, or apply would drop and recreate realtime_updates.
+-- ============================================
+
+CREATE TABLE `<Your-project-id>`.mta_updates.realtime_updates_partitioned
+PARTITION BY DATE(vehicle_timestamp)
+CLUSTER BY route_id, stop_id, trip_id
+AS
+SELECT *
+FROM `<Your-project-id>`.mta_updates.realtime_updates;
+
+-- Keep the old table as a backup until the new one is verified
+ALTER TABLE `<Your-project-id>`.mta_updates.realtime_updates RENAME TO realtime_updates_unpartitioned;
+ALTER TABLE `<Your-project-id>`.mta_updates.realtime_updates_partitioned RENAME TO realtime_updates;
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Convert Historical stop_times CSVs to Parquet
+Reads each day's *_stop_times.csv from decompressed/YYYY-MM/ in GCS, applies the
+types from schema_historical_sensor_data.json once, and writes zstd-compressed
+Parquet with row-group statistics, partitioned by service date:
+
+    parquet/service_date=YYYY-MM-DD/stop_times.parquet
+
+Type errors are counted here, per column, instead of on every BigQuery load.
+Converted dates are recorded in the ingestion state (ingest_state.py), so later
+runs only list the months that still have work.
+Run from the repository root (like load_to_bigquery_monthly.py).
+"""
+
+import concurrent.futures
+import datetime
+import json
+import os
+import re
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+from google.cloud import storage
+
+from ingest_state import IngestState, DONE, FAILED
+
+# ============================================
+# Configuration
+# ============================================
+PROJECT_ID = "time-series-478616"
+BUCKET_NAME = f"{PROJECT_ID}-historical-data"
+CSV_PREFIX = "decompressed/"
+PARQUET_PREFIX = "parquet/"
+SCHEMA_FILE = "schema_historical_sensor_data.json"
+CONVERT_WORKERS = 8  # pyarrow releases the GIL while parsing and encoding
+ROW_GROUP_ROWS = 128 * 1024  # rows per row group; each carries min/max statistics
+SORT_KEYS = [("stop_id", "ascending"), ("arrival_time", "ascending")]  # tighter per-row-group stats
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"  # only used when a timestamp column isn't unix seconds; read as UTC
+OVERWRITE = False  # re-convert days that already have Parquet (their loads become pending again)
+
+# BigQuery type -> Arrow type
+ARROW_TYPES = {
+    "STRING": pa.string(),
+    "INTEGER": pa.int64(),
+    "FLOAT": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+    "TIMESTAMP": pa.timestamp("s", tz="UTC"),
+}
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+# ============================================
+# Type Conversion
+# ============================================
+def load_schema(schema_file=SCHEMA_FILE):
+    """Returns list of (column name, BigQuery type) from the historical schema JSON."""
+    with open(schema_file, "r") as f:
+        return [(field["name"], field["type"]) for field in json.load(f)]
+
+
+def to_timestamp(column):
+    """
+    Parse a string column of unix seconds (or TIMESTAMP_FORMAT strings) into UTC timestamps.
+
+    Values that fail to parse become null.
+    """
+    numeric = pc.match_substring_regex(column, r"^-?\d+(\.\d+)?$")
+    if pc.any(numeric).as_py():
+        seconds = pc.cast(pc.if_else(numeric, column, pa.scalar(None, pa.string())), pa.float64())
+        return pc.cast(pc.cast(seconds, pa.int64(), safe=False), pa.timestamp("s", tz="UTC"))
+    parsed = pc.strptime(column, format=TIMESTAMP_FORMAT, unit="s", error_is_null=True)
+    return pc.cast(parsed, pa.timestamp("s", tz="UTC"))
+
+
+def convert_table(table, schema, service_date):
+    """
+    Cast a string-typed CSV table to the schema's types and add service_date.
+
+    Returns:
+        Tuple of (typed table, {column: values that failed to parse})
+    """
+    columns = {}
+    type_errors = {}
+    for name, bq_type in schema:
+        if name not in table.column_names:
+            columns[name] = pa.nulls(table.num_rows, ARROW_TYPES[bq_type])
+            continue
+        raw = table[name].combine_chunks()
+        if bq_type == "TIMESTAMP":
+            typed = to_timestamp(raw)
+        elif bq_type == "STRING":
+            typed = raw
+        else:
+            typed = pc.cast(raw, ARROW_TYPES[bq_type], safe=False)
+        errors = typed.null_count - raw.null_count
+        if errors:
+            type_errors[name] = errors
+        columns[name] = typed
+    columns["service_date"] = pa.array([datetime.date.fromisoformat(service_date)] * table.num_rows, pa.date32())
+    return pa.table(columns).sort_by(SORT_KEYS), type_errors
+
+
+# ============================================
+# Per-Day Conversion
+# ============================================
+def convert_day(csv_blob_name, schema):
+    """
+    Convert one day's stop_times CSV in GCS to Parquet in GCS.
+
+    Returns:
+        Tuple of (date_str, status, message, stats dict)
+    """
+    date_str = DATE_PATTERN.search(os.path.basename(csv_blob_name)).group(0)
+    parquet_name = f"{PARQUET_PREFIX}service_date={date_str}/stop_times.parquet"
+    try:
+        start = time.perf_counter()
+        client = storage.Client(project=PROJECT_ID)
+        bucket = client.bucket(BUCKET_NAME)
+
+        csv_blob = bucket.blob(csv_blob_name)
+        with csv_blob.open("rb") as source:
+            table = pv.read_csv(
+                source,
+                convert_options=pv.ConvertOptions(
+                    column_types={name: pa.string() for name, _ in schema},
+                    strings_can_be_null=True,
+                ),
+            )
+        csv_bytes = csv_blob.size or 0
+
+        typed, type_errors = convert_table(table, schema, date_str)
+
+        sink = pa.BufferOutputStream()
+        pq.write_table(typed, sink, compression="zstd", row_group_size=ROW_GROUP_ROWS, write_statistics=True)
+        data = sink.getvalue()
+        bucket.blob(parquet_name).upload_from_string(data.to_pybytes(), content_type="application/vnd.apache.parquet")
+
+        seconds = time.perf_counter() - start
+        stats = {"rows": typed.num_rows, "csv_bytes": csv_bytes, "parquet_bytes": data.size, "type_errors": type_errors}
+        errors = f", type errors: {type_errors}" if type_errors else ""
+        message = (f"{typed.num_rows:,} rows, {data.size / (1024 * 1024):.2f} MB parquet "
+                   f"in {seconds:.1f}s{errors}")
+        return (date_str, "CONVERTED", message, stats)
+    except Exception as e:
+        return (date_str, "ERROR", str(e), None)
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    print("=" * 70)
+    print("Converting stop_times CSVs to Parquet")
+    print("=" * 70)
+    print(f"Source: gs://{BUCKET_NAME}/{CSV_PREFIX}")
+    print(f"Target: gs://{BUCKET_NAME}/{PARQUET_PREFIX}service_date=YYYY-MM-DD/")
+    print("=" * 70 + "\n")
+
+    schema = load_schema()
+    client = storage.Client(project=PROJECT_ID)
+    bucket = client.bucket(BUCKET_NAME)
+
+    state = IngestState()
+    if state.has_stage("extract") and state.has_stage("convert"):
+        # Incremental run: only list the months holding extracted-but-unconverted dates
+        candidates = state.dates("extract") if OVERWRITE else state.pending(state.dates("extract"), "convert")
+        prefixes = sorted({f"{CSV_PREFIX}{date_str[:7]}/" for date_str in candidates})
+        print(f"Using ingestion state {state.path} (convert watermark {state.watermark('convert')})")
+    else:
+        # First run with state: seed it from one listing of the Parquet prefix
+        converted = {
+            match.group(0)
+            for blob in bucket.list_blobs(prefix=PARQUET_PREFIX, fields="items(name),nextPageToken")
+            for match in [DATE_PATTERN.search(blob.name)] if match
+        }
+        state.mark_many(sorted(converted), "convert", DONE, "found in GCS listing")
+        prefixes = [CSV_PREFIX]
+
+    csv_blobs = [
+        blob.name
+        for prefix in prefixes
+        for blob in bucket.list_blobs(prefix=prefix, fields="items(name),nextPageToken")
+        if blob.name.endswith("_stop_times.csv") and DATE_PATTERN.search(os.path.basename(blob.name))
+    ]
+    dates = {DATE_PATTERN.search(os.path.basename(name)).group(0): name for name in csv_blobs}
+    todo = [dates[date_str] for date_str in (sorted(dates) if OVERWRITE else state.pending(dates, "convert"))]
+    print(f"Found {len(csv_blobs)} stop_times CSVs in {len(prefixes)} listing(s), "
+          f"{len(csv_blobs) - len(todo)} already converted\n")
+
+    results = {"CONVERTED": 0, "ERROR": 0}
+    totals = {"rows": 0, "csv_bytes": 0, "parquet_bytes": 0, "type_errors": 0}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=CONVERT_WORKERS) as executor:
+        futures = [executor.submit(convert_day, name, schema) for name in todo]
+        for future in concurrent.futures.as_completed(futures):
+            date_str, status, message, stats = future.result()
+            results[status] += 1
+            if status == "CONVERTED":
+                state.mark(date_str, "convert", DONE, message)
+                state.clear([date_str], "load")  # the partition holding this date must be reloaded
+            else:
+                state.mark(date_str, "convert", FAILED, message)
+            if stats:
+                totals["rows"] += stats["rows"]
+                totals["csv_bytes"] += stats["csv_bytes"]
+                totals["parquet_bytes"] += stats["parquet_bytes"]
+                totals["type_errors"] += sum(stats["type_errors"].values())
+            symbol = "✓" if status == "CONVERTED" else "✗"
+            print(f"{symbol} {date_str}: {status} - {message}")
+
+    print("\n" + "=" * 70)
+    print("FINAL SUMMARY")
+    print("=" * 70)
+    print(f"✓ Converted days: {results['CONVERTED']}")
+    print(f"✗ Failed days: {results['ERROR']}")
+    print(f"Rows: {totals['rows']:,}")
+    if totals["csv_bytes"]:
+        print(f"Size: {totals['csv_bytes'] / (1024 ** 3):.2f} GB CSV -> {totals['parquet_bytes'] / (1024 ** 3):.2f} GB Parquet "
+              f"({totals['parquet_bytes'] / totals['csv_bytes']:.1%})")
+    print(f"Values that failed type conversion (stored as NULL): {totals['type_errors']:,}")
+    print("=" * 70)
+    state.close()
+
+
+if __name__ == "__main__":
+    main()
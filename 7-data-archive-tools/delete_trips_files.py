@@ -2,9 +2,10 @@
 Delete *_trips.csv Files from GCS
 Removes all files ending in _trips.csv from monthly decompressed folders (YYYY-MM/)
 Keeps the stop_times CSV files in decompressed folders
+Matching happens server-side and deletes go out as batch requests (see gcs_bulk.py)
 """
 
-from google.cloud import storage
+from gcs_bulk import list_objects, bulk_delete, print_report
 
 # ============================================
 # Configuration
@@ -12,6 +13,7 @@ from google.cloud import storage
 PROJECT_ID = "time-series-478616"
 GCS_BUCKET_NAME = f"{PROJECT_ID}-historical-data"
 GCS_DECOMPRESSED_PREFIX = "decompressed/"
+TRIPS_GLOB = "**_trips.csv"
 
 print("="*60)
 print("Deleting *_trips.csv files from GCS")
@@ -20,21 +22,13 @@ print(f"Bucket: {GCS_BUCKET_NAME}")
 print(f"Prefix: {GCS_DECOMPRESSED_PREFIX}")
 print("="*60 + "\n")
 
-# Initialize GCS client
-client = storage.Client(project=PROJECT_ID)
-bucket = client.bucket(GCS_BUCKET_NAME)
-
 # ============================================
 # Find files to delete
 # ============================================
 print("Scanning for *_trips.csv files in monthly folders...\n")
 
-trips_files = []
-
-# Find *_trips.csv files in decompressed monthly folders
-for blob in bucket.list_blobs(prefix=GCS_DECOMPRESSED_PREFIX):
-    if blob.name.endswith('_trips.csv'):
-        trips_files.append(blob)
+# One listing pass, filtered by GCS
+trips_files = list_objects(GCS_BUCKET_NAME, GCS_DECOMPRESSED_PREFIX, TRIPS_GLOB)
 
 print(f"Found {len(trips_files)} *_trips.csv files\n")
 
@@ -45,37 +39,26 @@ if len(trips_files) == 0:
     print("No *_trips.csv files found to delete")
 else:
     print("Sample files to be deleted:")
-    for blob in trips_files[:5]:
-        print(f"  - {blob.name}")
+    for name, _ in trips_files[:5]:
+        print(f"  - {name}")
     if len(trips_files) > 5:
         print(f"  ... and {len(trips_files) - 5} more")
-    
+    print()
+    print_report(bulk_delete(GCS_BUCKET_NAME, trips_files, dry_run=True))
+
     print("\n" + "-"*60)
     response = input(f"Delete {len(trips_files)} files? (yes/no): ")
-    
+
     if response.lower() == 'yes':
         print("\n" + "="*60)
         print("Deleting files...")
         print("="*60 + "\n")
-        
-        deleted_count = 0
-        error_count = 0
-        
-        print(f"Deleting {len(trips_files)} *_trips.csv files...")
-        for blob in trips_files:
-            try:
-                blob.delete()
-                deleted_count += 1
-                if deleted_count % 100 == 0:
-                    print(f"  Deleted {deleted_count} files...")
-            except Exception as e:
-                error_count += 1
-                print(f"  ✗ Error deleting {blob.name}: {e}")
-        
+
+        report = bulk_delete(GCS_BUCKET_NAME, trips_files)
+
         print("\n" + "="*60)
-        print(f"Deletion complete: {deleted_count}/{len(trips_files)} files deleted")
-        if error_count > 0:
-            print(f"Errors: {error_count} files failed to delete")
+        print(f"Deletion complete: {report['ok']}/{len(trips_files)} files deleted")
+        print_report(report)
         print("="*60)
     else:
         print("\nDeletion cancelled")
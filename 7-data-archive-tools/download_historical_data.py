@@ -1,8 +1,13 @@
 """
 Historical MTA Sensor Data Download Script
-Downloads compressed CSV files from subwaydata.nyc for the last 12 months
+Downloads compressed CSV files from subwaydata.nyc for the last 12 months (up to yesterday)
 Decompresses .tar.xz files, extracts CSVs, and uploads to GCS
 Automatically cleans up compressed files after successful extraction
+
+Downloads stream straight into resumable GCS uploads in fixed-size chunks, so
+memory per worker stays around DOWNLOAD_CHUNK_SIZE regardless of archive size.
+For local testing, point SUBWAYDATA_BASE_URL at a local HTTP server and
+STORAGE_EMULATOR_HOST at a GCS emulator (e.g. fake-gcs-server).
 """
 
 import requests
@@ -11,9 +16,13 @@ import concurrent.futures
 from datetime import datetime, timedelta
 import os
 import tarfile
-import lzma
-import tempfile
 import shutil
+import re
+import time
+import tempfile
+import threading
+
+from ingest_state import IngestState, DONE, FAILED, MISSING
 
 # ============================================
 # Configuration
@@ -22,73 +31,201 @@ PROJECT_ID = "<your-project-id>"
 GCS_BUCKET_NAME = f"{PROJECT_ID}-historical-data"
 GCS_RAW_PREFIX = "raw/"  # Temporary folder for compressed files (will be deleted)
 GCS_DECOMPRESSED_PREFIX = "decompressed/"  # Final folder for CSV files
-BASE_URL = "https://subwaydata.nyc/data"
+BASE_URL = os.environ.get("SUBWAYDATA_BASE_URL", "https://subwaydata.nyc/data")
 MAX_WORKERS = 10  # Number of parallel downloads
-DECOMPRESS_WORKERS = 5  # Number of parallel decompression tasks
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Bytes buffered per worker (multiple of 256 KB for resumable uploads)
+DOWNLOAD_RETRIES = 3  # Reconnect attempts per file, resuming with an HTTP Range request
+DECOMPRESS_WORKERS = os.cpu_count() or 4  # Decompression processes (LZMA is CPU bound)
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024  # Read/upload buffer for streaming extraction
+EXTRACT_TRIPS_FILES = False  # *_trips.csv is removed by delete_trips_files.py anyway, so don't upload it
+# "fused": downloads flow through a bounded local buffer straight into decompression workers
+# "staged": download everything to raw/ in GCS first, then decompress from there
+PIPELINE_MODE = "fused"
+BUFFERED_ARCHIVES = DECOMPRESS_WORKERS * 2  # Fused mode: max archives downloading, queued or decompressing at once
 
-# Date range: Last 12 months from today (2025-11-07)
-END_DATE = datetime(2025, 11, 7)
-START_DATE = END_DATE - timedelta(days=365)  # Approximately 12 months
+# Date range: the last HISTORY_DAYS up to yesterday (today's archive isn't published yet).
+# Dates already recorded as extracted in the ingestion state are skipped without touching GCS.
+HISTORY_DAYS = 365  # Approximately 12 months
+END_DATE = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+START_DATE = END_DATE - timedelta(days=HISTORY_DAYS)
 
 print(f"Downloading data from {START_DATE.strftime('%Y-%m-%d')} to {END_DATE.strftime('%Y-%m-%d')}")
 print(f"Total days to process: {(END_DATE - START_DATE).days + 1}")
 
+# ============================================
+# Manifest of Already-Decompressed Dates
+# ============================================
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def build_decompressed_manifest(bucket):
+    """
+    List the decompressed/ prefix once and collect every date that already has CSVs.
+    
+    Args:
+        bucket: GCS bucket holding the decompressed folders
+    
+    Returns:
+        Tuple of (set of "YYYY-MM-DD" strings, blobs listed, seconds spent listing)
+    """
+    start = time.perf_counter()
+    dates = set()
+    blob_count = 0
+    for blob in bucket.list_blobs(prefix=GCS_DECOMPRESSED_PREFIX, fields="items(name),nextPageToken"):
+        blob_count += 1
+        match = DATE_PATTERN.search(os.path.basename(blob.name))
+        if match:
+            dates.add(match.group(0))
+    return dates, blob_count, time.perf_counter() - start
+
+# ============================================
+# Streaming HTTP Download
+# ============================================
+def stream_url_to(url, open_output):
+    """
+    Stream a URL into a writable file object chunk by chunk, resuming from the
+    last received byte with a Range request if the connection drops.
+    
+    Args:
+        url: URL to download
+        open_output: callable returning a GCS BlobWriter (close() finalizes, terminate() cancels);
+                     only called once the server answers 200, so nothing is created for a 404
+    
+    Returns:
+        Tuple of (http_status, bytes_written)
+    """
+    written = 0
+    expected = None
+    attempt = 0
+    output = None
+    try:
+        while True:
+            headers = {"Range": f"bytes={written}-"} if written else {}
+            try:
+                with requests.get(url, timeout=120, stream=True, headers=headers) as response:
+                    if not written and response.status_code != 200:
+                        return (response.status_code, 0)
+                    if written and response.status_code != 206:
+                        raise IOError(f"Cannot resume at byte {written}: server answered HTTP {response.status_code} to a Range request")
+                    if expected is None and response.headers.get("Content-Length"):
+                        expected = int(response.headers["Content-Length"])
+                    if output is None:
+                        output = open_output()
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        output.write(chunk)
+                        written += len(chunk)
+                if expected is None or written >= expected:
+                    return (200, written)
+                raise requests.exceptions.ConnectionError(f"Connection closed after {written} of {expected} bytes")
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.exceptions.Timeout):
+                attempt += 1
+                if attempt > DOWNLOAD_RETRIES:
+                    raise
+                time.sleep(2 ** attempt)
+    except BaseException:
+        # cancel the resumable upload: close() would finalize a truncated object
+        if output is not None:
+            output.terminate()
+            output = None
+        raise
+    finally:
+        # only reached with an open output once the whole body was written
+        if output is not None:
+            output.close()
+
 # ============================================
 # Download and Upload Function
 # ============================================
-def download_and_upload(date):
+def download_and_upload(date, decompressed_dates):
     """
     Download MTA sensor data for a specific date and upload to GCS.
     
     Args:
         date: datetime object representing the date to download
+        decompressed_dates: set of "YYYY-MM-DD" already in decompressed/ (from build_decompressed_manifest)
     
     Returns:
-        Tuple of (date_str, status, message, compressed_gcs_path)
+        Tuple of (date_str, status, message, compressed_gcs_path, (bytes, seconds))
     """
     date_str = date.strftime('%Y-%m-%d')
     file_name = f"subwaydatanyc_{date_str}_csv.tar.xz"
     url = f"{BASE_URL}/{file_name}"
     gcs_compressed_path = f"{GCS_RAW_PREFIX}{file_name}"
     
+    # Check if decompressed CSVs already exist in year-month folder (O(1) manifest lookup)
+    year_month = date_str[:7]  # "YYYY-MM"
+    if date_str in decompressed_dates:
+        return (date_str, "SKIPPED", f"CSVs already in {year_month}/", None, None)
+    
     try:
         client = storage.Client(project=PROJECT_ID)
         bucket = client.bucket(GCS_BUCKET_NAME)
         
-        # Check if decompressed CSVs already exist in year-month folder
-        year_month = date_str[:7]  # "YYYY-MM"
-        # Check for any CSV file from this date in the monthly folder
-        decompressed_prefix = f"{GCS_DECOMPRESSED_PREFIX}{year_month}/"
-        blobs = list(bucket.list_blobs(prefix=decompressed_prefix))
-        # Check if any blob contains this specific date in filename
-        date_exists = any(date_str in blob.name for blob in blobs)
-        if date_exists:
-            return (date_str, "SKIPPED", f"CSVs already in {year_month}/", None)
-        
-        # Download file from subwaydata.nyc
-        response = requests.get(url, timeout=120, stream=True)
+        # Stream file from subwaydata.nyc into a resumable upload to GCS (temporary raw/ copy)
+        blob = bucket.blob(gcs_compressed_path)
+        start = time.perf_counter()
+        status_code, size = stream_url_to(
+            url,
+            lambda: blob.open("wb", chunk_size=DOWNLOAD_CHUNK_SIZE, content_type='application/x-xz')
+        )
+        seconds = time.perf_counter() - start
         
-        if response.status_code == 200:
-            # Upload compressed file to GCS temporarily
-            blob = bucket.blob(gcs_compressed_path)
-            blob.upload_from_string(response.content, content_type='application/x-xz')
-            file_size_mb = len(response.content) / (1024 * 1024)
-            return (date_str, "SUCCESS", f"Downloaded {file_size_mb:.2f} MB", gcs_compressed_path)
-        elif response.status_code == 404:
-            return (date_str, "NOT_FOUND", "No data available for this date", None)
+        if status_code == 200:
+            file_size_mb = size / (1024 * 1024)
+            return (date_str, "SUCCESS", f"Downloaded {file_size_mb:.2f} MB at {file_size_mb / seconds:.2f} MB/s", gcs_compressed_path, (size, seconds))
+        elif status_code == 404:
+            return (date_str, "NOT_FOUND", "No data available for this date", None, None)
         else:
-            return (date_str, "ERROR", f"HTTP {response.status_code}", None)
+            return (date_str, "ERROR", f"HTTP {status_code}", None, None)
             
     except Exception as e:
-        return (date_str, "ERROR", str(e), None)
+        # stream_url_to cancels a failed upload, so no truncated archive is left in raw/
+        return (date_str, "ERROR", str(e), None, None)
 
 # ============================================
 # Decompression Function
 # ============================================
+def wanted_member(member):
+    """Only regular CSV files; *_trips.csv is skipped unless EXTRACT_TRIPS_FILES is set."""
+    name = os.path.basename(member.name)
+    return member.isfile() and name.endswith('.csv') and (EXTRACT_TRIPS_FILES or not name.endswith('_trips.csv'))
+
+def extract_archive_to_gcs(compressed, year_month, bucket):
+    """
+    Walk a .tar.xz stream member by member and stream each selected CSV
+    straight into its own GCS upload - nothing is written to local disk.
+    
+    Args:
+        compressed: readable file object positioned at the start of the .tar.xz
+        year_month: "YYYY-MM" folder the CSVs are uploaded to
+        bucket: destination GCS bucket
+    
+    Returns:
+        Tuple of (csv_count, total_uncompressed_bytes, skipped_members)
+    """
+    csv_count = 0
+    total_size = 0
+    skipped = 0
+    # 'r|xz' is tarfile's stream mode: sequential reads only, no seeking back
+    with tarfile.open(fileobj=compressed, mode='r|xz') as tar:
+        for member in tar:
+            if not wanted_member(member):
+                skipped += 1
+                continue
+            # Structure: decompressed/YYYY-MM/filename_YYYY-MM-DD.csv
+            gcs_csv_path = f"{GCS_DECOMPRESSED_PREFIX}{year_month}/{os.path.basename(member.name)}"
+            source = tar.extractfile(member)
+            with bucket.blob(gcs_csv_path).open('wb', chunk_size=STREAM_CHUNK_SIZE, content_type='text/csv') as target:
+                shutil.copyfileobj(source, target, STREAM_CHUNK_SIZE)
+            csv_count += 1
+            total_size += member.size
+    return csv_count, total_size, skipped
+
 def decompress_and_upload(compressed_gcs_path):
     """
-    Download compressed file from GCS, decompress .tar.xz, extract CSVs,
-    upload CSVs back to GCS in YEAR-MONTH folder structure, and delete the compressed file.
+    Stream a compressed file from GCS through xz decoding and tar parsing,
+    upload the selected CSVs to GCS in YEAR-MONTH folder structure, and delete the compressed file.
+    
+    Runs in a worker process (see main), so LZMA decoding scales with cores.
     
     Args:
         compressed_gcs_path: GCS path to the compressed file (e.g., "raw/subwaydatanyc_2024-11-07_csv.tar.xz")
@@ -96,60 +233,189 @@ def decompress_and_upload(compressed_gcs_path):
     Returns:
         Tuple of (date_str, status, message)
     """
+    # Extract date from filename
+    file_name = os.path.basename(compressed_gcs_path)
+    date_str = file_name.replace("subwaydatanyc_", "").replace("_csv.tar.xz", "")
     try:
-        # Extract date from filename
-        file_name = os.path.basename(compressed_gcs_path)
-        date_str = file_name.replace("subwaydatanyc_", "").replace("_csv.tar.xz", "")
-        
         # Extract year-month for new folder structure (e.g., "2024-11")
         year_month = date_str[:7]  # "YYYY-MM"
         
         client = storage.Client(project=PROJECT_ID)
         bucket = client.bucket(GCS_BUCKET_NAME)
         
-        # Download compressed file to temporary directory
-        with tempfile.TemporaryDirectory() as temp_dir:
-            local_compressed_path = os.path.join(temp_dir, file_name)
-            blob = bucket.blob(compressed_gcs_path)
-            blob.download_to_filename(local_compressed_path)
-            
-            # Decompress .tar.xz file
-            # Step 1: Decompress .xz to .tar
-            tar_path = local_compressed_path.replace('.tar.xz', '.tar')
-            with lzma.open(local_compressed_path, 'rb') as f_in:
-                with open(tar_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
-            
-            # Step 2: Extract .tar archive
-            extract_dir = os.path.join(temp_dir, 'extracted')
-            os.makedirs(extract_dir, exist_ok=True)
-            with tarfile.open(tar_path, 'r') as tar:
-                tar.extractall(path=extract_dir)
+        blob = bucket.blob(compressed_gcs_path)
+        with blob.open('rb', chunk_size=STREAM_CHUNK_SIZE) as compressed:
+            csv_count, total_size, skipped = extract_archive_to_gcs(compressed, year_month, bucket)
+        
+        # Delete the compressed file from GCS
+        blob.delete()
+        
+        total_size_mb = total_size / (1024 * 1024)
+        return (date_str, "DECOMPRESSED", f"Extracted {csv_count} CSVs to {year_month}/ ({total_size_mb:.2f} MB, {skipped} members skipped)")
             
-            # Step 3: Upload all CSV files to GCS in YEAR-MONTH folders
-            csv_count = 0
-            total_size = 0
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files:
-                    if file.endswith('.csv'):
-                        local_csv_path = os.path.join(root, file)
-                        # New structure: decompressed/YYYY-MM/filename_YYYY-MM-DD.csv
-                        gcs_csv_path = f"{GCS_DECOMPRESSED_PREFIX}{year_month}/{file}"
-                        
-                        csv_blob = bucket.blob(gcs_csv_path)
-                        csv_blob.upload_from_filename(local_csv_path)
-                        
-                        csv_count += 1
-                        total_size += os.path.getsize(local_csv_path)
+    except Exception as e:
+        return (date_str, "DECOMPRESS_ERROR", str(e))
+
+# ============================================
+# Fused Download -> Decompress Stages
+# ============================================
+def download_to_local(date, buffer_dir):
+    """
+    Network stage of the fused pipeline: stream one archive to the local buffer directory.
+    
+    Returns:
+        Tuple of (date_str, status, message, local_path, (bytes, seconds))
+    """
+    date_str = date.strftime('%Y-%m-%d')
+    file_name = f"subwaydatanyc_{date_str}_csv.tar.xz"
+    local_path = os.path.join(buffer_dir, file_name)
+    try:
+        start = time.perf_counter()
+        status_code, size = stream_url_to(f"{BASE_URL}/{file_name}", lambda: open(local_path, 'wb'))
+        seconds = time.perf_counter() - start
+        if status_code == 200:
+            file_size_mb = size / (1024 * 1024)
+            return (date_str, "SUCCESS", f"Downloaded {file_size_mb:.2f} MB at {file_size_mb / seconds:.2f} MB/s", local_path, (size, seconds))
+        elif status_code == 404:
+            return (date_str, "NOT_FOUND", "No data available for this date", None, None)
+        else:
+            return (date_str, "ERROR", f"HTTP {status_code}", None, None)
+    except Exception as e:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+        return (date_str, "ERROR", str(e), None, None)
+
+def decompress_local_archive(local_path):
+    """
+    CPU stage of the fused pipeline (runs in a worker process): extract a buffered
+    archive straight to GCS, then free its slot on local disk.
+    
+    Returns:
+        Tuple of (date_str, status, message)
+    """
+    file_name = os.path.basename(local_path)
+    date_str = file_name.replace("subwaydatanyc_", "").replace("_csv.tar.xz", "")
+    year_month = date_str[:7]  # "YYYY-MM"
+    try:
+        client = storage.Client(project=PROJECT_ID)
+        bucket = client.bucket(GCS_BUCKET_NAME)
+        with open(local_path, 'rb') as compressed:
+            csv_count, total_size, skipped = extract_archive_to_gcs(compressed, year_month, bucket)
+        total_size_mb = total_size / (1024 * 1024)
+        return (date_str, "DECOMPRESSED", f"Extracted {csv_count} CSVs to {year_month}/ ({total_size_mb:.2f} MB, {skipped} members skipped)")
+    except Exception as e:
+        return (date_str, "DECOMPRESS_ERROR", str(e))
+    finally:
+        os.remove(local_path)
+
+STATUS_SYMBOLS = {
+    "SUCCESS": "⬇",
+    "SKIPPED": "⊘",
+    "NOT_FOUND": "✗",
+    "ERROR": "✗",
+    "DECOMPRESSED": "✓",
+    "DECOMPRESS_ERROR": "✗"
+}
+
+# Pipeline status -> ingestion state updates as (stage, status)
+STATE_UPDATES = {
+    "SUCCESS": [("download", DONE)],
+    "SKIPPED": [("extract", DONE)],
+    "NOT_FOUND": [("download", MISSING), ("extract", MISSING)],
+    "ERROR": [("download", FAILED)],
+    "DECOMPRESSED": [("extract", DONE)],
+    "DECOMPRESS_ERROR": [("extract", FAILED)],
+}
+
+def record_result(state, results, date_str, status, message):
+    """Count, persist and print one pipeline result."""
+    results[status] += 1
+    for stage, stage_status in STATE_UPDATES.get(status, []):
+        state.mark(date_str, stage, stage_status, message)
+    print(f"{STATUS_SYMBOLS.get(status, '?')} {date_str}: {status} - {message}")
+
+def run_fused(dates, decompressed_dates, state, results, transfers):
+    """
+    One pipelined pass: MAX_WORKERS download threads feed DECOMPRESS_WORKERS
+    decompression processes through a local buffer of at most BUFFERED_ARCHIVES
+    archives. A download only starts once a buffer slot is free, so a slow CPU
+    stage throttles the network stage instead of filling the disk, and total
+    time tends toward the slower of the two stages rather than their sum.
+    """
+    print(f"Fused pipeline: {MAX_WORKERS} download threads -> {DECOMPRESS_WORKERS} decompression processes "
+          f"(buffer of {BUFFERED_ARCHIVES} archives)")
+    print("-" * 60 + "\n")
+    
+    buffer_slots = threading.BoundedSemaphore(BUFFERED_ARCHIVES)
+    
+    with tempfile.TemporaryDirectory() as buffer_dir, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=DECOMPRESS_WORKERS) as cpu_pool, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as network_pool:
+        
+        def download_stage(date):
+            date_str = date.strftime('%Y-%m-%d')
+            if date_str in decompressed_dates:
+                return (date_str, "SKIPPED", f"CSVs already in {date_str[:7]}/", None, None), None
+            buffer_slots.acquire()  # backpressure: wait for the CPU stage to drain the buffer
+            result = download_to_local(date, buffer_dir)
+            if result[1] != "SUCCESS":
+                buffer_slots.release()
+                return result, None
+            decompress_future = cpu_pool.submit(decompress_local_archive, result[3])
+            decompress_future.add_done_callback(lambda _: buffer_slots.release())
+            return result, decompress_future
+        
+        pending = {network_pool.submit(download_stage, date) for date in dates}
+        network_futures = set(pending)
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future in network_futures:
+                    (date_str, status, message, _, transfer), decompress_future = future.result()
+                    if transfer:
+                        transfers.append(transfer)
+                    if decompress_future is not None:
+                        pending.add(decompress_future)
+                else:
+                    date_str, status, message = future.result()
+                record_result(state, results, date_str, status, message)
+
+def run_staged(dates, decompressed_dates, state, results, transfers):
+    """
+    Two barriered phases: download every archive to raw/ in GCS, then decompress them all.
+    """
+    # Step 1: Download files in parallel
+    print("STEP 1: Downloading compressed files...")
+    print("-" * 60 + "\n")
+    
+    compressed_files = []  # Track files that need decompression
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        future_to_date = {executor.submit(download_and_upload, date, decompressed_dates): date for date in dates}
+        
+        for future in concurrent.futures.as_completed(future_to_date):
+            date_str, status, message, compressed_path, transfer = future.result()
+            if transfer:
+                transfers.append(transfer)
             
-            # Step 4: Delete the compressed file from GCS
-            blob.delete()
+            # Track files that need decompression
+            if status == "SUCCESS" and compressed_path:
+                compressed_files.append(compressed_path)
             
-            total_size_mb = total_size / (1024 * 1024)
-            return (date_str, "DECOMPRESSED", f"Extracted {csv_count} CSVs to {year_month}/ ({total_size_mb:.2f} MB)")
+            record_result(state, results, date_str, status, message)
+    
+    # Step 2: Decompress files in parallel
+    if compressed_files:
+        print("\n" + "="*60)
+        print(f"STEP 2: Decompressing {len(compressed_files)} files...")
+        print("-" * 60 + "\n")
+        
+        with concurrent.futures.ProcessPoolExecutor(max_workers=DECOMPRESS_WORKERS) as executor:
+            future_to_path = {executor.submit(decompress_and_upload, path): path for path in compressed_files}
             
-    except Exception as e:
-        return (date_str, "DECOMPRESS_ERROR", str(e))
+            for future in concurrent.futures.as_completed(future_to_path):
+                date_str, status, message = future.result()
+                record_result(state, results, date_str, status, message)
 
 # ============================================
 # Main Execution
@@ -176,7 +442,27 @@ def main():
         return
     
     # Generate list of dates to download
-    dates = [START_DATE + timedelta(days=x) for x in range((END_DATE - START_DATE).days + 1)]
+    all_dates = [START_DATE + timedelta(days=x) for x in range((END_DATE - START_DATE).days + 1)]
+    
+    state = IngestState()
+    if state.has_stage("extract"):
+        # Incremental run: the state already knows what was extracted
+        decompressed_dates, listed_blobs, listing_seconds = set(), 0, 0.0
+        print(f"\nUsing ingestion state {state.path} (extract watermark {state.watermark('extract')})")
+    else:
+        # First run with state: one listing pass instead of one per date, then seed the state from it
+        print(f"\nBuilding manifest of decompressed dates from gs://{GCS_BUCKET_NAME}/{GCS_DECOMPRESSED_PREFIX}...")
+        decompressed_dates, listed_blobs, listing_seconds = build_decompressed_manifest(bucket)
+        print(f"Listed {listed_blobs} blobs in {listing_seconds:.2f}s - {len(decompressed_dates)} dates already decompressed")
+        state.mark_many(sorted(decompressed_dates), "extract", DONE, "found in GCS listing")
+    
+    pending = set(state.pending([date.strftime('%Y-%m-%d') for date in all_dates], "extract"))
+    dates = [date for date in all_dates if date.strftime('%Y-%m-%d') in pending]
+    print(f"{len(all_dates) - len(dates)} of {len(all_dates)} dates already extracted (or missing upstream)")
+    if not dates:
+        print("\nNothing new to download.")
+        state.close()
+        return
     
     print(f"\nProcessing {len(dates)} dates with {MAX_WORKERS} parallel workers...\n")
     
@@ -190,52 +476,14 @@ def main():
         "DECOMPRESS_ERROR": 0
     }
     
-    # Step 1: Download files in parallel
-    print("STEP 1: Downloading compressed files...")
-    print("-" * 60 + "\n")
-    
-    compressed_files = []  # Track files that need decompression
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_date = {executor.submit(download_and_upload, date): date for date in dates}
-        
-        for future in concurrent.futures.as_completed(future_to_date):
-            date_str, status, message, compressed_path = future.result()
-            results[status] += 1
-            
-            # Track files that need decompression
-            if status == "SUCCESS" and compressed_path:
-                compressed_files.append(compressed_path)
-            
-            # Print status with symbols
-            status_symbols = {
-                "SUCCESS": "⬇",
-                "SKIPPED": "⊘",
-                "NOT_FOUND": "✗",
-                "ERROR": "✗"
-            }
-            symbol = status_symbols.get(status, "?")
-            print(f"{symbol} {date_str}: {status} - {message}")
-    
-    # Step 2: Decompress files in parallel
-    if compressed_files:
-        print("\n" + "="*60)
-        print(f"STEP 2: Decompressing {len(compressed_files)} files...")
-        print("-" * 60 + "\n")
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=DECOMPRESS_WORKERS) as executor:
-            future_to_path = {executor.submit(decompress_and_upload, path): path for path in compressed_files}
-            
-            for future in concurrent.futures.as_completed(future_to_path):
-                date_str, status, message = future.result()
-                results[status] += 1
-                
-                status_symbols = {
-                    "DECOMPRESSED": "✓",
-                    "DECOMPRESS_ERROR": "✗"
-                }
-                symbol = status_symbols.get(status, "?")
-                print(f"{symbol} {date_str}: {status} - {message}")
+    transfers = []  # (bytes, seconds) per downloaded file
+    start = time.perf_counter()
+    if PIPELINE_MODE == "fused":
+        run_fused(dates, decompressed_dates, state, results, transfers)
+    else:
+        run_staged(dates, decompressed_dates, state, results, transfers)
+    elapsed = time.perf_counter() - start
+    state.close()
     
     # Print final summary
     print("\n" + "="*60)
@@ -247,16 +495,24 @@ def main():
     print(f"✗ Not found (404): {results['NOT_FOUND']}")
     print(f"✗ Download errors: {results['ERROR']}")
     print(f"✗ Decompression errors: {results['DECOMPRESS_ERROR']}")
+    print(f"\nWall clock ({PIPELINE_MODE} mode): {elapsed:.1f}s")
+    if listed_blobs:
+        print(f"Skip check: 1 listing of {listed_blobs} blobs in {listing_seconds:.2f}s")
+    else:
+        print("Skip check: ingestion state (no GCS listing)")
+    if transfers:
+        rates = sorted(size / seconds / (1024 * 1024) for size, seconds in transfers)
+        total_mb = sum(size for size, _ in transfers) / (1024 * 1024)
+        print(f"Download throughput per file: min {rates[0]:.2f} / median {rates[len(rates) // 2]:.2f} / max {rates[-1]:.2f} MB/s ({total_mb:.1f} MB total)")
     print(f"\nTotal CSV files ready in GCS: {results['DECOMPRESSED'] + results['SKIPPED']}")
     print("\n" + "="*60)
     print(f"CSV files location: gs://{GCS_BUCKET_NAME}/{GCS_DECOMPRESSED_PREFIX}")
-    print("Compressed files: DELETED (cleanup complete)")
+    print("Compressed files: DELETED (cleanup complete)" if PIPELINE_MODE == "staged" else "Compressed files: never stored in GCS (fused mode)")
     print("="*60 + "\n")
     
-    print("Next step - Load to BigQuery:")
-    print(f"  bq load --source_format=CSV --skip_leading_rows=1 \\")
-    print(f"    {PROJECT_ID}:mta_historical.sensor_data \\")
-    print(f"    'gs://{GCS_BUCKET_NAME}/{GCS_DECOMPRESSED_PREFIX}*/*.csv'")
+    print("Next steps:")
+    print("  python 7-data-archive-tools/convert_to_parquet.py      # typed Parquet per service date")
+    print("  python 7-data-archive-tools/load_to_bigquery_monthly.py  # load Parquet into BigQuery")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Bulk GCS Operations for Archive Maintenance
+One listing pass with server-side prefix/glob filtering, then deletes sent as
+batch requests (up to 100 objects per HTTP call) and copies/rewrites run over
+a bounded thread pool, all with retries, a dry-run mode and an ops/sec report.
+
+Used by the other archive tools, and as a command line tool:
+    python 7-data-archive-tools/gcs_bulk.py delete --prefix decompressed/ --glob '**_trips.csv' --dry-run
+    python 7-data-archive-tools/gcs_bulk.py copy --prefix parquet/ --destination my-backup-bucket
+    python 7-data-archive-tools/gcs_bulk.py rewrite --prefix raw/ --storage-class ARCHIVE
+"""
+
+import argparse
+import concurrent.futures
+import threading
+import time
+
+from google.api_core import exceptions
+from google.cloud import storage
+
+# ============================================
+# Configuration
+# ============================================
+PROJECT_ID = "time-series-478616"
+GCS_BUCKET_NAME = f"{PROJECT_ID}-historical-data"
+BATCH_SIZE = 100  # GCS JSON API limit for requests per batch call
+BULK_WORKERS = 16  # concurrent batches / per-object requests
+BULK_RETRIES = 3  # attempts per batch or object on transient errors
+RETRYABLE = (
+    exceptions.TooManyRequests,
+    exceptions.InternalServerError,
+    exceptions.BadGateway,
+    exceptions.ServiceUnavailable,
+    exceptions.GatewayTimeout,
+    ConnectionError,
+)
+
+# One client per worker thread: a batch context captures every request its client makes
+_local = threading.local()
+
+
+def _client():
+    if not hasattr(_local, "client"):
+        _local.client = storage.Client(project=PROJECT_ID)
+    return _local.client
+
+
+def _with_retries(operation):
+    """Run operation(), retrying transient errors with exponential backoff."""
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except RETRYABLE:
+            attempt += 1
+            if attempt > BULK_RETRIES:
+                raise
+            time.sleep(2 ** attempt)
+
+
+# ============================================
+# Listing
+# ============================================
+def list_objects(bucket_name, prefix="", match_glob=None):
+    """
+    One listing pass with the filtering done by GCS.
+
+    Args:
+        bucket_name: bucket to list
+        prefix: object name prefix
+        match_glob: optional glob (e.g. "**_trips.csv") matched server-side
+
+    Returns:
+        List of (object name, size in bytes)
+    """
+    blobs = _client().bucket(bucket_name).list_blobs(
+        prefix=prefix, match_glob=match_glob, fields="items(name,size),nextPageToken"
+    )
+    return [(blob.name, blob.size or 0) for blob in blobs]
+
+
+# ============================================
+# Bulk Operations
+# ============================================
+def _delete_chunk(bucket_name, names):
+    """
+    Delete up to BATCH_SIZE objects in one batch request; if the batch fails,
+    fall back to per-object deletes so one bad object doesn't fail the rest.
+    Objects that are already gone count as deleted.
+
+    Returns:
+        List of (name, error) for objects that could not be deleted
+    """
+    client = _client()
+    bucket = client.bucket(bucket_name)
+
+    def send_batch():
+        with client.batch():
+            for name in names:
+                bucket.blob(name).delete()
+
+    try:
+        _with_retries(send_batch)
+        return []
+    except Exception:
+        pass
+
+    failures = []
+    for name in names:
+        try:
+            _with_retries(lambda: bucket.blob(name).delete())
+        except exceptions.NotFound:
+            pass
+        except Exception as e:
+            failures.append((name, str(e)))
+    return failures
+
+
+def _run(label, total, tasks, dry_run, total_bytes):
+    """
+    Run callables over the thread pool and summarize.
+
+    Args:
+        label: operation name for the report
+        total: number of objects covered by the tasks
+        tasks: list of (object count, callable returning list of (name, error))
+
+    Returns:
+        Report dict with objects, bytes, ok, failed, seconds, ops_per_sec, dry_run
+    """
+    report = {"operation": label, "objects": total, "bytes": total_bytes, "ok": 0, "failed": [],
+              "seconds": 0.0, "ops_per_sec": 0.0, "dry_run": dry_run}
+    if dry_run or not tasks:
+        return report
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=BULK_WORKERS) as executor:
+        futures = {executor.submit(task): count for count, task in tasks}
+        done_objects = 0
+        for future in concurrent.futures.as_completed(futures):
+            failures = future.result()
+            done_objects += futures[future]
+            report["failed"].extend(failures)
+            report["ok"] += futures[future] - len(failures)
+            if done_objects % (BATCH_SIZE * 10) < futures[future]:
+                print(f"  {label}: {done_objects}/{total} objects...")
+    report["seconds"] = time.perf_counter() - start
+    report["ops_per_sec"] = report["ok"] / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+
+def bulk_delete(bucket_name, objects, dry_run=False):
+    """
+    Delete objects in batches of BATCH_SIZE over BULK_WORKERS threads.
+
+    Args:
+        bucket_name: bucket holding the objects
+        objects: list of (name, size) from list_objects
+        dry_run: only count what would be deleted
+
+    Returns:
+        Report dict (see print_report)
+    """
+    names = [name for name, _ in objects]
+    tasks = [
+        (len(chunk), lambda chunk=chunk: _delete_chunk(bucket_name, chunk))
+        for chunk in (names[i:i + BATCH_SIZE] for i in range(0, len(names), BATCH_SIZE))
+    ]
+    return _run("delete", len(names), tasks, dry_run, sum(size for _, size in objects))
+
+
+def _per_object(operation, names):
+    """Task wrapper for operations that can't be batched: retry each object, collect failures."""
+    def task():
+        failures = []
+        for name in names:
+            try:
+                _with_retries(lambda: operation(name))
+            except Exception as e:
+                failures.append((name, str(e)))
+        return failures
+    return task
+
+
+def bulk_copy(bucket_name, objects, destination_bucket, rename=None, dry_run=False):
+    """
+    Copy objects to another bucket (or another name in the same bucket).
+
+    Copies use the rewrite API so large objects and cross-location copies
+    complete; they run per object over the thread pool because each rewrite
+    may need follow-up calls.
+
+    Args:
+        rename: optional callable mapping a source name to its destination name
+    """
+    def copy(name):
+        client = _client()
+        source = client.bucket(bucket_name).blob(name)
+        target = client.bucket(destination_bucket).blob(rename(name) if rename else name)
+        token, _, _ = target.rewrite(source)
+        while token is not None:
+            token, _, _ = target.rewrite(source, token=token)
+
+    names = [name for name, _ in objects]
+    tasks = [(len(chunk), _per_object(copy, chunk))
+             for chunk in (names[i:i + BATCH_SIZE] for i in range(0, len(names), BATCH_SIZE))]
+    return _run("copy", len(names), tasks, dry_run, sum(size for _, size in objects))
+
+
+def bulk_rewrite(bucket_name, objects, storage_class, dry_run=False):
+    """Rewrite objects in place into another storage class (e.g. NEARLINE, ARCHIVE)."""
+    def rewrite(name):
+        _client().bucket(bucket_name).blob(name).update_storage_class(storage_class)
+
+    names = [name for name, _ in objects]
+    tasks = [(len(chunk), _per_object(rewrite, chunk))
+             for chunk in (names[i:i + BATCH_SIZE] for i in range(0, len(names), BATCH_SIZE))]
+    return _run(f"rewrite to {storage_class}", len(names), tasks, dry_run, sum(size for _, size in objects))
+
+
+def print_report(report):
+    """Print a one-block summary of a bulk operation report."""
+    size_mb = report["bytes"] / (1024 * 1024)
+    if report["dry_run"]:
+        print(f"⊘ Dry run: would {report['operation']} {report['objects']:,} objects ({size_mb:,.1f} MB)")
+        return
+    print(f"✓ {report['operation']}: {report['ok']:,}/{report['objects']:,} objects ({size_mb:,.1f} MB) "
+          f"in {report['seconds']:.1f}s - {report['ops_per_sec']:,.0f} ops/sec")
+    if report["failed"]:
+        print(f"✗ {len(report['failed'])} objects failed:")
+        for name, error in report["failed"][:10]:
+            print(f"  - {name}: {error}")
+        if len(report["failed"]) > 10:
+            print(f"  ... and {len(report['failed']) - 10} more")
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("operation", choices=["delete", "copy", "rewrite"])
+    parser.add_argument("--bucket", default=GCS_BUCKET_NAME)
+    parser.add_argument("--prefix", default="")
+    parser.add_argument("--glob", default=None, help="server-side match_glob, e.g. '**_trips.csv'")
+    parser.add_argument("--destination", help="copy: destination bucket")
+    parser.add_argument("--storage-class", help="rewrite: target storage class")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Bulk {args.operation}: gs://{args.bucket}/{args.prefix}{args.glob or ''}")
+    print("=" * 60)
+
+    start = time.perf_counter()
+    objects = list_objects(args.bucket, args.prefix, args.glob)
+    print(f"Listed {len(objects):,} matching objects in {time.perf_counter() - start:.2f}s\n")
+
+    if args.operation == "delete":
+        report = bulk_delete(args.bucket, objects, dry_run=args.dry_run)
+    elif args.operation == "copy":
+        if not args.destination:
+            parser.error("copy needs --destination")
+        report = bulk_copy(args.bucket, objects, args.destination, dry_run=args.dry_run)
+    else:
+        if not args.storage_class:
+            parser.error("rewrite needs --storage-class")
+        report = bulk_rewrite(args.bucket, objects, args.storage_class, dry_run=args.dry_run)
+
+    print("\n" + "=" * 60)
+    print_report(report)
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Shared Ingestion State for the Archive Tools
+A small SQLite database recording, per service date and stage, whether the
+date was downloaded, extracted, converted to Parquet and loaded to BigQuery.
+The scripts consult it instead of re-listing GCS, so a daily run only touches
+dates that are new since the last watermark or that failed before.
+
+Stages:   download -> extract -> convert -> load
+Statuses: done, failed, missing (the archive returned 404)
+
+Run directly to print a per-stage summary:
+    python 7-data-archive-tools/ingest_state.py
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# ============================================
+# Configuration
+# ============================================
+STATE_DB = os.environ.get(
+    "INGEST_STATE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_state.sqlite"),
+)
+STAGES = ("download", "extract", "convert", "load")
+DONE = "done"
+FAILED = "failed"
+MISSING = "missing"
+
+
+# ============================================
+# State Store
+# ============================================
+class IngestState:
+    """
+    Per-(date, stage) status table. Safe to share between threads of one
+    process; worker processes should report back to the main process, which
+    records their results.
+    """
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_status (
+                    date TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    detail TEXT,
+                    PRIMARY KEY (date, stage)
+                )
+            """)
+
+    def mark(self, date_str, stage, status, detail=None):
+        """Record the outcome of one stage for one date."""
+        self.mark_many([date_str], stage, status, detail)
+
+    def mark_many(self, date_strs, stage, status, detail=None):
+        """Record the same outcome for many dates in one transaction."""
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        rows = [(date_str, stage, status, now, detail) for date_str in date_strs]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ingest_status (date, stage, status, updated_at, detail) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def clear(self, date_strs, stage):
+        """Forget a stage's outcome for some dates, e.g. loads invalidated by a re-conversion."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "DELETE FROM ingest_status WHERE date = ? AND stage = ?",
+                [(date_str, stage) for date_str in date_strs],
+            )
+
+    def statuses(self, stage):
+        """Returns dict of date -> status for one stage."""
+        with self.lock:
+            rows = self.conn.execute("SELECT date, status FROM ingest_status WHERE stage = ?", (stage,)).fetchall()
+        return dict(rows)
+
+    def dates(self, stage, status=DONE):
+        """Returns sorted list of dates with the given status for one stage."""
+        return sorted(date_str for date_str, s in self.statuses(stage).items() if s == status)
+
+    def has_stage(self, stage):
+        """True once any date has been recorded for the stage (i.e. state is bootstrapped)."""
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM ingest_status WHERE stage = ? LIMIT 1", (stage,)).fetchone() is not None
+
+    def watermark(self, stage):
+        """Newest date completed for the stage, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(date) FROM ingest_status WHERE stage = ? AND status = ?", (stage, DONE)
+            ).fetchone()
+        return row[0]
+
+    def pending(self, date_strs, stage):
+        """
+        Filter dates down to the ones the stage still has to process: never
+        seen, failed, or missing (404) but newer than the watermark, since
+        recent archives may not be published yet.
+
+        Args:
+            date_strs: candidate "YYYY-MM-DD" strings
+            stage: one of STAGES
+
+        Returns:
+            Sorted list of dates to process
+        """
+        statuses = self.statuses(stage)
+        watermark = self.watermark(stage) or ""
+        pending = []
+        for date_str in date_strs:
+            status = statuses.get(date_str)
+            if status == DONE or (status == MISSING and date_str <= watermark):
+                continue
+            pending.append(date_str)
+        return sorted(pending)
+
+    def close(self):
+        self.conn.close()
+
+
+# ============================================
+# Summary
+# ============================================
+def main():
+    state = IngestState()
+    print("=" * 60)
+    print(f"Ingestion State: {state.path}")
+    print("=" * 60)
+    for stage in STAGES:
+        statuses = state.statuses(stage)
+        counts = {status: list(statuses.values()).count(status) for status in (DONE, FAILED, MISSING)}
+        print(f"{stage:<9} ✓ {counts[DONE]:>5} done  ✗ {counts[FAILED]:>4} failed  ⊘ {counts[MISSING]:>4} missing  "
+              f"watermark {state.watermark(stage) or '-'}")
+        failed = state.dates(stage, FAILED)
+        if failed:
+            print(f"          failed: {', '.join(failed[:10])}{' ...' if len(failed) > 10 else ''}")
+    print("=" * 60)
+    state.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
 """
 Load Historical MTA Data to BigQuery - Month by Month
-Uses new year-month folder structure in GCS
+Loads the Parquet written by convert_to_parquet.py into a MONTH-partitioned,
+clustered table. Each month replaces its own partition (WRITE_TRUNCATE on
+sensor_data$YYYYMM), so re-running any set of months is idempotent.
+Loads run concurrently with a bounded number in flight. With an ingestion
+state (ingest_state.py), only months holding converted-but-unloaded dates run.
 Provides detailed progress and error reporting per month
 """
 
 from google.cloud import bigquery
 from google.cloud import storage
+import concurrent.futures
 import json
-from datetime import datetime
+import time
+from collections import defaultdict
+from datetime import date
+
+from ingest_state import IngestState, DONE, FAILED
 
 # ============================================
 # Configuration
@@ -17,22 +26,25 @@ PROJECT_ID = "time-series-478616"
 DATASET_ID = "mta_historical"
 TABLE_ID = "sensor_data"
 BUCKET_NAME = f"{PROJECT_ID}-historical-data"
-PREFIX = "decompressed/"
+PARQUET_PREFIX = "parquet/"  # written by convert_to_parquet.py
+MAX_CONCURRENT_LOADS = 8  # load jobs in flight at once
+PARTITION_FIELD = "service_date"  # MONTH partitions, one per load job
+CLUSTERING_FIELDS = ["stop_id", "trip_uid"]
 
-# Date range to load
+# Date range to load when there is no ingestion state yet (ends with the current month)
 START_YEAR = 2021
 START_MONTH = 4
-END_YEAR = 2025
-END_MONTH = 11
+END_YEAR = date.today().year
+END_MONTH = date.today().month
 
 print("="*70)
 print("Loading Historical Data to BigQuery - Month by Month")
 print("="*70)
 print(f"Project: {PROJECT_ID}")
 print(f"Dataset: {DATASET_ID}")
-print(f"Table: {TABLE_ID}")
-print(f"Bucket: gs://{BUCKET_NAME}/{PREFIX}")
-print(f"Date Range: {START_YEAR}-{START_MONTH:02d} to {END_YEAR}-{END_MONTH:02d}")
+print(f"Table: {TABLE_ID} (partitioned by month on {PARTITION_FIELD}, clustered by {', '.join(CLUSTERING_FIELDS)})")
+print(f"Bucket: gs://{BUCKET_NAME}/{PARQUET_PREFIX}")
+print(f"Concurrent loads: {MAX_CONCURRENT_LOADS}")
 print("="*70 + "\n")
 
 # Initialize clients
@@ -55,88 +67,146 @@ with open(schema_file, 'r') as f:
         for field in schema_json
     ]
 
+# Partition column added by convert_to_parquet.py
+schema.append(bigquery.SchemaField(PARTITION_FIELD, "DATE", mode="NULLABLE",
+                                   description="Service date of the source file"))
+
 print(f"Schema loaded: {len(schema)} fields\n")
 
 # Generate list of year-months to process
-months_to_process = []
-for year in range(START_YEAR, END_YEAR + 1):
-    start_m = START_MONTH if year == START_YEAR else 1
-    end_m = END_MONTH if year == END_YEAR else 12
-    
-    for month in range(start_m, end_m + 1):
-        months_to_process.append(f"{year}-{month:02d}")
+state = IngestState()
+if state.has_stage("convert"):
+    # Incremental run: months with a converted date that isn't loaded (new, failed or re-converted)
+    pending_dates = state.pending(state.dates("convert"), "load")
+    months_to_process = sorted({date_str[:7] for date_str in pending_dates})
+    print(f"Using ingestion state {state.path} (load watermark {state.watermark('load')}): "
+          f"{len(pending_dates)} dates pending")
+else:
+    months_to_process = []
+    for year in range(START_YEAR, END_YEAR + 1):
+        start_m = START_MONTH if year == START_YEAR else 1
+        end_m = END_MONTH if year == END_YEAR else 12
+
+        for month in range(start_m, end_m + 1):
+            months_to_process.append(f"{year}-{month:02d}")
+    print(f"Date Range: {START_YEAR}-{START_MONTH:02d} to {END_YEAR}-{END_MONTH:02d}")
 
 print(f"Processing {len(months_to_process)} months\n")
 print("="*70)
 
-# Track results
-results = {
-    "success": [],
-    "failed": [],
-    "empty": [],
-    "total_rows": 0
-}
-
-# Configure load job (common for all months)
+# ============================================
+# Partitioned Target Table
+# ============================================
 table_ref = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
 
-# Process each month
-for idx, year_month in enumerate(months_to_process, 1):
-    print(f"\n[{idx}/{len(months_to_process)}] Processing {year_month}...")
-    print("-" * 70)
-    
-    # Check if files exist for this month
-    bucket = storage_client.bucket(BUCKET_NAME)
-    month_prefix = f"{PREFIX}{year_month}/"
-    blobs = list(bucket.list_blobs(prefix=month_prefix))
-    csv_blobs = [blob for blob in blobs if blob.name.endswith('.csv')]
-    
-    if not csv_blobs:
-        print(f"⚠ No CSV files found for {year_month}")
-        results["empty"].append(year_month)
-        continue
-    
-    print(f"  Found {len(csv_blobs)} CSV files")
-    
-    # Build GCS URI pattern for this month
-    csv_pattern = f"gs://{BUCKET_NAME}/{month_prefix}*.csv"
-    
+table = bigquery.Table(table_ref, schema=schema)
+table.time_partitioning = bigquery.TimePartitioning(
+    type_=bigquery.TimePartitioningType.MONTH,
+    field=PARTITION_FIELD,
+)
+table.clustering_fields = CLUSTERING_FIELDS
+table = bq_client.create_table(table, exists_ok=True)
+
+if not table.time_partitioning or table.time_partitioning.field != PARTITION_FIELD \
+        or table.time_partitioning.type_ != bigquery.TimePartitioningType.MONTH:
+    print(f"✗ {table_ref} exists but is not MONTH-partitioned on {PARTITION_FIELD}.")
+    print("  Partition loads cannot target it. Drop the table (or rename it) and re-run:")
+    print(f"  bq rm -t {PROJECT_ID}:{DATASET_ID}.{TABLE_ID}")
+    raise SystemExit(1)
+
+# List the Parquet files, grouped by month: year_month -> [(date, bytes)]
+# (one listing of the whole prefix, or one per pending month on incremental runs)
+bucket = storage_client.bucket(BUCKET_NAME)
+files_by_month = defaultdict(list)
+partition_prefix = f"{PARQUET_PREFIX}{PARTITION_FIELD}="
+listing_prefixes = [f"{partition_prefix}{year_month}-" for year_month in months_to_process] \
+    if state.has_stage("convert") else [partition_prefix]
+for blob in (blob for prefix in listing_prefixes
+             for blob in bucket.list_blobs(prefix=prefix, fields="items(name,size),nextPageToken")):
+    if blob.name.endswith('.parquet'):
+        # parquet/service_date=YYYY-MM-DD/stop_times.parquet
+        date_str = blob.name[len(partition_prefix):][:10]
+        files_by_month[date_str[:7]].append((date_str, blob.size or 0))
+
+
+# ============================================
+# Per-Month Partition Load
+# ============================================
+def load_month(year_month):
+    """
+    Replace one month partition with that month's Parquet files.
+
+    Returns:
+        Tuple of (year_month, status, stats dict or error message)
+    """
+    source_pattern = f"gs://{BUCKET_NAME}/{PARQUET_PREFIX}{PARTITION_FIELD}={year_month}-*"
+    partition = f"{table_ref}${year_month.replace('-', '')}"
+    start = time.perf_counter()
     try:
-        # Configure job for this month
+        # Types were applied once during conversion; no CSV parsing or bad-record handling here
         job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.CSV,
-            skip_leading_rows=1,
+            source_format=bigquery.SourceFormat.PARQUET,
             schema=schema,
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,  # Append to existing table
-            allow_jagged_rows=True,
-            max_bad_records=1000,
-            ignore_unknown_values=True
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,  # Replaces only this partition
         )
-        
-        # Load data
-        print(f"  Loading: {csv_pattern}")
         load_job = bq_client.load_table_from_uri(
-            csv_pattern,
-            table_ref,
+            source_pattern,
+            partition,
             job_config=job_config
         )
-        
-        # Wait for completion
         load_job.result()
-        
-        # Get stats
-        rows_loaded = load_job.output_rows or 0
-        results["total_rows"] += rows_loaded
-        results["success"].append(year_month)
-        
-        print(f"  ✓ Success: {rows_loaded:,} rows loaded")
-        
-        if load_job.errors:
-            print(f"  ⚠ Warnings: {len(load_job.errors)} errors encountered (but job succeeded)")
-        
+        return (year_month, "success", {
+            "rows": load_job.output_rows or 0,
+            "bytes": load_job.input_file_bytes or sum(size for _, size in files_by_month[year_month]),
+            "seconds": time.perf_counter() - start,
+            "warnings": len(load_job.errors or []),
+        })
     except Exception as e:
-        print(f"  ✗ Failed: {str(e)}")
-        results["failed"].append(year_month)
+        return (year_month, "failed", str(e))
+
+
+# Track results
+results = {
+    "success": [],
+    "failed": [],
+    "empty": [],
+    "total_rows": 0,
+    "total_bytes": 0,
+    "stats": {},
+}
+
+# Submit months with files; at most MAX_CONCURRENT_LOADS jobs run at once
+wall_start = time.perf_counter()
+with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENT_LOADS) as executor:
+    futures = []
+    for year_month in months_to_process:
+        if not files_by_month.get(year_month):
+            print(f"⚠ {year_month}: no Parquet files found")
+            results["empty"].append(year_month)
+            continue
+        print(f"  Queued {year_month}: {len(files_by_month[year_month])} files, "
+              f"{sum(size for _, size in files_by_month[year_month]) / (1024 * 1024):.1f} MB")
+        futures.append(executor.submit(load_month, year_month))
+
+    for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+        year_month, status, outcome = future.result()
+        # The whole partition was replaced, so every date in it shares the outcome
+        month_dates = [date_str for date_str, _ in files_by_month[year_month]]
+        if status == "success":
+            state.mark_many(month_dates, "load", DONE, f"partition {year_month.replace('-', '')}")
+            results["success"].append(year_month)
+            results["stats"][year_month] = outcome
+            results["total_rows"] += outcome["rows"]
+            results["total_bytes"] += outcome["bytes"]
+            warnings = f", ⚠ {outcome['warnings']} warnings" if outcome["warnings"] else ""
+            print(f"[{done}/{len(futures)}] ✓ {year_month}: {outcome['rows']:,} rows, "
+                  f"{outcome['bytes'] / (1024 * 1024):.1f} MB in {outcome['seconds']:.1f}s{warnings}")
+        else:
+            state.mark_many(month_dates, "load", FAILED, outcome)
+            results["failed"].append(year_month)
+            print(f"[{done}/{len(futures)}] ✗ {year_month}: {outcome}")
+wall_seconds = time.perf_counter() - wall_start
+state.close()
 
 # Final Summary
 print("\n" + "="*70)
@@ -146,17 +216,23 @@ print(f"✓ Successful months: {len(results['success'])}")
 print(f"✗ Failed months: {len(results['failed'])}")
 print(f"⚠ Empty months: {len(results['empty'])}")
 print(f"\nTotal rows loaded: {results['total_rows']:,}")
+print(f"Total bytes loaded: {results['total_bytes'] / (1024 ** 3):.2f} GB")
+print(f"Wall clock: {wall_seconds:.1f}s")
 
-if results["success"]:
-    print(f"\nSuccessful: {', '.join(results['success'])}")
+if results["stats"]:
+    print(f"\n{'Month':<10}{'Rows':>15}{'MB':>12}{'Seconds':>10}")
+    print("-" * 47)
+    for year_month in sorted(results["stats"]):
+        stats = results["stats"][year_month]
+        print(f"{year_month:<10}{stats['rows']:>15,}{stats['bytes'] / (1024 * 1024):>12.1f}{stats['seconds']:>10.1f}")
 
 if results["failed"]:
-    print(f"\nFailed: {', '.join(results['failed'])}")
-    print("  → Retry these months individually to see detailed errors")
+    print(f"\nFailed: {', '.join(sorted(results['failed']))}")
+    print("  → Re-run safely: each month overwrites only its own partition")
 
 if results["empty"]:
     print(f"\nEmpty (no files): {', '.join(results['empty'])}")
-    print("  → Run download script to fetch these months")
+    print("  → Run download script (and convert_to_parquet.py) to fetch these months")
 
 print("\n" + "="*70)
 print(f"Table: {table_ref}")
@@ -166,11 +242,10 @@ print("="*70)
 # Query to verify data by month
 print("\nVerify data loaded with this query:")
 print(f"""
-SELECT 
-  EXTRACT(YEAR FROM arrival_time) as year,
-  EXTRACT(MONTH FROM arrival_time) as month,
+SELECT
+  DATE_TRUNC({PARTITION_FIELD}, MONTH) as month,
   COUNT(*) as records
 FROM `{table_ref}`
-GROUP BY year, month
-ORDER BY year, month
+GROUP BY month
+ORDER BY month
 """)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Cold Start Benchmark for the Cloud Run Services
+Starts a service the same way the container does (gunicorn), measures the
+time from process launch to the first successful request, and prints a
+per-import startup breakdown from `python -X importtime`
+
+Usage:
+    python 8-benchmarks/cold_start_benchmark.py --service event-processor --runs 5
+    python 8-benchmarks/cold_start_benchmark.py --service task-queue --method POST
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+# ============================================
+# Configuration
+# ============================================
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES = {
+    # name -> (directory, wsgi module, module imported to load all clients)
+    "event-processor": ("2-event-processor", "app:app", "import app; app.get_gtfs(); app.get_publisher()"),
+    "task-queue": ("3-task-queue", "main:app", "import main; main.get_tasks()"),
+}
+STARTUP_TIMEOUT = 60  # seconds to wait for the first successful request
+TOP_IMPORTS = 15  # number of slowest top-level imports to show
+
+
+# ============================================
+# Import Time Breakdown
+# ============================================
+def import_breakdown(service):
+    """
+    Run the service's client loading under -X importtime and return the
+    top-level imports sorted by cumulative time.
+
+    Returns:
+        List of (package, cumulative_ms)
+    """
+    directory, _, load_snippet = SERVICES[service]
+    env = dict(os.environ, PREWARM_CLIENTS="false")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", load_snippet],
+        cwd=os.path.join(REPO_ROOT, directory),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    imports = []
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.startswith("  "):  # nested import, already counted by its parent
+            continue
+        imports.append((name.strip(), int(cumulative) / 1000))
+    if proc.returncode != 0:
+        print(f"⚠ Client loading failed, breakdown is partial:\n{proc.stderr.splitlines()[-1]}")
+    return sorted(imports, key=lambda item: item[1], reverse=True)
+
+
+# ============================================
+# Time To First Successful Request
+# ============================================
+def measure_cold_start(service, port, method, path):
+    """
+    Launch gunicorn with the Dockerfile's settings and poll until a request
+    succeeds.
+
+    Returns:
+        Tuple of (seconds to first success, startup timings from /startupz)
+    """
+    directory, wsgi_app, _ = SERVICES[service]
+    cmd = [
+        sys.executable, "-m", "gunicorn",
+        "--bind", f"127.0.0.1:{port}",
+        "--workers", "1", "--threads", "8", "--timeout", "0",
+        wsgi_app,
+    ]
+    url = f"http://127.0.0.1:{port}{path}"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd,
+        cwd=os.path.join(REPO_ROOT, directory),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < STARTUP_TIMEOUT:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+            try:
+                response = requests.request(method, url, timeout=STARTUP_TIMEOUT)
+                if response.ok:
+                    elapsed = time.perf_counter() - start
+                    timings = requests.get(f"http://127.0.0.1:{port}/startupz", timeout=5).json()
+                    return elapsed, timings
+            except requests.exceptions.ConnectionError:
+                pass  # server not listening yet
+            time.sleep(0.01)
+        raise TimeoutError(f"No successful {method} {path} within {STARTUP_TIMEOUT}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--service", choices=sorted(SERVICES), default="event-processor")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--method", default="GET", help="POST exercises the full request path (needs service env vars)")
+    parser.add_argument("--path", default="/")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Cold Start Benchmark: {args.service}")
+    print("=" * 60)
+
+    print("\nSlowest top-level imports (cumulative):")
+    print("-" * 60)
+    for name, ms in import_breakdown(args.service)[:TOP_IMPORTS]:
+        print(f"  {ms:9.1f} ms  {name}")
+
+    print(f"\nTime to first successful {args.method} {args.path} ({args.runs} runs):")
+    print("-" * 60)
+    samples = []
+    for run in range(1, args.runs + 1):
+        elapsed, timings = measure_cold_start(args.service, args.port, args.method, args.path)
+        samples.append(elapsed)
+        loaded = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in timings.items())
+        print(f"  run {run}: {elapsed * 1000:.0f} ms  ({loaded or 'clients not loaded yet'})")
+
+    print("\n" + "=" * 60)
+    print(f"min {min(samples) * 1000:.0f} ms | median {statistics.median(samples) * 1000:.0f} ms | max {max(samples) * 1000:.0f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+End-to-End Latency and Load Harness
+Runs the whole path locally, with stand-ins for the GCP pieces:
+
+    scheduler (this script) -> 3-task-queue (TASK_DISPATCH=local)
+        -> 2-event-processor -> fake GTFS-RT feed server (this script)
+        -> Pub/Sub emulator -> 1-dataflow on the DirectRunner (--output local sink)
+
+Both services run under gunicorn with their Dockerfile settings. Every fake
+feed response gets a sequence number, carried in its entity ids
+('<seq>-<index>'), so each message can be followed through every hop:
+
+    trigger -> fetch      task queue dispatch + processor request handling
+    fetch -> publish      processor fetch/parse/convert/publish (emulator publish_time)
+    publish -> sink       pipeline: parse, window trigger, enrich, write (last record of the message)
+    end to end            scheduled trigger -> last record written
+
+Load is stepped through --rates (processor triggers per second) with
+--entities vehicles per feed. A step is sustainable when at least 99% of its
+triggers reach the sink, end-to-end p95 stays under --slo-ms and latency does
+not keep growing through the step (a backlog building up). The highest
+sustainable rate is reported as the maximum sustainable throughput.
+
+As a regression gate the script exits 1 when a --baseline run (from --record)
+had a higher maximum sustainable rate, or an end-to-end p95 that was more
+than --tolerance lower at a rate both runs sustained, or when --max-p95-ms /
+--min-rate are not met.
+
+Triggers are matched to fetches in order within a step (the processor does
+not forward the trigger), so trigger -> fetch is exact only while fetches
+do not overtake each other; the other hops are matched by sequence number.
+
+Usage:
+    # starts the emulator with gcloud (needs the pubsub-emulator component)
+    python 8-benchmarks/e2e_harness.py --rates 1,2,4,8 --entities 300 --duration 60
+
+    # reuse a running emulator, gate against a previous run
+    python 8-benchmarks/e2e_harness.py --emulator-host localhost:8085 \
+        --baseline e2e_baseline.json --record e2e_latest.json
+"""
+
+import argparse
+import datetime
+import http.server
+import json
+import math
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from google.api_core import exceptions  # noqa: E402
+from google.cloud import pubsub_v1  # noqa: E402
+from google.transit import gtfs_realtime_pb2  # noqa: E402
+
+import stops_snapshot  # noqa: E402
+
+# ============================================
+# Configuration
+# ============================================
+PROJECT = "local"
+TOPIC = f"projects/{PROJECT}/topics/mta-gtfs-ace"
+PIPELINE_SUBSCRIPTION = f"projects/{PROJECT}/subscriptions/e2e-pipeline"
+TAP_SUBSCRIPTION = f"projects/{PROJECT}/subscriptions/e2e-tap"  # the harness's own view of publish times
+STOPS_SNAPSHOT = os.path.join(REPO_ROOT, "4-terraform/modules/storage/stops.snapshot")
+SERVICES = {
+    # name -> (directory, wsgi module)
+    "event-processor": ("2-event-processor", "app:app"),
+    "task-queue": ("3-task-queue", "main:app"),
+}
+STARTUP_TIMEOUT = 60  # seconds for the emulator and the services to accept connections
+WARMUP_TIMEOUT = 300  # the DirectRunner takes a while before the first record comes out
+DRAIN_TIMEOUT = 120  # seconds to wait after a step for its messages to reach the sink
+COMPLETE_RATIO = 0.99  # share of triggers that must reach the sink for a step to count
+GROWTH_LIMIT = 2.0  # end-to-end p50, last third of a step vs first third, before it counts as a backlog
+SINK_POLL_SECONDS = 0.2
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0-100) of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(host, port, proc, name):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"{name} exited with code {proc.returncode}")
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"{name} not listening on {host}:{port} within {STARTUP_TIMEOUT}s")
+
+
+# ============================================
+# Fake GTFS-RT Feed
+# ============================================
+class FakeFeed:
+    """
+    Stands in for the MTA endpoint: every GET returns a new FeedMessage of
+    `entities` vehicle positions at real platforms (so enrichment hits), with
+    the header timestamp set to now and the fetch time recorded per sequence.
+    """
+    def __init__(self, entities, port):
+        platforms = [stop_id for stop_id, _, _ in stops_snapshot.load_snapshot(STOPS_SNAPSHOT)["platforms"]]
+        today = datetime.date.today().strftime("%Y%m%d")
+        self.entities = entities
+        self.template = gtfs_realtime_pb2.FeedMessage()
+        self.template.header.gtfs_realtime_version = "2.0"
+        for index in range(entities):
+            vehicle = self.template.entity.add(id=str(index)).vehicle
+            vehicle.trip.trip_id = f"E2E_{index:05d}"
+            vehicle.trip.route_id = "ACE"[index % 3]
+            vehicle.trip.start_date = today
+            vehicle.stop_id = platforms[index % len(platforms)]
+            vehicle.current_status = gtfs_realtime_pb2.VehiclePosition.STOPPED_AT
+            vehicle.current_stop_sequence = index % 40
+        self.fetch_times = []  # index = sequence number
+        self._lock = threading.Lock()
+
+        feed = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = feed.next_body()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-protobuf")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{port}/nyct%2Fgtfs-ace"
+        threading.Thread(target=self.server.serve_forever, name="fake-feed", daemon=True).start()
+
+    def next_body(self):
+        with self._lock:
+            sequence = len(self.fetch_times)
+            self.fetch_times.append(time.time())
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.CopyFrom(self.template)
+        now = int(time.time())
+        feed.header.timestamp = now
+        for index, entity in enumerate(feed.entity):
+            entity.id = f"{sequence}-{index}"
+            entity.vehicle.timestamp = now
+        return feed.SerializeToString()
+
+
+# ============================================
+# Observing Pub/Sub and the Sink
+# ============================================
+ENTITY_SEQUENCE = re.compile(rb'"id": "(\d+)-\d+"')
+
+
+class PublishTap:
+    """Subscribes next to the pipeline and records each message's publish_time by sequence."""
+    def __init__(self):
+        self.publish_times = {}
+        self.subscriber = pubsub_v1.SubscriberClient()
+        self.future = self.subscriber.subscribe(TAP_SUBSCRIPTION, callback=self._on_message)
+
+    def _on_message(self, message):
+        match = ENTITY_SEQUENCE.search(message.data)
+        if match:
+            self.publish_times.setdefault(int(match.group(1)), message.publish_time.timestamp())
+        message.ack()
+
+    def stop(self):
+        self.future.cancel()
+        self.subscriber.close()
+
+
+class SinkTail:
+    """Follows the pipeline's JSONL output and tracks records written and last sink_time per sequence."""
+    def __init__(self, directory):
+        self.directory = directory
+        self.records = {}
+        self.last_sink = {}
+        self._offsets = {}
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, name="sink-tail", daemon=True).start()
+
+    def _run(self):
+        while not self._stop.wait(SINK_POLL_SECONDS):
+            if not os.path.isdir(self.directory):
+                continue
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                with open(path, "rb") as f:
+                    f.seek(self._offsets.get(path, 0))
+                    data = f.read()
+                complete = data[:data.rfind(b"\n") + 1]  # leave a partially written line for the next poll
+                self._offsets[path] = self._offsets.get(path, 0) + len(complete)
+                for line in complete.splitlines():
+                    record = json.loads(line)
+                    sequence = int(record["entity_id"].split("-", 1)[0])
+                    self.records[sequence] = self.records.get(sequence, 0) + 1
+                    self.last_sink[sequence] = max(self.last_sink.get(sequence, 0), record["sink_time"])
+
+    def complete(self, sequence, entities):
+        return self.records.get(sequence, 0) >= entities
+
+    def stop(self):
+        self._stop.set()
+
+
+# ============================================
+# Stand-in Processes
+# ============================================
+class Stack:
+    """Starts and stops the emulator, both services and the pipeline, logging each to <workdir>/<name>.log."""
+    def __init__(self, workdir, emulator_host, feed_url, pipeline_args):
+        self.workdir = workdir
+        self.procs = {}
+        self.emulator_host = emulator_host
+        self.feed_url = feed_url
+        self.pipeline_args = pipeline_args
+        self.sink_dir = os.path.join(workdir, "sink")
+        self.processor_port = free_port()
+        self.task_queue_port = free_port()
+
+    def _start(self, name, cmd, cwd, env):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        self.procs[name] = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        return self.procs[name]
+
+    def env(self, **extra):
+        return dict(os.environ, PUBSUB_EMULATOR_HOST=self.emulator_host, **extra)
+
+    def start_emulator(self):
+        host, port = self.emulator_host.rsplit(":", 1)
+        if self.procs.get("emulator") is None and not self._listening(host, int(port)):
+            proc = self._start("emulator", ["gcloud", "beta", "emulators", "pubsub", "start",
+                                            f"--project={PROJECT}", f"--host-port={self.emulator_host}"],
+                               REPO_ROOT, os.environ)
+            wait_for_port(host, int(port), proc, "Pub/Sub emulator")
+        os.environ["PUBSUB_EMULATOR_HOST"] = self.emulator_host  # for this process's clients
+        try:
+            pubsub_v1.PublisherClient().create_topic(request={"name": TOPIC})
+        except exceptions.AlreadyExists:
+            pass
+        subscriber = pubsub_v1.SubscriberClient()
+        for subscription in (PIPELINE_SUBSCRIPTION, TAP_SUBSCRIPTION):
+            # recreated so a previous run's backlog does not leak into this one
+            try:
+                subscriber.delete_subscription(request={"subscription": subscription})
+            except exceptions.NotFound:
+                pass
+            subscriber.create_subscription(request={"name": subscription, "topic": TOPIC})
+        subscriber.close()
+
+    @staticmethod
+    def _listening(host, port):
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def _gunicorn(self, service, port):
+        directory, wsgi_app = SERVICES[service]
+        return [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+                "--workers", "1", "--threads", "8", "--timeout", "0", wsgi_app], os.path.join(REPO_ROOT, directory)
+
+    def start_processor(self):
+        cmd, cwd = self._gunicorn("event-processor", self.processor_port)
+        proc = self._start("event-processor", cmd, cwd, self.env(
+            PROJECT_ID=PROJECT, PUBSUB_TOPIC_ID=TOPIC, NYC_SUBWAY_FEED_URL=self.feed_url,
+            REQUEST_LOG_SAMPLE_RATE="0"))
+        wait_for_port("127.0.0.1", self.processor_port, proc, "event-processor")
+
+    def start_task_queue(self, tasks_per_trigger, interval_seconds):
+        """(Re)start the task queue; the trigger spacing is fixed per process, so each rate gets its own."""
+        self.stop("task-queue")
+        cmd, cwd = self._gunicorn("task-queue", self.task_queue_port)
+        proc = self._start("task-queue", cmd, cwd, self.env(
+            TASK_DISPATCH="local", TASKS_PER_TRIGGER=str(tasks_per_trigger),
+            TASK_INTERVAL_SECONDS=str(interval_seconds),
+            EVENT_FEED_PROCESSOR_SERVICE_URL=f"http://127.0.0.1:{self.processor_port}/"))
+        wait_for_port("127.0.0.1", self.task_queue_port, proc, "task-queue")
+
+    def start_pipeline(self):
+        self._start("pipeline", [
+            sys.executable, "dataflow.py", "--runner=DirectRunner", f"--project={PROJECT}",
+            f"--temp_location={os.path.join(self.workdir, 'tmp')}",
+            f"--subscription={PIPELINE_SUBSCRIPTION}", f"--stops={STOPS_SNAPSHOT}",
+            f"--output={self.sink_dir}",
+        ] + self.pipeline_args, os.path.join(REPO_ROOT, "1-dataflow"), self.env())
+
+    def check(self):
+        for name, proc in self.procs.items():
+            if proc.poll() is not None:
+                raise RuntimeError(f"{name} exited with code {proc.returncode}, see {self.workdir}/{name}.log")
+
+    def stop(self, name):
+        proc = self.procs.pop(name, None)
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def stop_all(self):
+        for name in ["task-queue", "event-processor", "pipeline", "emulator"]:
+            self.stop(name)
+
+
+# ============================================
+# Load Steps
+# ============================================
+def trigger(stack, tasks_per_trigger, interval_seconds):
+    """
+    One Cloud Scheduler call to the task queue.
+
+    Returns:
+        List of the processor trigger times it schedules
+    """
+    called_at = time.time()
+    requests.post(f"http://127.0.0.1:{stack.task_queue_port}/", timeout=30).raise_for_status()
+    return [called_at + index * interval_seconds for index in range(tasks_per_trigger)]
+
+
+def drain(stack, feed, sink, first_sequence, last_trigger, timeout):
+    """Wait until the last trigger has fired and every fetch since first_sequence is in the sink."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        stack.check()
+        fetched = range(first_sequence, len(feed.fetch_times))
+        if time.time() > last_trigger + 1 and all(sink.complete(s, feed.entities) for s in fetched):
+            return True
+        time.sleep(SINK_POLL_SECONDS)
+    return False
+
+
+def run_step(stack, feed, tap, sink, rate, duration, tasks_per_trigger, slo_ms):
+    """
+    Drive the stack at `rate` processor triggers per second for `duration` seconds.
+
+    Returns:
+        Dict with delivery counts, per-hop latency samples (ms) and the verdict
+    """
+    interval = 1.0 / rate
+    stack.start_task_queue(tasks_per_trigger, interval)
+    first_sequence = len(feed.fetch_times)
+    triggers = []
+    start = time.time()
+    next_call = start
+    while next_call < start + duration:
+        time.sleep(max(0.0, next_call - time.time()))
+        triggers.extend(trigger(stack, tasks_per_trigger, interval))
+        next_call += tasks_per_trigger * interval
+    drained = drain(stack, feed, sink, first_sequence, max(triggers), DRAIN_TIMEOUT)
+
+    sequences = list(range(first_sequence, len(feed.fetch_times)))
+    fetch_times = feed.fetch_times[first_sequence:]
+    hops = {"trigger -> fetch": [], "fetch -> publish": [], "publish -> sink": [], "end to end": []}
+    end_to_end = []  # (trigger time, ms), for the growth check
+    for trigger_time, fetch_time, sequence in zip(sorted(triggers), fetch_times, sequences):
+        hops["trigger -> fetch"].append((fetch_time - trigger_time) * 1000)
+        published = tap.publish_times.get(sequence)
+        if published is not None:
+            hops["fetch -> publish"].append((published - fetch_time) * 1000)
+        if not sink.complete(sequence, feed.entities):
+            continue
+        if published is not None:
+            hops["publish -> sink"].append((sink.last_sink[sequence] - published) * 1000)
+        hops["end to end"].append((sink.last_sink[sequence] - trigger_time) * 1000)
+        end_to_end.append((trigger_time, hops["end to end"][-1]))
+
+    delivered = len(end_to_end)
+    third = len(end_to_end) // 3
+    growth = None
+    if third:
+        first = percentile([ms for _, ms in end_to_end[:third]], 50)
+        last = percentile([ms for _, ms in end_to_end[-third:]], 50)
+        growth = last / first if first > 0 else None
+    p95 = percentile(hops["end to end"], 95) if hops["end to end"] else None
+    reasons = []
+    if delivered < COMPLETE_RATIO * len(triggers):
+        reasons.append(f"{delivered}/{len(triggers)} delivered" + ("" if drained else ", drain timed out"))
+    if p95 is not None and p95 > slo_ms:
+        reasons.append(f"p95 {p95:.0f} ms > {slo_ms:.0f} ms")
+    if growth is not None and growth > GROWTH_LIMIT:
+        reasons.append(f"latency grew {growth:.1f}x")
+    span = (max(sink.last_sink[s] for s in sequences if sink.complete(s, feed.entities)) - start) if delivered else 0
+    return {
+        "rate": rate,
+        "triggers": len(triggers),
+        "fetched": len(sequences),
+        "published": sum(s in tap.publish_times for s in sequences),
+        "delivered": delivered,
+        "records_per_second": delivered * feed.entities / span if span else 0.0,
+        "hops": hops,
+        "sustainable": not reasons,
+        "reasons": reasons,
+    }
+
+
+# ============================================
+# Report and Regression Gate
+# ============================================
+def summarize(step):
+    return {hop: {f"p{q}": percentile(samples, q) for q in (50, 95, 99)} | {"max": max(samples)}
+            for hop, samples in step["hops"].items() if samples}
+
+
+def print_step(step):
+    verdict = "✓ sustainable" if step["sustainable"] else "✗ " + "; ".join(step["reasons"])
+    print(f"\n{step['rate']:g} triggers/s: {step['triggers']} triggers, {step['fetched']} fetched, "
+          f"{step['published']} published, {step['delivered']} delivered "
+          f"({step['records_per_second']:,.0f} records/s) - {verdict}")
+    print(f"  {'hop':<18}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+    for hop, stats in summarize(step).items():
+        print(f"  {hop:<18}" + "".join(f"{stats[key]:>10.0f}" for key in ("p50", "p95", "p99", "max")))
+
+
+def gate(result, baseline, tolerance, max_p95_ms, min_rate):
+    """
+    Returns:
+        List of regression messages (empty when the run passes)
+    """
+    failures = []
+    if min_rate is not None and (result["max_sustainable_rate"] or 0) < min_rate:
+        failures.append(f"max sustainable rate {result['max_sustainable_rate']} < {min_rate}")
+    if max_p95_ms is not None:
+        lowest = min(result["steps"], key=lambda step: step["rate"])
+        p95 = lowest["latency_ms"].get("end to end", {}).get("p95")
+        if p95 is None or p95 > max_p95_ms:
+            failures.append(f"end-to-end p95 at {lowest['rate']:g}/s is {p95} ms > {max_p95_ms} ms")
+    if baseline:
+        if (result["max_sustainable_rate"] or 0) < (baseline["max_sustainable_rate"] or 0):
+            failures.append(f"max sustainable rate {result['max_sustainable_rate']} "
+                            f"< baseline {baseline['max_sustainable_rate']}")
+        before = {step["rate"]: step for step in baseline["steps"] if step["sustainable"]}
+        for step in result["steps"]:
+            old = before.get(step["rate"])
+            if not old or not step["sustainable"]:
+                continue
+            p95, old_p95 = step["latency_ms"]["end to end"]["p95"], old["latency_ms"]["end to end"]["p95"]
+            if p95 > old_p95 * (1 + tolerance):
+                failures.append(f"end-to-end p95 at {step['rate']:g}/s is {p95:.0f} ms, "
+                                f"baseline {old_p95:.0f} ms (+{tolerance:.0%} allowed)")
+    return failures
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", default="1,2,4", help="comma-separated processor triggers per second, one step each")
+    parser.add_argument("--entities", type=int, default=300, help="vehicle positions per feed response")
+    parser.add_argument("--duration", type=float, default=60, help="seconds per step")
+    parser.add_argument("--tasks-per-trigger", type=int, default=3,
+                        help="processor triggers per scheduler call (production: 3, 20s apart)")
+    parser.add_argument("--slo-ms", type=float, default=15000, help="end-to-end p95 a sustainable step must stay under")
+    parser.add_argument("--emulator-host", default="localhost:8085",
+                        help="reused if something already listens there, otherwise started with gcloud")
+    parser.add_argument("--workdir", default=None, help="logs and sink files (default: a temp dir, removed afterwards)")
+    parser.add_argument("--pipeline-arg", action="append", default=[],
+                        help="extra flag for dataflow.py, e.g. --pipeline-arg=--direct_num_workers=4")
+    parser.add_argument("--record", default=None, help="write this run's results as JSON (a later --baseline)")
+    parser.add_argument("--baseline", default=None, help="results JSON of an earlier run to gate against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed end-to-end p95 increase over the baseline")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="fail if end-to-end p95 at the lowest rate exceeds this")
+    parser.add_argument("--min-rate", type=float, default=None, help="fail if the max sustainable rate is below this")
+    args = parser.parse_args()
+    rates = sorted(float(rate) for rate in args.rates.split(","))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="e2e-harness-")
+    os.makedirs(workdir, exist_ok=True)
+    feed = FakeFeed(args.entities, free_port())
+    stack = Stack(workdir, args.emulator_host, feed.url, args.pipeline_arg)
+
+    print("=" * 70)
+    print("End-to-End Latency and Load Harness")
+    print("=" * 70)
+    print(f"Rates: {', '.join(f'{rate:g}' for rate in rates)} triggers/s, {args.duration:g}s each, "
+          f"{args.entities} entities per feed")
+    print(f"Logs: {workdir}")
+
+    steps = []
+    try:
+        stack.start_emulator()
+        print(f"✓ Pub/Sub emulator at {args.emulator_host}, topic {TOPIC}")
+        stack.start_processor()
+        stack.start_pipeline()
+        tap = PublishTap()
+        sink = SinkTail(stack.sink_dir)
+        print("✓ event-processor, Pub/Sub tap and DirectRunner pipeline started")
+
+        # one scheduler call end to end, so client loading and pipeline startup are not measured
+        print("⬇ Warming up (first message through the pipeline)...")
+        stack.start_task_queue(1, 0)
+        first_sequence = len(feed.fetch_times)
+        warm_triggers = trigger(stack, 1, 0)
+        if not drain(stack, feed, sink, first_sequence, max(warm_triggers), WARMUP_TIMEOUT):
+            print(f"✗ Nothing reached the sink within {WARMUP_TIMEOUT}s, see {workdir}/*.log")
+            sys.exit(1)
+        print("✓ Warm")
+
+        for rate in rates:
+            print(f"\nStep {rate:g} triggers/s...")
+            step = run_step(stack, feed, tap, sink, rate, args.duration, args.tasks_per_trigger, args.slo_ms)
+            print_step(step)
+            steps.append(step)
+        tap.stop()
+        sink.stop()
+    finally:
+        stack.stop_all()
+        feed.server.shutdown()
+
+    sustainable = [step["rate"] for step in steps if step["sustainable"]]
+    best = max((step for step in steps if step["sustainable"]), key=lambda step: step["rate"], default=None)
+    result = {
+        "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "revision": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                   capture_output=True, text=True).stdout.strip(),
+        "entities": args.entities,
+        "duration": args.duration,
+        "max_sustainable_rate": max(sustainable) if sustainable else None,
+        "steps": [{key: step[key] for key in ("rate", "triggers", "delivered", "records_per_second",
+                                              "sustainable", "reasons")} | {"latency_ms": summarize(step)}
+                  for step in steps],
+    }
+
+    print("\n" + "=" * 70)
+    if best:
+        print(f"Max sustainable throughput: {best['rate']:g} triggers/s "
+              f"({best['records_per_second']:,.0f} records/s at {args.entities} entities per feed)")
+    else:
+        print("⚠ No step was sustainable")
+    if args.record:
+        with open(args.record, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.record}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("entities") != args.entities:
+            print(f"⚠ Baseline used {baseline.get('entities')} entities per feed, this run {args.entities}")
+    failures = gate(result, baseline, args.tolerance, args.max_p95_ms, args.min_rate)
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures and (baseline or args.max_p95_ms is not None or args.min_rate is not None):
+        print("✓ No regression")
+    print("=" * 70)
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
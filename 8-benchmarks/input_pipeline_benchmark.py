@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Training Input Pipeline Benchmark
+Measures samples/sec of the (batch, context_length, 8) training input for each reader:
+
+    query    one ordered BigQuery query through tensorflow-io, reshaped per batch
+    storage  parallel Storage Read API streams, packed with NumPy
+    cache    memory-mapped local shards (cache_training_data.py)
+
+The cache reader is timed for two epochs, the first of which includes page
+faults of cold shards.
+
+Usage:
+    python 8-benchmarks/input_pipeline_benchmark.py --readers cache,storage,query --batches 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import tensorflow as tf  # noqa: E402
+
+import cache_training_data  # noqa: E402
+import load_from_bigquery  # noqa: E402
+
+
+# ============================================
+# Throughput
+# ============================================
+def measure(dataset, batches):
+    """
+    Pull up to `batches` batches through the pipeline.
+
+    Returns:
+        Tuple of (samples, seconds to first batch, total seconds)
+    """
+    samples = 0
+    first = None
+    start = time.perf_counter()
+    for X, _ in dataset.take(batches):
+        if first is None:
+            first = time.perf_counter() - start
+        samples += int(X.shape[0])
+    return samples, first or 0.0, time.perf_counter() - start
+
+
+def build(reader, batch_size):
+    """Training split dataset for a reader."""
+    if reader == "cache":
+        directory = cache_training_data.materialize()
+        return cache_training_data.load_cached_dataset(directory, "train", batch_size, shuffle=True)
+    train_ds, _, _ = load_from_bigquery.load_datasets_from_bigquery(reader=reader, batch_size=batch_size)
+    return train_ds
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", default="cache,storage,query")
+    parser.add_argument("--batches", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Training Input Pipeline Benchmark")
+    print("=" * 60)
+    print(f"Batches per run: {args.batches} x {args.batch_size}\n")
+
+    results = []
+    for reader in args.readers.split(","):
+        dataset = build(reader, args.batch_size).prefetch(tf.data.AUTOTUNE)
+        runs = 2 if reader == "cache" else 1
+        for run in range(1, runs + 1):
+            samples, first, seconds = measure(dataset, args.batches)
+            label = f"{reader} (epoch {run})" if runs > 1 else reader
+            results.append((label, samples / seconds if seconds else 0.0))
+            print(f"  {label:<18} {samples:>8,} samples in {seconds:6.2f}s "
+                  f"({samples / seconds if seconds else 0:>10,.0f} samples/sec, first batch {first:.2f}s)")
+
+    print("\n" + "=" * 60)
+    baseline = dict(results).get("query")
+    for label, rate in results:
+        speedup = f"  {rate / baseline:6.1f}x vs query" if baseline else ""
+        print(f"{label:<18} {rate:>10,.0f} samples/sec{speedup}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
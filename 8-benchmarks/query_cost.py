@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Query Cost Benchmark for the 5-sql Queries
+Dry-runs each query (free, nothing executes) and reports the bytes BigQuery
+would scan, for the SQL as it is now and, optionally, as it was at an earlier
+git revision - so the before/after of a rewrite or a table layout change is a
+number rather than a guess. Results can be appended to a CSV to track them
+over time.
+
+Usage:
+    python 8-benchmarks/query_cost.py --project my-project
+    python 8-benchmarks/query_cost.py --project my-project --baseline HEAD~1 --record query_cost.csv
+"""
+
+import argparse
+import csv
+import datetime
+import os
+import re
+import subprocess
+
+from google.cloud import bigquery
+
+# ============================================
+# Configuration
+# ============================================
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_QUERIES = [
+    "5-sql/avg_time_between_trains.sql",
+    "5-sql/avg_idle_time_by_station.sql",
+]
+PROJECT_PLACEHOLDER = re.compile(r"<your-project-id>", re.IGNORECASE)
+
+
+def read_sql(path, revision=None):
+    """SQL text of a repo file, from the working tree or a git revision (None if absent there)."""
+    if revision is None:
+        with open(os.path.join(REPO_ROOT, path), "r") as f:
+            return f.read()
+    result = subprocess.run(
+        ["git", "show", f"{revision}:{path}"], cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    return result.stdout if result.returncode == 0 else None
+
+
+def bytes_scanned(client, sql, project):
+    """
+    Bytes a query would process, from a dry run.
+
+    Returns:
+        Tuple of (bytes or None, error message or None)
+    """
+    sql = PROJECT_PLACEHOLDER.sub(project, sql)
+    try:
+        job = client.query(sql, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+        return job.total_bytes_processed or 0, None
+    except Exception as e:
+        return None, str(e).splitlines()[0]
+
+
+def format_mb(value):
+    return "-" if value is None else f"{value / (1024 * 1024):,.1f} MB"
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", required=True, help="replaces <your-project-id> in the SQL")
+    parser.add_argument("--baseline", default=None, help="git revision to compare against, e.g. HEAD~1")
+    parser.add_argument("--record", default=None, help="append results to this CSV")
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES, help="SQL files relative to the repo root")
+    args = parser.parse_args()
+
+    client = bigquery.Client(project=args.project)
+
+    print("=" * 70)
+    print("Query Cost (dry run bytes scanned)")
+    print("=" * 70)
+    print(f"Project: {args.project}" + (f", baseline: {args.baseline}" if args.baseline else ""))
+    print("=" * 70 + "\n")
+
+    rows = []
+    for path in args.queries:
+        current, error = bytes_scanned(client, read_sql(path), args.project)
+        baseline = None
+        if args.baseline:
+            baseline_sql = read_sql(path, args.baseline)
+            if baseline_sql is not None:
+                baseline, _ = bytes_scanned(client, baseline_sql, args.project)
+
+        line = f"  {os.path.basename(path):<36} {format_mb(current):>14}"
+        if args.baseline:
+            line += f"   baseline {format_mb(baseline):>14}"
+            if baseline and current is not None:
+                line += f"   {100 * (1 - current / baseline):5.1f}% less"
+        print(line if error is None else f"  ✗ {os.path.basename(path)}: {error}")
+        rows.append((path, current, baseline))
+
+    if args.record:
+        new_file = not os.path.exists(args.record)
+        timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                  capture_output=True, text=True).stdout.strip()
+        with open(args.record, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["recorded_at", "revision", "query", "bytes", "baseline", "baseline_bytes"])
+            for path, current, baseline in rows:
+                writer.writerow([timestamp, revision, path, current, args.baseline or "", baseline])
+        print(f"\nResults appended to {args.record}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
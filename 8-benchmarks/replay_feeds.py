@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Accelerated Replay of Archived GTFS-RT Feeds
+Reads archived feed payloads from local files or a GCS prefix and publishes
+them to Pub/Sub (or the local emulator) in original feed order, compressed in
+time by a speed-up factor. Messages use the same JSON layout and attributes
+as the event processor, so ParseAndFlatten consumes them unchanged.
+
+Supported inputs:
+    *.pb / *.bin         raw GTFS-RT protobuf (converted like the event processor)
+    *.json               one published message
+    *.jsonl[.gz]         one published message per line (raw archive files)
+
+Usage:
+    # against the emulator (gcloud beta emulators pubsub start)
+    PUBSUB_EMULATOR_HOST=localhost:8085 python 8-benchmarks/replay_feeds.py \
+        --source ./archive --topic projects/local/topics/mta-gtfs-ace --speedup 100
+
+    # against GCP, measuring how far the pipeline trails the replay
+    python 8-benchmarks/replay_feeds.py --source gs://my-project-raw-archive/dt=2025-10-31/ \
+        --topic projects/my-project/topics/mta-gtfs-ace --speedup 10 \
+        --bq-table my-project.mta_updates.realtime_updates
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+
+from google.cloud import pubsub_v1
+
+# ============================================
+# Configuration
+# ============================================
+LAG_POLL_SECONDS = 10  # how often downstream lag is sampled from BigQuery
+DRAIN_TIMEOUT_SECONDS = 600  # how long to wait for the pipeline to catch up after the last publish
+LATE_THRESHOLD_SECONDS = 0.05  # publishes further behind schedule than this count as late
+
+
+# ============================================
+# Loading Archived Payloads
+# ============================================
+def _iter_files(source):
+    """Yield (name, bytes) for every file under a local path/glob or gs:// prefix."""
+    if source.startswith("gs://"):
+        from google.cloud import storage
+        bucket_name, _, prefix = source[len("gs://"):].partition("/")
+        bucket = storage.Client().bucket(bucket_name)
+        for blob in bucket.list_blobs(prefix=prefix):
+            if not blob.name.endswith("/"):
+                yield blob.name, blob.download_as_bytes()
+        return
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "**", "*"), recursive=True))
+    else:
+        paths = sorted(glob.glob(source))
+    for path in paths:
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                yield path, f.read()
+
+
+def _from_protobuf(data):
+    """Convert a raw GTFS-RT payload exactly like the event processor does."""
+    from google.protobuf.json_format import MessageToJson
+    from google.transit import gtfs_realtime_pb2
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(data)
+    message = json.loads(MessageToJson(feed, preserving_proto_field_name=True))
+    message["event_timestamp_unix"] = int(feed.header.timestamp)
+    return message
+
+
+def load_messages(source):
+    """
+    Read every archived payload and return them sorted by feed timestamp.
+
+    Returns:
+        List of (feed_timestamp, feed_name, message_dict)
+    """
+    messages = []
+    for name, data in _iter_files(source):
+        if name.endswith(".gz"):
+            data = gzip.decompress(data)
+            name = name[:-3]
+        if name.endswith((".pb", ".bin")):
+            decoded = [_from_protobuf(data)]
+        elif name.endswith(".jsonl"):
+            decoded = [json.loads(line) for line in data.splitlines() if line.strip()]
+        elif name.endswith(".json"):
+            decoded = [json.loads(data)]
+        else:
+            continue
+        # archive paths look like .../feed=gtfs-ace/...; fall back to the file's directory
+        parts = [p for p in name.replace("\\", "/").split("/") if p.startswith("feed=")]
+        feed_name = parts[-1][len("feed="):] if parts else os.path.basename(os.path.dirname(name)) or "replay"
+        for message in decoded:
+            timestamp = message.get("event_timestamp_unix") or message.get("header", {}).get("timestamp")
+            if timestamp is None:
+                continue
+            messages.append((int(timestamp), feed_name, message))
+    messages.sort(key=lambda item: item[0])
+    return messages
+
+
+def has_vehicle_rows(message):
+    """Whether the pipeline writes any row for this message (FilterCurrentStatus keeps vehicles with a status)."""
+    return any(entity.get("vehicle", {}).get("current_status") for entity in message.get("entity", []))
+
+
+# ============================================
+# Downstream Lag (BigQuery)
+# ============================================
+class LagMonitor(threading.Thread):
+    """
+    Polls BigQuery for the newest replayed message that reached the table and
+    records how long ago it was published.
+    """
+
+    def __init__(self, table, run_id, publish_times):
+        super().__init__(daemon=True)
+        from google.cloud import bigquery
+        self.client = bigquery.Client()
+        self.query = f"""
+        SELECT MAX(CAST(SPLIT(unique_event_id, '-')[OFFSET(2)] AS INT64)) AS newest
+        FROM `{table}`
+        WHERE STARTS_WITH(unique_event_id, 'replay-{run_id}-')
+        """
+        self.publish_times = publish_times  # message index -> wall clock publish time
+        self.samples = []  # (seconds since start, lag seconds)
+        self.newest = -1
+        self.stop_event = threading.Event()
+
+    def run(self):
+        start = time.time()
+        while not self.stop_event.wait(LAG_POLL_SECONDS):
+            try:
+                rows = list(self.client.query(self.query).result())
+            except Exception as e:
+                print(f"  ⚠ lag query failed: {e}")
+                continue
+            newest = rows[0].newest if rows and rows[0].newest is not None else -1
+            if newest in self.publish_times:
+                self.newest = newest
+                lag = time.time() - self.publish_times[newest]
+                self.samples.append((time.time() - start, lag))
+                print(f"  ↳ downstream: message #{newest} visible in BigQuery, lag {lag:.1f}s")
+
+
+# ============================================
+# Replay
+# ============================================
+def replay(messages, topic, speedup, run_id, publish_times):
+    """
+    Publish messages on the original timeline divided by `speedup`.
+
+    Returns:
+        Dict of publish statistics
+    """
+    publisher = pubsub_v1.PublisherClient(
+        batch_settings=pubsub_v1.types.BatchSettings(max_messages=100, max_latency=0.01)
+    )
+    sequences = {}
+    futures = []
+    behind = []  # seconds each late publish call ran behind its schedule
+    total_bytes = 0
+    first_timestamp = messages[0][0]
+    start = time.time()
+
+    for index, (timestamp, feed_name, message) in enumerate(messages):
+        due = start + (timestamp - first_timestamp) / speedup
+        delay = due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        elif -delay > LATE_THRESHOLD_SECONDS:
+            # messages due at the same moment (one multi-feed batch) publish back to back, not late
+            behind.append(-delay)
+
+        message = dict(message, unique_event_id=f"replay-{run_id}-{index}")
+        data = json.dumps(message).encode("utf-8")
+        sequences[feed_name] = sequences.get(feed_name, 0) + 1
+        futures.append(publisher.publish(
+            topic,
+            data=data,
+            feed=feed_name,
+            stream=feed_name,
+            sequence=str(sequences[feed_name]),
+            sequence_epoch=f"replay-{run_id}",
+        ))
+        publish_times[index] = time.time()
+        total_bytes += len(data)
+
+        if (index + 1) % 500 == 0:
+            elapsed = time.time() - start
+            print(f"  published {index + 1}/{len(messages)} ({(index + 1) / elapsed:.1f} msg/s)")
+
+    errors = 0
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            errors += 1
+    elapsed = time.time() - start
+    return {
+        "published": len(futures) - errors,
+        "errors": errors,
+        "seconds": elapsed,
+        "bytes": total_bytes,
+        "behind": behind,
+        "feed_seconds": messages[-1][0] - first_timestamp,
+    }
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="local directory/glob or gs://bucket/prefix")
+    parser.add_argument("--topic", required=True, help="full topic path: projects/PROJECT/topics/TOPIC")
+    parser.add_argument("--speedup", type=float, default=1.0, help="1 = real time, 10 = ten times faster, ...")
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N messages")
+    parser.add_argument("--bq-table", default=None, help="PROJECT.DATASET.TABLE to measure downstream lag")
+    args = parser.parse_args()
+    if args.speedup <= 0:
+        parser.error("--speedup must be greater than 0")
+
+    run_id = uuid.uuid4().hex[:12]
+    print("=" * 60)
+    print("Replaying Archived GTFS-RT Feeds")
+    print("=" * 60)
+    print(f"Source: {args.source}")
+    print(f"Topic: {args.topic}")
+    print(f"Speed-up: {args.speedup:g}x")
+    print(f"Run id: {run_id} (unique_event_id = replay-{run_id}-<n>)")
+    if os.environ.get("PUBSUB_EMULATOR_HOST"):
+        print(f"Pub/Sub emulator: {os.environ['PUBSUB_EMULATOR_HOST']}")
+    print("=" * 60 + "\n")
+
+    messages = load_messages(args.source)[:args.limit]
+    if not messages:
+        print("No archived messages found")
+        return
+    print(f"Loaded {len(messages)} messages spanning {messages[-1][0] - messages[0][0]}s of feed time\n")
+    # messages without vehicle rows never reach the table, so the drain waits for the last one that does
+    last_visible = max((index for index, (_, _, message) in enumerate(messages) if has_vehicle_rows(message)), default=-1)
+
+    publish_times = {}
+    monitor = None
+    if args.bq_table:
+        monitor = LagMonitor(args.bq_table, run_id, publish_times)
+        monitor.start()
+
+    stats = replay(messages, args.topic, args.speedup, run_id, publish_times)
+
+    if monitor:
+        print("\nWaiting for the pipeline to catch up...")
+        deadline = time.time() + DRAIN_TIMEOUT_SECONDS
+        while monitor.newest < last_visible and time.time() < deadline:
+            time.sleep(LAG_POLL_SECONDS)
+        monitor.stop_event.set()
+
+    target_rate = len(messages) / (stats["feed_seconds"] / args.speedup) if stats["feed_seconds"] else float("inf")
+    print("\n" + "=" * 60)
+    print("Replay Summary")
+    print("=" * 60)
+    print(f"✓ Published: {stats['published']} messages ({stats['bytes'] / (1024 * 1024):.1f} MB)")
+    print(f"✗ Publish errors: {stats['errors']}")
+    print(f"Achieved rate: {stats['published'] / stats['seconds']:.1f} msg/s, "
+          f"{stats['bytes'] / (1024 * 1024) / stats['seconds']:.2f} MB/s (target {target_rate:.1f} msg/s)")
+    if stats["behind"]:
+        print(f"⚠ {len(stats['behind'])} publishes ran more than {LATE_THRESHOLD_SECONDS * 1000:.0f} ms late (max {max(stats['behind']):.2f}s) "
+              "- the publisher could not hold this speed-up")
+    if monitor and monitor.samples:
+        lags = [lag for _, lag in monitor.samples]
+        print(f"Downstream lag: median {statistics.median(lags):.1f}s, max {max(lags):.1f}s")
+        if monitor.newest < last_visible:
+            print(f"⚠ Pipeline had not caught up after {DRAIN_TIMEOUT_SECONDS}s "
+                  f"(newest visible #{monitor.newest}, last with vehicle rows #{last_visible})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
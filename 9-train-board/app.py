@@ -0,0 +1,346 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import datetime
+from flask import Flask, request
+
+app = Flask(__name__)
+logging.basicConfig(level=logging.INFO)
+
+#----Configuration
+PROJECT_ID = os.environ.get('PROJECT_ID')
+PUBSUB_TOPIC_ID = os.environ.get('PUBSUB_TOPIC_ID')  # full path: projects/PROJECT_ID/topics/TOPIC_NAME
+# the board needs its own subscription so it sees every message Dataflow sees; created on start if missing
+BOARD_SUBSCRIPTION_ID = os.environ.get('BOARD_SUBSCRIPTION_ID', 'mta-train-board-sub')
+# stops snapshot compiled by stops_snapshot.py (stops.csv also works), local path or gs://bucket/object
+STOPS_PATH = os.environ.get('STOPS_PATH', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '4-terraform', 'modules', 'storage', 'stops.snapshot'))
+# trips without an update for this long (feed time, so accelerated replays expire correctly) are dropped
+STALE_SECONDS = int(os.environ.get('STALE_SECONDS', '900'))
+MAX_MESSAGES_IN_FLIGHT = int(os.environ.get('MAX_MESSAGES_IN_FLIGHT', '10'))
+# gtfs_records.py (next to dataflow.py) holds the pipeline's flatten_gtfs / enrich_with_stops / parse_stops
+# without any Beam imports; it is imported from that directory
+DATAFLOW_DIR = os.environ.get('DATAFLOW_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '1-dataflow'))
+#----------
+
+sys.path.insert(0, DATAFLOW_DIR)
+from gtfs_records import flatten_gtfs, enrich_with_stops, parse_stops  # noqa: E402
+
+
+def parent_stop(stop_id):
+    # 'A32S' -> 'A32'; platform ids carry the direction as a trailing N/S
+    return stop_id[:-1] if stop_id and stop_id[-1] in 'NS' else stop_id
+
+
+def direction_of(stop_id):
+    if stop_id and stop_id[-1] in 'NS':
+        return 'Southbound' if stop_id[-1] == 'S' else 'Northbound'
+    return None
+
+
+def epoch(timestamp):
+    # 'YYYY-MM-DD HH:MM:SS' (UTC, as written by flatten_gtfs) -> unix seconds
+    if not timestamp:
+        return None
+    return datetime.datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def load_stops_map(path):
+    """
+    stop_id -> {stop_name, stop_lat, stop_lon, station_id, direction}, decoded by the
+    pipeline's own parse_stops so the board enriches exactly like Dataflow
+    """
+    if path.startswith('gs://'):
+        from google.cloud import storage
+        bucket, _, name = path[len('gs://'):].partition('/')
+        data = storage.Client(project=PROJECT_ID).bucket(bucket).blob(name).download_as_bytes()
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+    return parse_stops(data)
+
+
+def predicted_arrivals(message):
+    """
+    (trip_id, stop_id) -> predicted arrival (unix seconds) from trip_update entities;
+    flatten_gtfs keeps the stop list but not the times
+    """
+    predictions = {}
+    for entity in message.get('entity', []):
+        update = entity.get('trip_update')
+        if not update:
+            continue
+        trip_id = update.get('trip', {}).get('trip_id')
+        for stop_time in update.get('stop_time_update', []) or []:
+            event = stop_time.get('arrival') or stop_time.get('departure') or {}
+            if event.get('time'):
+                predictions[(trip_id, stop_time.get('stop_id'))] = int(event['time'])
+    return predictions
+
+
+#----In-memory board
+class TrainBoard:
+    """
+    Latest vehicle state per trip, indexed by parent stop, route and direction.
+
+    Every message is flattened and enriched exactly like the pipeline does;
+    an update only replaces a trip's state if it is newer, so redelivered or
+    out-of-order messages (the subscription is unordered) are harmless.
+    """
+
+    def __init__(self, stops_map):
+        self.stops_map = stops_map
+        self.lock = threading.Lock()
+        self.trips = {}  # trip_id -> vehicle state
+        self.upcoming = {}  # trip_id -> {'feed_time', 'stops': [(stop_id, predicted unix seconds or None)]}
+        self.by_stop = {}  # parent stop_id -> trip_ids currently at / approaching it
+        self.by_route = {}  # route_id -> trip_ids
+        self.by_direction = {}  # direction -> trip_ids
+        self.arrivals_by_stop = {}  # parent stop_id -> trip_ids with the stop still ahead
+        self.newest_feed_time = 0
+        self.messages = 0
+        self.last_message_at = None
+
+    def _index(self, index, key, trip_id, add):
+        if key is None:
+            return
+        if add:
+            index.setdefault(key, set()).add(trip_id)
+        else:
+            members = index.get(key)
+            if members:
+                members.discard(trip_id)
+                if not members:
+                    del index[key]
+
+    def _set_vehicle(self, trip_id, state):
+        old = self.trips.get(trip_id)
+        if old:
+            self._index(self.by_stop, parent_stop(old['stop_id']), trip_id, False)
+            self._index(self.by_route, old['route_id'], trip_id, False)
+            self._index(self.by_direction, old['direction'], trip_id, False)
+        if state is None:
+            self.trips.pop(trip_id, None)
+            return
+        self.trips[trip_id] = state
+        self._index(self.by_stop, parent_stop(state['stop_id']), trip_id, True)
+        self._index(self.by_route, state['route_id'], trip_id, True)
+        self._index(self.by_direction, state['direction'], trip_id, True)
+
+    def _set_upcoming(self, trip_id, upcoming):
+        old = self.upcoming.get(trip_id)
+        if old:
+            for stop_id, _ in old['stops']:
+                self._index(self.arrivals_by_stop, parent_stop(stop_id), trip_id, False)
+        if upcoming is None:
+            self.upcoming.pop(trip_id, None)
+            return
+        self.upcoming[trip_id] = upcoming
+        for stop_id, _ in upcoming['stops']:
+            self._index(self.arrivals_by_stop, parent_stop(stop_id), trip_id, True)
+
+    def apply(self, message):
+        """
+        Fold one feed message (the JSON the event processor publishes) into the board.
+
+        Returns:
+            Number of vehicle states updated
+        """
+        predictions = predicted_arrivals(message)
+        vehicles, trip_stops = [], {}
+        # flattened one entity at a time, so the entity type (not a nullable field such as
+        # current_status, optional in GTFS-RT) decides vehicle position vs upcoming stops
+        for entity in message.get('entity', []):
+            rows = flatten_gtfs(dict(message, entity=[entity]))
+            if 'trip_update' in entity:
+                for row in rows:
+                    if row.get('trip_id') and row.get('stop_id'):
+                        trip_stops.setdefault(row['trip_id'], []).append(row['stop_id'])
+            elif 'vehicle' in entity:
+                vehicles.extend(enrich_with_stops(row, self.stops_map) for row in rows)
+        feed_time = epoch(vehicles[0]['feed_header_timestamp'] if vehicles else None) \
+            or message.get('event_timestamp_unix') or 0
+
+        updated = 0
+        with self.lock:
+            for record in vehicles:
+                trip_id = record['trip_id']
+                seen_at = epoch(record['vehicle_timestamp']) or epoch(record['feed_header_timestamp']) or 0
+                current = self.trips.get(trip_id)
+                if current and current['seen_at'] >= seen_at:
+                    continue
+                self._set_vehicle(trip_id, dict(record, seen_at=seen_at))
+                updated += 1
+            for trip_id, stop_ids in trip_stops.items():
+                current = self.upcoming.get(trip_id)
+                if current and current['feed_time'] >= feed_time:
+                    continue
+                self._set_upcoming(trip_id, {
+                    'feed_time': feed_time,
+                    'stops': [(stop_id, predictions.get((trip_id, stop_id))) for stop_id in stop_ids],
+                })
+
+            self.messages += 1
+            self.last_message_at = time.time()
+            if feed_time > self.newest_feed_time:
+                self.newest_feed_time = feed_time
+                self._expire()
+        return updated
+
+    def _expire(self):
+        cutoff = self.newest_feed_time - STALE_SECONDS
+        for trip_id in [t for t, state in self.trips.items() if state['seen_at'] < cutoff]:
+            self._set_vehicle(trip_id, None)
+        for trip_id in [t for t, upcoming in self.upcoming.items() if upcoming['feed_time'] < cutoff]:
+            self._set_upcoming(trip_id, None)
+
+    #----Lookups (dict/set work only, no I/O)
+    def trains(self, route_id=None, direction=None, stop_id=None):
+        with self.lock:
+            selected = None
+            for index, key in ((self.by_route, route_id), (self.by_direction, direction),
+                               (self.by_stop, parent_stop(stop_id) if stop_id else None)):
+                if key is not None:
+                    members = index.get(key, set())
+                    selected = members if selected is None else selected & members
+            trip_ids = self.trips.keys() if selected is None else selected
+            states = [self.trips[trip_id] for trip_id in trip_ids]
+        if stop_id and direction_of(stop_id):
+            states = [state for state in states if state['direction'] == direction_of(stop_id)]
+        return sorted(states, key=lambda state: (state['route_id'] or '', state['trip_id'] or ''))
+
+    def arrivals(self, stop_id, direction=None, limit=10):
+        """Trips with stop_id still ahead, soonest first (by predicted time, else stops away)."""
+        parent = parent_stop(stop_id)
+        direction = direction_of(stop_id) or direction
+        rows = []
+        with self.lock:
+            for trip_id in self.arrivals_by_stop.get(parent, ()):
+                stops = self.upcoming[trip_id]['stops']
+                for stops_away, (platform, predicted) in enumerate(stops):
+                    if parent_stop(platform) != parent:
+                        continue
+                    if direction and direction_of(platform) and direction_of(platform) != direction:
+                        continue
+                    vehicle = self.trips.get(trip_id, {})
+                    rows.append({
+                        'trip_id': trip_id,
+                        'route_id': vehicle.get('route_id'),
+                        'stop_id': platform,
+                        'direction': direction_of(platform),
+                        'stops_away': stops_away,
+                        'predicted_arrival': datetime.datetime.fromtimestamp(
+                            predicted, tz=datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if predicted else None,
+                        'predicted_unix': predicted,
+                        'current_stop_id': vehicle.get('stop_id'),
+                        'current_status': vehicle.get('current_status'),
+                    })
+                    break
+        rows.sort(key=lambda row: (row['predicted_unix'] is None, row['predicted_unix'] or 0, row['stops_away']))
+        return rows[:limit]
+
+    def status(self):
+        with self.lock:
+            return {
+                'trips': len(self.trips),
+                'trips_with_upcoming_stops': len(self.upcoming),
+                'stops_indexed': len(self.by_stop),
+                'messages': self.messages,
+                'seconds_since_last_message': round(time.time() - self.last_message_at, 1) if self.last_message_at else None,
+                'newest_feed_time': datetime.datetime.fromtimestamp(
+                    self.newest_feed_time, tz=datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if self.newest_feed_time else None,
+            }
+    #----------
+#----------
+
+board = TrainBoard(load_stops_map(STOPS_PATH))
+
+
+#----Subscriber
+def on_message(message):
+    try:
+        board.apply(json.loads(message.data.decode('utf-8')))
+    except Exception:
+        # a payload that can't be parsed won't parse on redelivery either
+        logging.exception("Skipping unreadable message %s", message.message_id)
+    message.ack()
+
+
+def start_subscriber():
+    """
+    Stream messages from BOARD_SUBSCRIPTION_ID on a background thread (creating the
+    subscription if needed). Honours PUBSUB_EMULATOR_HOST for local runs.
+    """
+    from google.api_core import exceptions
+    from google.cloud import pubsub_v1
+
+    if os.environ.get('PUBSUB_EMULATOR_HOST'):
+        # the emulator starts empty; in GCP terraform owns the topic
+        try:
+            pubsub_v1.PublisherClient().create_topic(request={'name': PUBSUB_TOPIC_ID})
+        except exceptions.AlreadyExists:
+            pass
+
+    subscriber = pubsub_v1.SubscriberClient()
+    subscription_path = subscriber.subscription_path(PROJECT_ID, BOARD_SUBSCRIPTION_ID)
+    try:
+        subscriber.create_subscription(request={'name': subscription_path, 'topic': PUBSUB_TOPIC_ID})
+        logging.info(f"Created subscription {subscription_path} on {PUBSUB_TOPIC_ID}")
+    except exceptions.AlreadyExists:
+        pass
+    future = subscriber.subscribe(
+        subscription_path, callback=on_message,
+        flow_control=pubsub_v1.types.FlowControl(max_messages=MAX_MESSAGES_IN_FLIGHT))
+    logging.info(f"Listening on {subscription_path}")
+    return future
+
+
+if PROJECT_ID and PUBSUB_TOPIC_ID:
+    _subscription = start_subscriber()
+else:
+    logging.warning("PROJECT_ID / PUBSUB_TOPIC_ID not set - board will stay empty")
+#----------
+
+
+@app.route('/trains', methods=['GET'])
+def trains():
+    # --- WHERE IS EVERY TRAIN: ?route=E&direction=Southbound&stop_id=A32 (all optional) ---
+    states = board.trains(request.args.get('route'), request.args.get('direction'), request.args.get('stop_id'))
+    return {'count': len(states), 'trains': states}, 200
+
+
+@app.route('/trains/<trip_id>', methods=['GET'])
+def train(trip_id):
+    with board.lock:
+        state = board.trips.get(trip_id)
+        upcoming = board.upcoming.get(trip_id)
+    if not state and not upcoming:
+        return {'error': f"unknown trip {trip_id}"}, 404
+    return {'train': state, 'upcoming_stops': [stop_id for stop_id, _ in upcoming['stops']] if upcoming else []}, 200
+
+
+@app.route('/stops/<stop_id>/arrivals', methods=['GET'])
+def arrivals(stop_id):
+    # --- NEXT ARRIVALS: A32 for both directions, A32S / ?direction=Southbound for one ---
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return {'error': "limit must be a positive integer"}, 400
+    info = board.stops_map.get(stop_id) or board.stops_map.get(parent_stop(stop_id)) or {}
+    rows = board.arrivals(stop_id, request.args.get('direction'), limit)
+    return {'stop_id': stop_id, 'stop_name': info.get('stop_name'), 'arrivals': rows}, 200
+
+
+@app.route('/', methods=['GET'])
+def health_check():
+    return board.status(), 200
+
+
+if __name__ == '__main__':
+    # local development only - containers serve through gunicorn (see Dockerfile)
+    app.run(debug=False, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
@@ -38,7 +38,24 @@ else
   exit 1
 fi
 
+# Build and push train-board image (built from the repo root: it reuses 1-dataflow/gtfs_records.py)
+echo "Building train-board image..."
+if docker build -t "$REPO/train-board" -f ./9-train-board/Dockerfile .; then
+  echo "Successfully built $REPO/train-board"
+  echo "Pushing $REPO/train-board to registry..."
+  if docker push "$REPO/train-board"; then
+    echo "Successfully pushed $REPO/train-board"
+  else
+    echo "Failed to push $REPO/train-board" >&2
+    exit 1
+  fi
+else
+  echo "Failed to build $REPO/train-board" >&2
+  exit 1
+fi
+
 echo ""
 echo "All images built and pushed successfully:"
 echo "- $REPO/mta-processor"
-echo "- $REPO/event-task-enqueuer"
\ No newline at end of file
+echo "- $REPO/event-task-enqueuer"
+echo "- $REPO/train-board"
\ No newline at end of file
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Build training samples incrementally, one trip_date partition at a time.
+Incremental replacement for 5-sql/create_training_samples.sql: the context
+window is a window function over each trip's stops instead of a range
+self-join, and each day is MERGEd into the date-partitioned samples table, so
+adding yesterday costs a scan of yesterday (plus the day before, for trips
+that started before midnight) instead of the full history. Re-running a day
+replaces its samples for that target stop.
+
+Usage:
+    python build_training_samples.py                                  # yesterday (NYC)
+    python build_training_samples.py --start 2025-10-01 --end 2025-10-31
+    python build_training_samples.py --backfill                       # every prepared day not built yet
+    python build_training_samples.py --target-stop "Jay St-MetroTech" --context-length 8 \\
+        --table e_train_samples_jay_8
+"""
+
+import argparse
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from google.cloud import bigquery
+
+# Configuration
+PROJECT_ID = "streaming-systems-245"
+DATASET_ID = "mta_historical"
+PREPARED_TABLE = "e_train_prepared"  # partitioned by trip_date (create_ml_dataset_5stops_tables.sql)
+SAMPLES_TABLE = "e_train_training_samples"
+TARGET_STOP = "Lexington Av/53 St"
+CONTEXT_LENGTH = 5  # stored as the table's context_length label, which the training readers shape by
+CLUSTERING_FIELDS = ["target_stop_name", "trip_uid"]
+
+# Previous CONTEXT_LENGTH stops of every stop, then keep the target stop's rows for @day.
+# The frame is a RANGE over stop_sequence values (target_sequence - N .. target_sequence - 1),
+# the same stops create_training_samples.sql joins, so a sequence gap leaves the context
+# short and the sample is dropped by the length filter in both builds. The result is
+# re-sorted since analytic ARRAY_AGG does not guarantee element order.
+SAMPLES_SQL = """
+WITH Windowed AS (
+  SELECT
+    trip_uid,
+    start_time_dts,
+    stop_name,
+    stop_sequence,
+    arrival_time,
+    minutes_since_prev_stop,
+    hour_of_day,
+    day_of_week,
+    trip_date,
+    is_rush_hour,
+    is_weekend,
+    ARRAY_AGG(
+      STRUCT(
+        stop_sequence,
+        stop_name,
+        stop_lat,
+        stop_lon,
+        arrival_time,
+        minutes_since_prev_stop,
+        hour_of_day,
+        day_of_week,
+        is_rush_hour,
+        is_weekend
+      )
+    ) OVER (
+      PARTITION BY trip_uid
+      ORDER BY stop_sequence
+      RANGE BETWEEN {context_length} PRECEDING AND 1 PRECEDING
+    ) AS context_stops
+  FROM `{prepared}`
+  -- The day before supplies context for trips that started before midnight
+  WHERE trip_date BETWEEN DATE_SUB(@day, INTERVAL 1 DAY) AND @day
+)
+SELECT
+  trip_uid,
+  start_time_dts,
+  stop_name AS target_stop_name,
+  arrival_time AS target_arrival_time,
+  stop_sequence AS target_sequence,
+  minutes_since_prev_stop AS target_minutes_from_prev,
+  hour_of_day,
+  day_of_week,
+  trip_date,
+  is_rush_hour,
+  is_weekend,
+  ARRAY(SELECT stop FROM UNNEST(context_stops) AS stop ORDER BY stop.stop_sequence) AS context_stops
+FROM Windowed
+WHERE trip_date = @day
+  AND stop_name = @target_stop
+  AND ARRAY_LENGTH(context_stops) = {context_length}  -- Full context only
+"""
+
+MERGE_SQL = """
+MERGE `{samples}` T
+USING ({samples_sql}) S
+ON T.trip_date = @day
+  AND T.trip_uid = S.trip_uid
+  AND T.target_stop_name = S.target_stop_name
+WHEN MATCHED THEN
+  UPDATE SET {assignments}
+WHEN NOT MATCHED THEN
+  INSERT ROW
+WHEN NOT MATCHED BY SOURCE AND T.trip_date = @day AND T.target_stop_name = @target_stop THEN
+  DELETE
+"""
+
+
+def query_parameters(day, target_stop):
+    return [
+        bigquery.ScalarQueryParameter("day", "DATE", day),
+        bigquery.ScalarQueryParameter("target_stop", "STRING", target_stop),
+    ]
+
+
+def ensure_samples_table(client, samples_sql, table_ref, target_stop, context_length):
+    """
+    Create the samples table (partitioned by trip_date) from the dry-run schema of the
+    samples query, or check that an existing one can take partition MERGEs.
+
+    Returns:
+        Schema field names
+    """
+    dry_run = client.query(
+        samples_sql,
+        job_config=bigquery.QueryJobConfig(
+            dry_run=True, query_parameters=query_parameters(date.today(), target_stop)
+        ),
+    )
+    table = bigquery.Table(table_ref, schema=dry_run.schema)
+    table.time_partitioning = bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY, field="trip_date"
+    )
+    table.clustering_fields = CLUSTERING_FIELDS
+    table.labels = {"context_length": str(context_length)}
+    table = client.create_table(table, exists_ok=True)
+
+    if not table.time_partitioning or table.time_partitioning.field != "trip_date":
+        print(f"✗ {table_ref} exists but is not partitioned on trip_date.")
+        print("  Re-create it with 5-sql/create_training_samples.sql (now partitioned), or drop it and re-run:")
+        print(f"  bq rm -t {table_ref.replace('.', ':', 1)}")
+        raise SystemExit(1)
+    existing_length = table.labels.get("context_length", str(CONTEXT_LENGTH))
+    if existing_length != str(context_length):
+        print(f"✗ {table_ref} holds {existing_length}-stop contexts, not {context_length}. "
+              f"Use --table to write a separate table.")
+        raise SystemExit(1)
+    return [field.name for field in table.schema]
+
+
+def backfill_days(client, prepared_ref, samples_ref):
+    """Prepared partitions with no samples partition yet (partition metadata only, no scan)."""
+    def partitions(table_ref):
+        dataset, table_id = table_ref.rsplit(".", 1)
+        rows = client.query(
+            f"SELECT partition_id FROM `{dataset}.INFORMATION_SCHEMA.PARTITIONS` "
+            f"WHERE table_name = @table AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')",
+            job_config=bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ScalarQueryParameter("table", "STRING", table_id)]
+            ),
+        ).result()
+        return {datetime.strptime(row.partition_id, "%Y%m%d").date() for row in rows}
+
+    return sorted(partitions(prepared_ref) - partitions(samples_ref))
+
+
+def build_day(client, merge_sql, day, target_stop):
+    """
+    MERGE one day's samples.
+
+    Returns:
+        Dict with inserted, updated, deleted, bytes_processed, seconds
+    """
+    start = time.perf_counter()
+    job = client.query(
+        merge_sql, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters(day, target_stop))
+    )
+    job.result()
+    stats = job.dml_stats
+    return {
+        "inserted": stats.inserted_row_count if stats else job.num_dml_affected_rows or 0,
+        "updated": stats.updated_row_count if stats else 0,
+        "deleted": stats.deleted_row_count if stats else 0,
+        "bytes_processed": job.total_bytes_processed or 0,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first trip_date to build")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="last trip_date to build")
+    parser.add_argument("--backfill", action="store_true", help="build every prepared day missing from the table")
+    parser.add_argument("--target-stop", default=TARGET_STOP)
+    parser.add_argument("--context-length", type=int, default=CONTEXT_LENGTH)
+    parser.add_argument("--table", default=SAMPLES_TABLE, help="samples table in the dataset")
+    args = parser.parse_args()
+    if args.context_length < 1:
+        parser.error("--context-length must be at least 1")
+
+    prepared_ref = f"{PROJECT_ID}.{DATASET_ID}.{PREPARED_TABLE}"
+    samples_ref = f"{PROJECT_ID}.{DATASET_ID}.{args.table}"
+    samples_sql = SAMPLES_SQL.format(prepared=prepared_ref, context_length=args.context_length)
+
+    print("=" * 60)
+    print("Building Training Samples")
+    print("=" * 60)
+    print(f"Source: {prepared_ref}")
+    print(f"Table: {samples_ref} (partitioned by trip_date)")
+    print(f"Target: {args.target_stop}, {args.context_length} context stops")
+
+    client = bigquery.Client(project=PROJECT_ID)
+    columns = ensure_samples_table(client, samples_sql, samples_ref, args.target_stop, args.context_length)
+    merge_sql = MERGE_SQL.format(
+        samples=samples_ref,
+        samples_sql=samples_sql,
+        assignments=", ".join(f"{column} = S.{column}" for column in columns),
+    )
+
+    if args.backfill:
+        days = backfill_days(client, prepared_ref, samples_ref)
+    else:
+        yesterday = datetime.now(ZoneInfo("America/New_York")).date() - timedelta(days=1)
+        start, end = args.start or args.end or yesterday, args.end or args.start or yesterday
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    print(f"Days: {len(days)}" + (f" ({days[0]} to {days[-1]})" if days else ""))
+    print("=" * 60 + "\n")
+
+    totals = {"inserted": 0, "updated": 0, "deleted": 0, "bytes_processed": 0, "seconds": 0.0}
+    failed = []
+    for day in days:
+        try:
+            stats = build_day(client, merge_sql, day, args.target_stop)
+        except Exception as e:
+            failed.append(day)
+            print(f"  ✗ {day}: {e}")
+            continue
+        for key in totals:
+            totals[key] += stats[key]
+        print(f"  ✓ {day}: +{stats['inserted']:,} ~{stats['updated']:,} -{stats['deleted']:,} rows, "
+              f"{stats['bytes_processed'] / (1024 * 1024):,.1f} MB scanned ({stats['seconds']:.1f}s)")
+
+    print("\n" + "=" * 60)
+    print(f"Built {len(days) - len(failed)}/{len(days)} days: {totals['inserted']:,} inserted, "
+          f"{totals['updated']:,} updated, {totals['deleted']:,} deleted")
+    print(f"Scanned {totals['bytes_processed'] / (1024 ** 3):.2f} GB in {totals['seconds']:.1f}s")
+    if failed:
+        print(f"✗ Failed days: {', '.join(str(day) for day in failed)}")
+    print("=" * 60)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Materialize the training splits into a local sharded NumPy cache.
+Each split is exported once through the Storage Read API, already packed as
+float32 (N, context_length, 8) features and (N,) targets, into .npy shards that later
+epochs and runs memory-map instead of re-querying BigQuery.
+
+The cache directory is keyed by the training table's last-modified time and
+the split dates, so rebuilding the table or moving the splits starts a new
+cache while an unchanged table is never exported twice.
+
+Usage:
+    python cache_training_data.py            # export (no-op when the cache is current)
+
+    from cache_training_data import load_cached_datasets
+    train_ds, val_ds, test_ds = load_cached_datasets()
+"""
+
+import concurrent.futures
+import itertools
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from load_from_bigquery import (
+    CONTEXT_FEATURES,
+    CONTEXT_LENGTH,
+    DATASET_ID,
+    DROPPED_SAMPLES,
+    PROJECT_ID,
+    SHUFFLE_SEED,
+    TABLE_ID,
+    get_context_length,
+    get_split_dates,
+    iter_stream_batches,
+    open_read_session,
+    split_restrictions,
+)
+
+# Configuration
+CACHE_ROOT = os.environ.get(
+    "TRAINING_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_cache"),
+)
+SHARD_SAMPLES = 65536  # samples per shard (~10 MB of features)
+
+
+def cache_key():
+    """
+    Identify the current table snapshot and splits (metadata calls only, no data read).
+
+    Returns:
+        Tuple of (cache directory name, (train_end, val_end))
+    """
+    from google.cloud import bigquery
+    table = bigquery.Client(project=PROJECT_ID).get_table(f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}")
+    train_end, val_end = get_split_dates()
+    return f"{TABLE_ID}-{table.modified:%Y%m%dT%H%M%S}-train{train_end}-val{val_end}", (train_end, val_end)
+
+
+def export_stream(client, session, stream_name, directory, prefix):
+    """
+    Write one read stream to SHARD_SAMPLES-sized shards: <prefix>-NNNN.X.npy / .y.npy
+
+    Returns:
+        List of {"name", "samples"} per shard
+    """
+    shards = []
+    xs, ys, buffered = [], [], 0
+
+    def flush():
+        name = f"{prefix}-{len(shards):04d}"
+        X, y = np.concatenate(xs), np.concatenate(ys)
+        np.save(os.path.join(directory, f"{name}.X.npy"), X)
+        np.save(os.path.join(directory, f"{name}.y.npy"), y)
+        shards.append({"name": name, "samples": int(len(y))})
+
+    for X, y in iter_stream_batches(client, session, stream_name):
+        xs.append(X)
+        ys.append(y)
+        buffered += len(y)
+        if buffered >= SHARD_SAMPLES:
+            flush()
+            xs, ys, buffered = [], [], 0
+    if buffered:
+        flush()
+    return shards
+
+
+def materialize(force=False):
+    """
+    Export train/val/test into CACHE_ROOT/<key>/ unless that snapshot is already cached.
+
+    Streams of a split are exported in parallel, into a staging directory that
+    is renamed into place only once every split is complete.
+
+    Returns:
+        Path of the cache directory
+    """
+    key, (train_end, val_end) = cache_key()
+    directory = os.path.join(CACHE_ROOT, key)
+    if os.path.exists(os.path.join(directory, "manifest.json")) and not force:
+        print(f"✓ Cache is current: {directory}")
+        return directory
+
+    staging = directory + ".partial"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    manifest = {
+        "table": f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}",
+        "train_end": str(train_end),
+        "val_end": str(val_end),
+        "context_length": get_context_length(),
+        "feature_order": CONTEXT_FEATURES,
+        "splits": {},
+    }
+
+    print(f"Exporting {manifest['table']} to {directory}")
+    for split, restriction in split_restrictions(train_end, val_end).items():
+        start = time.perf_counter()
+        dropped_before = DROPPED_SAMPLES.copy()
+        client, session, stream_names = open_read_session(restriction)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(stream_names))) as executor:
+            per_stream = list(executor.map(
+                lambda item: export_stream(client, session, item[1], staging, f"{split}-s{item[0]:02d}"),
+                enumerate(stream_names),
+            ))
+        shards = [shard for stream_shards in per_stream for shard in stream_shards]
+        samples = sum(shard["samples"] for shard in shards)
+        dropped = dict(DROPPED_SAMPLES - dropped_before)
+        manifest["splits"][split] = {"samples": samples, "shards": shards, "dropped_null_samples": dropped}
+        seconds = time.perf_counter() - start
+        print(f"  ⬇ {split}: {samples:,} samples in {len(shards)} shards from {len(stream_names)} streams "
+              f"({seconds:.1f}s, {samples / seconds if seconds else 0:,.0f} samples/sec)")
+        if dropped:
+            print(f"  ⚠ {split}: dropped samples with null values: "
+                  + ", ".join(f"{name}={count:,}" for name, count in sorted(dropped.items())))
+
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+    print(f"✓ Cache written: {directory}")
+    return directory
+
+
+def latest_cache():
+    """Most recently written complete cache directory (for offline runs), or None."""
+    manifests = [
+        os.path.join(CACHE_ROOT, name, "manifest.json")
+        for name in os.listdir(CACHE_ROOT)
+    ] if os.path.isdir(CACHE_ROOT) else []
+    manifests = [path for path in manifests if os.path.exists(path)]
+    return os.path.dirname(max(manifests, key=os.path.getmtime)) if manifests else None
+
+
+def load_cached_dataset(directory, split, batch_size=32, shuffle=False, seed=SHUFFLE_SEED):
+    """
+    Create TensorFlow dataset of (batch, context_length, 8) / (batch,) from memory-mapped shards.
+
+    With shuffle, shard order and sample order within each shard are permuted
+    from seed + epoch number, so every epoch differs but runs are reproducible.
+
+    Args:
+        directory: cache directory from materialize() or latest_cache()
+        split: 'train', 'val' or 'test'
+    """
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+    shards = [shard["name"] for shard in manifest["splits"][split]["shards"]]
+    context_length = manifest.get("context_length", CONTEXT_LENGTH)  # caches written before the label was read
+    epochs = itertools.count()
+
+    def generate():
+        rng = np.random.default_rng(seed + next(epochs))
+        order = rng.permutation(len(shards)) if shuffle else range(len(shards))
+        for index in order:
+            X = np.load(os.path.join(directory, f"{shards[index]}.X.npy"), mmap_mode="r")
+            y = np.load(os.path.join(directory, f"{shards[index]}.y.npy"), mmap_mode="r")
+            if shuffle:
+                permutation = rng.permutation(len(y))
+                for start in range(0, len(y), batch_size):
+                    rows = np.sort(permutation[start:start + batch_size])  # sorted for sequential page reads
+                    yield X[rows], y[rows]
+            else:
+                for start in range(0, len(y), batch_size):
+                    yield np.asarray(X[start:start + batch_size]), np.asarray(y[start:start + batch_size])
+
+    return tf.data.Dataset.from_generator(
+        generate,
+        output_signature=(
+            tf.TensorSpec(shape=(None, context_length, len(CONTEXT_FEATURES)), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32),
+        ),
+    )
+
+
+def load_cached_datasets(batch_size=32, offline=False):
+    """
+    Load train/val/test from the local cache, exporting first if the table changed.
+
+    Args:
+        offline: skip the BigQuery snapshot check and use the newest local cache
+    """
+    directory = latest_cache() if offline else materialize()
+    if directory is None:
+        raise FileNotFoundError(f"No training cache in {CACHE_ROOT} - run cache_training_data.py first")
+
+    train_ds = load_cached_dataset(directory, 'train', batch_size, shuffle=True).prefetch(tf.data.AUTOTUNE)
+    val_ds = load_cached_dataset(directory, 'val', batch_size).prefetch(tf.data.AUTOTUNE)
+    test_ds = load_cached_dataset(directory, 'test', batch_size).prefetch(tf.data.AUTOTUNE)
+    return train_ds, val_ds, test_ds
+
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("Training Data Cache")
+    print("=" * 60)
+    cache_directory = materialize()
+    with open(os.path.join(cache_directory, "manifest.json")) as f:
+        for split_name, info in json.load(f)["splits"].items():
+            print(f"  {split_name}: {info['samples']:,} samples, {len(info['shards'])} shards")
+    print("=" * 60)
@@ -3,8 +3,21 @@
 Load training data directly from BigQuery into TensorFlow datasets.
 No intermediate files needed - streams data on-demand.
 Best for production environments.
+
+Two readers:
+  - storage (default): BigQuery Storage Read API, Arrow batches from N parallel
+    read streams interleaved in tf.data; the split filter is pushed down as a
+    row restriction and context_stops is packed to (N, context_length, 8) with NumPy
+  - query: the original single ordered query through tensorflow-io
+
+The context length is read from the table's context_length label
+(build_training_samples.py sets it; tables without it hold 5-stop contexts).
 """
 
+import collections
+import threading
+
+import numpy as np
 import tensorflow as tf
 import tensorflow_io as tfio
 
@@ -12,78 +25,64 @@ import tensorflow_io as tfio
 PROJECT_ID = "streaming-systems-245"
 DATASET_ID = "mta_historical"
 TABLE_ID = "e_train_training_samples"
+READ_STREAMS = 8  # parallel Storage Read API streams per split (the server may return fewer)
+SHUFFLE_SEED = 42
+SHUFFLE_BUFFER = 10000  # samples
+CONTEXT_LENGTH = 5  # context stops per sample when the table has no context_length label
+# context_stops fields in the (context_length, 8) feature order used by the model
+CONTEXT_FEATURES = [
+    'hour_of_day', 'day_of_week', 'is_rush_hour', 'is_weekend',
+    'minutes_since_prev_stop', 'stop_lat', 'stop_lon', 'stop_sequence',
+]
+# ctx<i>_<alias> column names the query reader flattens each context stop into
+QUERY_ALIASES = ['hour', 'day', 'rush', 'weekend', 'minutes', 'lat', 'lon', 'seq']
+# samples pack_arrow_batch dropped, by the null column that disqualified them
+DROPPED_SAMPLES = collections.Counter()
+_dropped_lock = threading.Lock()
+
 
-def create_bq_dataset(split_filter, batch_size=32):
+def get_context_length():
+    """Context stops per sample, from the training table's context_length label."""
+    from google.cloud import bigquery
+    table = bigquery.Client(project=PROJECT_ID).get_table(f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}")
+    return int((table.labels or {}).get('context_length', CONTEXT_LENGTH))
+
+
+def create_bq_dataset(split_filter, batch_size=32, context_length=CONTEXT_LENGTH):
     """
     Create TensorFlow dataset directly from BigQuery.
     
     Args:
         split_filter: SQL WHERE clause for train/val/test split
         batch_size: Batch size for training
+        context_length: context stops per sample (get_context_length())
     """
     
-    # Query to flatten the context_stops array into features
+    # Flatten context stops (context_length stops x 8 features)
+    context_columns = ",\n      ".join(
+        f"context_stops[OFFSET({i})].{field} AS ctx{i}_{alias}"
+        for i in range(context_length)
+        for field, alias in zip(CONTEXT_FEATURES, QUERY_ALIASES)
+    )
+    null_features = " OR ".join(f"stop.{field} IS NULL" for field in CONTEXT_FEATURES)
     query = f"""
     SELECT
       -- Target variable
       target_minutes_from_prev,
-      
-      -- Flatten context stops (5 stops x 8 features = 40 features)
-      context_stops[OFFSET(0)].hour_of_day AS ctx0_hour,
-      context_stops[OFFSET(0)].day_of_week AS ctx0_day,
-      context_stops[OFFSET(0)].is_rush_hour AS ctx0_rush,
-      context_stops[OFFSET(0)].is_weekend AS ctx0_weekend,
-      context_stops[OFFSET(0)].minutes_since_prev_stop AS ctx0_minutes,
-      context_stops[OFFSET(0)].stop_lat AS ctx0_lat,
-      context_stops[OFFSET(0)].stop_lon AS ctx0_lon,
-      context_stops[OFFSET(0)].stop_sequence AS ctx0_seq,
-      
-      context_stops[OFFSET(1)].hour_of_day AS ctx1_hour,
-      context_stops[OFFSET(1)].day_of_week AS ctx1_day,
-      context_stops[OFFSET(1)].is_rush_hour AS ctx1_rush,
-      context_stops[OFFSET(1)].is_weekend AS ctx1_weekend,
-      context_stops[OFFSET(1)].minutes_since_prev_stop AS ctx1_minutes,
-      context_stops[OFFSET(1)].stop_lat AS ctx1_lat,
-      context_stops[OFFSET(1)].stop_lon AS ctx1_lon,
-      context_stops[OFFSET(1)].stop_sequence AS ctx1_seq,
-      
-      context_stops[OFFSET(2)].hour_of_day AS ctx2_hour,
-      context_stops[OFFSET(2)].day_of_week AS ctx2_day,
-      context_stops[OFFSET(2)].is_rush_hour AS ctx2_rush,
-      context_stops[OFFSET(2)].is_weekend AS ctx2_weekend,
-      context_stops[OFFSET(2)].minutes_since_prev_stop AS ctx2_minutes,
-      context_stops[OFFSET(2)].stop_lat AS ctx2_lat,
-      context_stops[OFFSET(2)].stop_lon AS ctx2_lon,
-      context_stops[OFFSET(2)].stop_sequence AS ctx2_seq,
-      
-      context_stops[OFFSET(3)].hour_of_day AS ctx3_hour,
-      context_stops[OFFSET(3)].day_of_week AS ctx3_day,
-      context_stops[OFFSET(3)].is_rush_hour AS ctx3_rush,
-      context_stops[OFFSET(3)].is_weekend AS ctx3_weekend,
-      context_stops[OFFSET(3)].minutes_since_prev_stop AS ctx3_minutes,
-      context_stops[OFFSET(3)].stop_lat AS ctx3_lat,
-      context_stops[OFFSET(3)].stop_lon AS ctx3_lon,
-      context_stops[OFFSET(3)].stop_sequence AS ctx3_seq,
-      
-      context_stops[OFFSET(4)].hour_of_day AS ctx4_hour,
-      context_stops[OFFSET(4)].day_of_week AS ctx4_day,
-      context_stops[OFFSET(4)].is_rush_hour AS ctx4_rush,
-      context_stops[OFFSET(4)].is_weekend AS ctx4_weekend,
-      context_stops[OFFSET(4)].minutes_since_prev_stop AS ctx4_minutes,
-      context_stops[OFFSET(4)].stop_lat AS ctx4_lat,
-      context_stops[OFFSET(4)].stop_lon AS ctx4_lon,
-      context_stops[OFFSET(4)].stop_sequence AS ctx4_seq
-      
+      {context_columns}
     FROM `{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}`
-    WHERE {split_filter}
+    WHERE ({split_filter})
+      AND target_minutes_from_prev IS NOT NULL
+      -- same samples as the storage reader, which drops nulls instead of imputing them
+      AND NOT EXISTS(SELECT 1 FROM UNNEST(context_stops) AS stop WHERE {null_features})
     ORDER BY trip_date, trip_uid
     """
     
     # Create dataset from BigQuery
     feature_names = ['target_minutes_from_prev'] + [
-        f'ctx{i}_{feat}' 
-        for i in range(5) 
-        for feat in ['hour', 'day', 'rush', 'weekend', 'minutes', 'lat', 'lon', 'seq']
+        f'ctx{i}_{alias}' 
+        for i in range(context_length) 
+        for alias in QUERY_ALIASES
     ]
     
     dataset = tfio.experimental.columnar.make_csv_dataset(
@@ -94,47 +93,214 @@ def create_bq_dataset(split_filter, batch_size=32):
         project_id=PROJECT_ID
     )
     
-    # Reshape into (batch, 5, 8) format
+    # Reshape into (batch, context_length, 8) format
     def reshape_features(features):
         # Extract target
         y = features.pop('target_minutes_from_prev')
         
-        # Stack context features into (batch, 5, 8) tensor
+        # Stack context features into (batch, context_length, 8) tensor
         X_list = []
-        for i in range(5):
+        for i in range(context_length):
             timestep = tf.stack([
-                tf.cast(features[f'ctx{i}_hour'], tf.float32),
-                tf.cast(features[f'ctx{i}_day'], tf.float32),
-                tf.cast(features[f'ctx{i}_rush'], tf.float32),
-                tf.cast(features[f'ctx{i}_weekend'], tf.float32),
-                tf.cast(features[f'ctx{i}_minutes'], tf.float32),
-                tf.cast(features[f'ctx{i}_lat'], tf.float32),
-                tf.cast(features[f'ctx{i}_lon'], tf.float32),
-                tf.cast(features[f'ctx{i}_seq'], tf.float32)
+                tf.cast(features[f'ctx{i}_{alias}'], tf.float32)
+                for alias in QUERY_ALIASES
             ], axis=1)
             X_list.append(timestep)
         
-        X = tf.stack(X_list, axis=1)  # (batch, 5, 8)
+        X = tf.stack(X_list, axis=1)  # (batch, context_length, 8)
         return X, y
     
     dataset = dataset.map(reshape_features)
     return dataset
 
 
-def load_datasets_from_bigquery():
-    """Load train/val/test splits directly from BigQuery."""
+def pack_arrow_batch(record_batch):
+    """
+    Pack an Arrow batch of (target_minutes_from_prev, context_stops) into NumPy.
+    
+    Samples with a null target or a null context feature (e.g. minutes_since_prev_stop
+    of a trip's first stop) are dropped rather than imputed, and counted in DROPPED_SAMPLES.
+    
+    Args:
+        record_batch: pyarrow RecordBatch whose context_stops lists all have the same length
+    
+    Returns:
+        Tuple of (X float32 (N, context_length, 8), y float32 (N,))
+    
+    Raises:
+        ValueError if the context_stops lists differ in length
+    """
+    import pyarrow.compute as pc
+    
+    target = record_batch.column('target_minutes_from_prev')
+    lengths = pc.list_value_length(record_batch.column('context_stops')).to_numpy(zero_copy_only=False)
+    if len(lengths) and (lengths != lengths[0]).any():
+        raise ValueError(f"context_stops lengths differ within a batch: {sorted(set(lengths.tolist()))}")
+    context_length = int(lengths[0]) if len(lengths) else 0
+    stops = pc.list_flatten(record_batch.column('context_stops'))  # N * context_length structs
+    # struct_field (unlike .field) also marks the fields of a null context stop as null
+    columns = [pc.struct_field(stops, name) for name in CONTEXT_FEATURES]
+    
+    keep = pc.is_valid(target).to_numpy(zero_copy_only=False)
+    dropped = {'target_minutes_from_prev': int((~keep).sum())}
+    for name, column in zip(CONTEXT_FEATURES, columns):
+        if column.null_count:
+            valid = pc.is_valid(column).to_numpy(zero_copy_only=False).reshape(len(target), context_length).all(axis=1)
+            dropped[name] = int((~valid).sum())
+            keep &= valid
+    with _dropped_lock:
+        DROPPED_SAMPLES.update({reason: count for reason, count in dropped.items() if count})
+    
+    X = np.stack([column.to_numpy(zero_copy_only=False).astype(np.float32) for column in columns], axis=-1)
+    X = X.reshape(len(target), context_length, len(CONTEXT_FEATURES))
+    y = target.to_numpy(zero_copy_only=False).astype(np.float32)
+    return X[keep], y[keep]
+
+
+def open_read_session(row_restriction, max_streams=READ_STREAMS):
+    """
+    Open a Storage Read API session over the training table.
+    
+    Only the target and the 8 context fields are read, and only rows matching
+    row_restriction that have a target leave BigQuery.
+    
+    Returns:
+        Tuple of (read client, session, list of stream names)
+    """
+    from google.cloud import bigquery_storage_v1
+    from google.cloud.bigquery_storage_v1 import types
+    
+    client = bigquery_storage_v1.BigQueryReadClient()
+    requested_session = types.ReadSession(
+        table=f"projects/{PROJECT_ID}/datasets/{DATASET_ID}/tables/{TABLE_ID}",
+        data_format=types.DataFormat.ARROW,
+        read_options=types.ReadSession.TableReadOptions(
+            selected_fields=['target_minutes_from_prev'] + [f'context_stops.{name}' for name in CONTEXT_FEATURES],
+            row_restriction=f"({row_restriction}) AND target_minutes_from_prev IS NOT NULL",
+        ),
+    )
+    session = client.create_read_session(
+        parent=f"projects/{PROJECT_ID}",
+        read_session=requested_session,
+        max_stream_count=max_streams,
+    )
+    return client, session, [stream.name for stream in session.streams]
+
+
+def iter_stream_batches(client, session, stream_name):
+    """Yield packed (X, y) NumPy batches, one per Arrow page of a read stream."""
+    for page in client.read_rows(stream_name).rows(session).pages:
+        yield pack_arrow_batch(page.to_arrow())
+
+
+def create_storage_dataset(row_restriction, batch_size=32, shuffle=False, seed=SHUFFLE_SEED, max_streams=READ_STREAMS,
+                           context_length=CONTEXT_LENGTH):
+    """
+    Create TensorFlow dataset from parallel BigQuery Storage Read API streams.
+    
+    Each stream yields packed Arrow batches; the streams are interleaved
+    deterministically, and shuffling uses a fixed seed.
+    Which rows land in which stream is decided per read session, so the exact
+    sample order is only reproducible within one session.
+    
+    Args:
+        row_restriction: filter pushed down to the read session,
+                         e.g. "trip_date <= CAST('2025-06-30' AS DATE)"
+        batch_size: Batch size for training
+        shuffle: shuffle streams and samples (training split)
+        max_streams: upper bound on parallel read streams
+        context_length: context stops per sample (get_context_length())
+    """
+    client, session, stream_names = open_read_session(row_restriction, max_streams)
+    if not stream_names:
+        raise ValueError(f"No rows match: {row_restriction}")
     
-    # Get split dates from BigQuery
+    def read_stream(stream_name):
+        yield from iter_stream_batches(client, session, stream_name.decode('utf-8'))
+    
+    streams = tf.data.Dataset.from_tensor_slices(stream_names)
+    if shuffle:
+        streams = streams.shuffle(len(stream_names), seed=seed)
+    dataset = streams.interleave(
+        lambda stream_name: tf.data.Dataset.from_generator(
+            read_stream,
+            args=(stream_name,),
+            output_signature=(
+                tf.TensorSpec(shape=(None, context_length, len(CONTEXT_FEATURES)), dtype=tf.float32),
+                tf.TensorSpec(shape=(None,), dtype=tf.float32),
+            ),
+        ),
+        cycle_length=len(stream_names),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=True,
+    ).unbatch()
+    if shuffle:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, seed=seed)
+    return dataset.batch(batch_size)
+
+
+def get_split_dates():
+    """Returns (train_end_date, val_end_date) from the split_dates table."""
     from google.cloud import bigquery
     client = bigquery.Client(project=PROJECT_ID)
     
-    split_query = """
+    split_query = f"""
     SELECT train_end_date, val_end_date
-    FROM `streaming-systems-245.mta_historical.split_dates`
+    FROM `{PROJECT_ID}.{DATASET_ID}.split_dates`
     """
-    split_df = client.query(split_query).to_dataframe()
-    train_end = split_df['train_end_date'].iloc[0]
-    val_end = split_df['val_end_date'].iloc[0]
+    row = list(client.query(split_query).result())[0]
+    return row.train_end_date, row.val_end_date
+
+
+def split_restrictions(train_end, val_end):
+    """Row restrictions for the train/val/test splits (Storage Read API syntax)."""
+    return {
+        'train': f"trip_date <= CAST('{train_end}' AS DATE)",
+        'val': f"trip_date > CAST('{train_end}' AS DATE) AND trip_date <= CAST('{val_end}' AS DATE)",
+        'test': f"trip_date > CAST('{val_end}' AS DATE)",
+    }
+
+
+def load_datasets_from_bigquery(reader='storage', batch_size=32):
+    """
+    Load train/val/test splits directly from BigQuery.
+    
+    Args:
+        reader: 'storage' (parallel Storage Read API streams) or 'query' (single ordered query)
+        batch_size: Batch size for training
+    """
+    if reader == 'storage':
+        train_end, val_end = get_split_dates()
+        context_length = get_context_length()
+        print(f"Loading datasets from BigQuery (Storage Read API, up to {READ_STREAMS} streams per split)...")
+        print(f"  Train: up to {train_end}")
+        print(f"  Val:   {train_end} to {val_end}")
+        print(f"  Test:  after {val_end}")
+        
+        restrictions = split_restrictions(train_end, val_end)
+        train_ds = create_storage_dataset(
+            restrictions['train'], batch_size=batch_size, shuffle=True, context_length=context_length
+        ).prefetch(tf.data.AUTOTUNE)
+        val_ds = create_storage_dataset(
+            restrictions['val'], batch_size=batch_size, context_length=context_length
+        ).prefetch(tf.data.AUTOTUNE)
+        test_ds = create_storage_dataset(
+            restrictions['test'], batch_size=batch_size, context_length=context_length
+        ).prefetch(tf.data.AUTOTUNE)
+        
+        print("✅ Datasets created!")
+        print(f"   Input shape: (batch, {context_length}, {len(CONTEXT_FEATURES)})")
+        return train_ds, val_ds, test_ds
+    
+    return load_datasets_from_query(batch_size)
+
+
+def load_datasets_from_query(batch_size=32):
+    """Load train/val/test splits with one ordered query each (original reader)."""
+    
+    # Get split dates and context length from BigQuery
+    train_end, val_end = get_split_dates()
+    context_length = get_context_length()
     
     print(f"Loading datasets from BigQuery...")
     print(f"  Train: up to {train_end}")
@@ -144,21 +310,24 @@ def load_datasets_from_bigquery():
     # Create datasets with appropriate filters
     train_ds = create_bq_dataset(
         f"trip_date <= DATE('{train_end}')",
-        batch_size=32
+        batch_size=batch_size,
+        context_length=context_length
     ).shuffle(1000).prefetch(tf.data.AUTOTUNE)
     
     val_ds = create_bq_dataset(
         f"trip_date > DATE('{train_end}') AND trip_date <= DATE('{val_end}')",
-        batch_size=32
+        batch_size=batch_size,
+        context_length=context_length
     ).prefetch(tf.data.AUTOTUNE)
     
     test_ds = create_bq_dataset(
         f"trip_date > DATE('{val_end}')",
-        batch_size=32
+        batch_size=batch_size,
+        context_length=context_length
     ).prefetch(tf.data.AUTOTUNE)
     
     print("✅ Datasets created!")
-    print("   Input shape: (batch, 5, 8)")
+    print(f"   Input shape: (batch, {context_length}, {len(CONTEXT_FEATURES)})")
     
     return train_ds, val_ds, test_ds
 
@@ -1,16 +1,19 @@
 """
 Load MTA Stops Reference Data to BigQuery
+Rows come from the compiled stops snapshot (stops_snapshot.py), so the table
+holds the same typed, validated stops the pipeline enriches with
 """
 
 from google.cloud import bigquery
 
+from stops_snapshot import SNAPSHOT_PATH, load_snapshot, table_rows
+
 # ============================================
 # Configuration
 # ============================================
 PROJECT_ID = "streaming-systems-245"
 DATASET_ID = "mta_historical"
 TABLE_ID = "stops"
-CSV_PATH = "4-terraform/modules/storage/stops.csv"
 
 print("="*60)
 print("Loading Stops Reference Data to BigQuery")
@@ -18,7 +21,7 @@ print("="*60)
 print(f"Project: {PROJECT_ID}")
 print(f"Dataset: {DATASET_ID}")
 print(f"Table: {TABLE_ID}")
-print(f"Source: {CSV_PATH}")
+print(f"Source: {SNAPSHOT_PATH}")
 print("="*60 + "\n")
 
 # Initialize client
@@ -37,22 +40,19 @@ schema = [
 # Configure load job
 table_ref = f"{PROJECT_ID}.{DATASET_ID}.{TABLE_ID}"
 job_config = bigquery.LoadJobConfig(
-    source_format=bigquery.SourceFormat.CSV,
-    skip_leading_rows=1,
     schema=schema,
     write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
-    allow_quoted_newlines=True,
 )
 
 print(f"Starting BigQuery load job...")
 
-# Load from local file
-with open(CSV_PATH, "rb") as source_file:
-    load_job = bq_client.load_table_from_file(
-        source_file,
-        table_ref,
-        job_config=job_config
-    )
+# Load the snapshot's rows (stations, then platforms linked to them)
+rows = table_rows(load_snapshot())
+load_job = bq_client.load_table_from_json(
+    rows,
+    table_ref,
+    job_config=job_config
+)
 
 # Wait for job to complete
 load_job.result()
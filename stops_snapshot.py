@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Compile MTA Stops Reference Data into a Versioned Snapshot
+stops.csv is parsed once, here, with one set of rules: the BOM is stripped,
+columns are read by header name, coordinates become floats, every platform
+is linked to its parent station, and the N/S platform suffix is mapped to a
+direction. The result is a small binary snapshot that the BigQuery loader,
+the Dataflow pipeline (side input) and the train board load in milliseconds
+instead of re-parsing the CSV in their own way.
+
+Snapshot format (FORMAT_VERSION 1):
+    header   struct '<8sHI32s': magic b'MTASTOPS', format version,
+             payload length, sha256 of the source CSV
+    payload  zlib-compressed JSON:
+             {"directions": {"N": "Northbound", "S": "Southbound"},
+              "stations":   [[stop_id, stop_name, stop_lat, stop_lon], ...],
+              "platforms":  [[stop_id, station index, suffix], ...]}
+1-dataflow/gtfs_records.py carries its own copy of the reader (the pipeline
+and the train board load it without this script); bump FORMAT_VERSION in both places.
+
+Usage:
+    python stops_snapshot.py            # rebuild 4-terraform/modules/storage/stops.snapshot
+    python stops_snapshot.py --check    # exit 1 if the snapshot is older than stops.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import struct
+import sys
+import time
+import zlib
+
+# ============================================
+# Configuration
+# ============================================
+CSV_PATH = "4-terraform/modules/storage/stops.csv"
+SNAPSHOT_PATH = "4-terraform/modules/storage/stops.snapshot"
+MAGIC = b"MTASTOPS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sHI32s")
+DIRECTIONS = {"N": "Northbound", "S": "Southbound"}  # platform stop_id suffix -> direction
+
+
+# ============================================
+# Compile
+# ============================================
+def compile_stops(csv_bytes):
+    """
+    Parse and validate stops.csv into the snapshot payload.
+
+    Raises:
+        ValueError listing every invalid row (missing parent, bad coordinates, unknown suffix)
+    """
+    reader = csv.DictReader(io.StringIO(csv_bytes.decode("utf-8-sig")))
+    stations, platforms, errors = [], [], []
+    station_index = {}
+    for line, row in enumerate(reader, start=2):
+        stop_id = (row.get("stop_id") or "").strip()
+        if not stop_id:
+            continue
+        if (row.get("location_type") or "").strip() == "1":
+            try:
+                lat, lon = float(row["stop_lat"]), float(row["stop_lon"])
+            except (TypeError, ValueError):
+                errors.append(f"line {line}: {stop_id} has invalid coordinates")
+                continue
+            station_index[stop_id] = len(stations)
+            stations.append([stop_id, row["stop_name"].strip(), lat, lon])
+        else:
+            platforms.append((line, stop_id, (row.get("parent_station") or "").strip()))
+
+    platform_rows = []
+    for line, stop_id, parent in platforms:
+        suffix = stop_id[-1]
+        if parent not in station_index:
+            errors.append(f"line {line}: {stop_id} has unknown parent_station '{parent}'")
+        elif suffix not in DIRECTIONS or stop_id[:-1] != parent:
+            errors.append(f"line {line}: {stop_id} is not {parent} plus a direction suffix")
+        else:
+            platform_rows.append([stop_id, station_index[parent], suffix])
+    if errors:
+        raise ValueError(f"{len(errors)} invalid stops:\n  " + "\n  ".join(errors))
+    return {"directions": DIRECTIONS, "stations": stations, "platforms": platform_rows}
+
+
+def encode(payload, source_sha256):
+    body = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 9)
+    return HEADER.pack(MAGIC, FORMAT_VERSION, len(body), source_sha256) + body
+
+
+def decode(data):
+    """
+    Returns:
+        Tuple of (payload dict, sha256 of the source CSV)
+    """
+    magic, version, length, source_sha256 = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a stops snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"stops snapshot format {version}, this reader understands {FORMAT_VERSION}")
+    return json.loads(zlib.decompress(data[HEADER.size:HEADER.size + length])), source_sha256
+
+
+# ============================================
+# Consumers
+# ============================================
+def stops_map(payload):
+    """
+    stop_id -> {stop_name, stop_lat, stop_lon, station_id, direction} for stations and platforms,
+    the lookup enrich_with_stops uses (direction is None for stations)
+    """
+    lookup = {}
+    for stop_id, name, lat, lon in payload["stations"]:
+        lookup[stop_id] = {"stop_name": name, "stop_lat": lat, "stop_lon": lon,
+                           "station_id": stop_id, "direction": None}
+    for stop_id, index, suffix in payload["platforms"]:
+        station_id, name, lat, lon = payload["stations"][index]
+        lookup[stop_id] = {"stop_name": name, "stop_lat": lat, "stop_lon": lon,
+                           "station_id": station_id, "direction": payload["directions"][suffix]}
+    return lookup
+
+
+def table_rows(payload):
+    """Rows in the BigQuery stops table layout (stations, then their platforms)."""
+    rows = [{"stop_id": stop_id, "stop_name": name, "stop_lat": lat, "stop_lon": lon,
+             "location_type": 1, "parent_station": None}
+            for stop_id, name, lat, lon in payload["stations"]]
+    for stop_id, index, _ in payload["platforms"]:
+        station_id, name, lat, lon = payload["stations"][index]
+        rows.append({"stop_id": stop_id, "stop_name": name, "stop_lat": lat, "stop_lon": lon,
+                     "location_type": None, "parent_station": station_id})
+    return rows
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Read a snapshot file into its payload."""
+    with open(path, "rb") as f:
+        return decode(f.read())[0]
+
+
+# ============================================
+# Main Execution
+# ============================================
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default=CSV_PATH)
+    parser.add_argument("--output", default=SNAPSHOT_PATH)
+    parser.add_argument("--check", action="store_true", help="only verify the snapshot matches the CSV")
+    args = parser.parse_args()
+
+    with open(args.csv, "rb") as f:
+        csv_bytes = f.read()
+    source_sha256 = hashlib.sha256(csv_bytes).digest()
+
+    if args.check:
+        try:
+            with open(args.output, "rb") as f:
+                _, snapshot_sha256 = decode(f.read())
+        except (OSError, ValueError, struct.error) as e:
+            print(f"✗ {args.output}: {e}")
+            sys.exit(1)
+        if snapshot_sha256 != source_sha256:
+            print(f"✗ {args.output} is stale - run python stops_snapshot.py")
+            sys.exit(1)
+        print(f"✓ {args.output} matches {args.csv}")
+        return
+
+    print("=" * 60)
+    print("Compiling Stops Snapshot")
+    print("=" * 60)
+    print(f"Source: {args.csv}")
+
+    try:
+        payload = compile_stops(csv_bytes)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+    data = encode(payload, source_sha256)
+    with open(args.output, "wb") as f:
+        f.write(data)
+
+    start = time.perf_counter()
+    lookup = stops_map(load_snapshot(args.output))
+    load_ms = (time.perf_counter() - start) * 1000
+
+    print(f"✓ {len(payload['stations'])} stations, {len(payload['platforms'])} platforms")
+    print(f"✓ Wrote {args.output} ({len(data):,} bytes, CSV {len(csv_bytes):,} bytes, format v{FORMAT_VERSION})")
+    print(f"✓ Loads into {len(lookup)} lookup entries in {load_ms:.1f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()